@@ -1,3 +1,4 @@
 #!/bin/bash
 ln -s /usr/share/slingring/slingring-tools/seed.py /usr/bin/seed
 ln -s /usr/share/slingring/slingring-tools/universe.py /usr/bin/universe
+ln -s /usr/share/slingring/slingring-tools/slingring.py /usr/bin/slingring
@@ -5,3 +5,6 @@ fi
 if [ -e /usr/bin/universe ]; then
 	rm /usr/bin/universe
 fi
+if [ -e /usr/bin/slingring ]; then
+	rm /usr/bin/slingring
+fi
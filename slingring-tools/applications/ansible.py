@@ -18,22 +18,58 @@
 ########################################################
 import os
 import tempfile
+from collections import OrderedDict
+from configparser import ConfigParser
+from subprocess import PIPE, run
 
 import yaml
 
 from system import key
+from system import mount
+from system import vault
 from system.command import run_command
-from system.command import run_command_piped
 from system.pipe import PipeThread
 
 
-def run_playbook(playbook_location, verbose, vault_pass=None):
+_tools_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The settings of the generated Ansible configuration. The fact cache connection
+# and the timing directory are set per universe.
+_default_config = OrderedDict([
+    ('defaults', OrderedDict([
+        # facts are gathered once and then taken from the cache until they expire
+        ('gathering', 'smart'),
+        ('fact_caching', 'jsonfile'),
+        ('fact_caching_timeout', '86400'),
+        # prints the duration of every task and records it for 'universe profile'
+        # (callback_whitelist is the name used by Ansible < 2.11)
+        ('callback_plugins', os.path.join(_tools_directory, 'plugins', 'callback')),
+        # runs the tasks through an agent in the chroot instead of a chroot process per command
+        ('connection_plugins', os.path.join(_tools_directory, 'plugins', 'connection')),
+        ('callbacks_enabled', 'profile_tasks, slingring_timing'),
+        ('callback_whitelist', 'profile_tasks, slingring_timing'),
+        # retry files would end up in the playbook directory of the universe
+        ('retry_files_enabled', 'False')
+    ])),
+    ('connection', OrderedDict([
+        # the chroot connection supports pipelining, which saves a file transfer per task
+        ('pipelining', 'True')
+    ]))
+])
+
+
+def run_playbook(playbook_location, verbose, vault_pass=None, mounts=None, playbook_file='main.yml',
+                 config_file=None):
     """
     Runs a playbook in a change root.
 
     :param playbook_location: The location of the playbook file.
     :param verbose: True, if a more verbose output should be used.
     :param vault_pass: If the playbook references an encrypted Ansible vault, this is the password to decrypt it.
+    :param mounts: If this is not None, the playbook runs in a private mount namespace in which the given
+                   file systems are mounted (see system.mount.private_namespace_command).
+    :param playbook_file: The file name of the playbook within the playbook location.
+    :param config_file: The path of the Ansible configuration file to use (see write_config_file).
     """
     # Some distributions (e.g. Arch) have fewer bin paths in the PATH variable.
     # This causes plain ubuntu/debian-chroots to fail. Since this is what
@@ -42,22 +78,57 @@ def run_playbook(playbook_location, verbose, vault_pass=None):
     env["PATH"] += ':/usr/sbin:/sbin:/bin'
 
     inventory_file_path = os.path.join(playbook_location, 'hosts')
-    playbook_file_path = os.path.join(playbook_location, 'main.yml')
+    playbook_file_path = os.path.join(playbook_location, playbook_file)
     vars_reference = '@' + os.path.join(playbook_location, 'slingring_vars.yml')
     user_vars_reference = '@' + os.path.join(playbook_location, 'slingring_user_vars.yml')
     secret_user_vars_reference = '@' + os.path.join(playbook_location, 'slingring_user_secrets.yml')
-    cmd = ['sudo', 'ansible-playbook', '--inventory', inventory_file_path,
+    cmd = ['ansible-playbook', '--inventory', inventory_file_path,
            playbook_file_path, '--extra-vars', vars_reference, '--extra-vars', user_vars_reference]
     with tempfile.TemporaryDirectory() as tempdir:
         if vault_pass:
             cmd.append('--extra-vars')
             cmd.append(secret_user_vars_reference)
             cmd.append('--vault-password-file')
-            random_string = key.create_random_password(8)
-            pipe_path = os.path.join(tempdir, random_string)
-            cmd.append(pipe_path)
-            PipeThread(pipe_path, vault_pass).start()
-        run_command(cmd, 'ansible_phase', verbose, env)
+            cmd.append(_start_password_pipe(tempdir, vault_pass))
+        if mounts is not None:
+            cmd = mount.private_namespace_command(cmd, mounts)
+        if config_file:
+            # sudo does not keep the environment of the caller
+            cmd = ['env', 'ANSIBLE_CONFIG=' + config_file] + cmd
+        run_command(['sudo'] + cmd, 'ansible_phase', verbose, env)
+
+
+def write_config_file(path, fact_cache_path, timing_path, overrides=None):
+    """
+    Writes an Ansible configuration file to the given location. It enables a JSON file fact cache
+    in the given directory, pipelining and the timing callbacks.
+    :param path: the target path (including file name)
+    :param fact_cache_path: the directory in which Ansible caches the gathered facts
+    :param timing_path: the directory in which the slingring_timing callback records the task durations
+    :param overrides: a dictionary of sections (e.g. 'defaults'), each containing a dictionary of settings
+                      which replace the generated ones. Settings with an empty value are removed.
+    """
+    config = ConfigParser(interpolation=None)
+    config.read_dict(_default_config)
+    config.set('defaults', 'fact_caching_connection', fact_cache_path)
+    config.add_section('callback_slingring_timing')
+    config.set('callback_slingring_timing', 'output_dir', timing_path)
+    for section, settings in sorted((overrides or {}).items()):
+        if not config.has_section(section):
+            config.add_section(section)
+        for name, value in sorted((settings or {}).items()):
+            if value is None:
+                config.remove_option(section, name)
+            else:
+                config.set(section, name, _config_value(value))
+    with open(path, 'w') as config_file:
+        config.write(config_file)
+
+
+def _config_value(value):
+    if isinstance(value, list):
+        return ', '.join(str(item) for item in value)
+    return str(value)
 
 
 def write_vars_file(path, user_vars, namespace):
@@ -74,7 +145,8 @@ def write_vars_file(path, user_vars, namespace):
 
 def write_vars_vault_file(path, user_vars, password, namespace, phase_key, verbose):
     """
-    Writes a user vars file encrypted to the given location.
+    Writes a user vars file encrypted to the given location. The vault is created in-process
+    if possible, otherwise ansible-vault is used.
     :param path: the target path (including file name)
     :param user_vars: the vars as a dict
     :param password: the password to encrypt the vault file with
@@ -84,14 +156,46 @@ def write_vars_vault_file(path, user_vars, password, namespace, phase_key, verbo
     """
     effective_dict = dict({namespace: user_vars})
     file_content = yaml.dump(effective_dict, default_flow_style=False)
+    if vault.is_available():
+        # like ansible-vault, the file is only readable by its owner
+        with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as vault_file:
+            vault_file.write(vault.encrypt(file_content, password))
+        return
     with tempfile.TemporaryDirectory() as tempdir:
-        random_string = key.create_random_password(8)
-        pipe_path = os.path.join(tempdir, random_string)
+        pipe_path = _start_password_pipe(tempdir, password)
+        # the secrets are passed via stdin, so they do not show up in the process list
+        run_command(['ansible-vault', 'encrypt', '--output', path, '--vault-password-file', pipe_path, '-'],
+                    phase_key, verbose, input_data=file_content.encode('UTF-8'))
+
+
+def read_vars_vault_file(path, password, namespace, phase_key, verbose):
+    """
+    Reads a user vars file which has been encrypted using write_vars_vault_file.
+    The vault is decrypted in-process if possible, otherwise ansible-vault is used.
+    Raises a vault.VaultError if the password is wrong.
+    :param path: the path of the vault file
+    :param password: the password to decrypt the vault file with
+    :param namespace: the namespace used in the yaml file
+    :param phase_key: a message key which describes the current phase. This is used if something fails.
+    :param verbose: True, if a more verbose output is desired.
+    :return: the vars as a dict
+    """
+    if vault.is_available():
+        with open(path) as vault_file:
+            file_content = vault.decrypt(vault_file.read(), password)
+    else:
+        with tempfile.TemporaryDirectory() as tempdir:
+            pipe_path = _start_password_pipe(tempdir, password)
+            result = run(['ansible-vault', 'view', '--vault-password-file', pipe_path, path], stdout=PIPE,
+                         stderr=PIPE)
+            if result.returncode:
+                raise vault.VaultError(result.stderr.decode('UTF-8', 'replace').strip())
+            file_content = result.stdout
+    return (yaml.safe_load(file_content) or {}).get(namespace) or {}
 
-        # start a thread writing to a named pipe @ pipe_path in background, so we don't block
-        pipe_thread = PipeThread(pipe_path, password)
-        pipe_thread.start()
 
-        source_command = ['echo', file_content]
-        sink_command = ['ansible-vault', 'encrypt', '--output', path, '--vault-password-file', pipe_path]
-        run_command_piped(source_command, sink_command, phase_key, verbose)
+def _start_password_pipe(directory, password):
+    # start a thread writing to a named pipe in the given directory in background, so we don't block
+    pipe_path = os.path.join(directory, key.create_random_password(8))
+    PipeThread(pipe_path, password).start()
+    return pipe_path
@@ -16,10 +16,10 @@
 # along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
 
 ########################################################
-from system.command import run_command
+from system.command import run_command, get_command_output
 
 
-def debootstrap(path, architecture, variant, suite, mirror, phase, verbose):
+def debootstrap(path, architecture, variant, suite, mirror, phase, verbose, proxy=None):
     """
     Creates a Debian-based chroot in the given location.
 
@@ -32,6 +32,7 @@ def debootstrap(path, architecture, variant, suite, mirror, phase, verbose):
     :param mirror: the image mirror (e.g. http://de.archive.ubuntu.com/ubuntu)
     :param phase: a message key which describes the current phase. This is used if something fails.
     :param verbose: True, if a more verbose output is desired.
+    :param proxy: An HTTP proxy URL (e.g. http://127.0.0.1:3142/) to download the packages through.
     """
     if variant is not None:
         variant_cmd = '--variant=' + variant
@@ -40,6 +41,20 @@ def debootstrap(path, architecture, variant, suite, mirror, phase, verbose):
 
     arch_cmd = '--arch=' + architecture
 
-    cmd = ['sudo', 'debootstrap', variant_cmd, arch_cmd, suite, path, mirror]
+    # The proxy is passed via the environment rather than by rewriting the mirror,
+    # since debootstrap writes the mirror to the sources.list of the chroot.
+    if proxy:
+        cmd = ['sudo', 'env', 'http_proxy=' + proxy, 'debootstrap', variant_cmd, arch_cmd, suite, path, mirror]
+    else:
+        cmd = ['sudo', 'debootstrap', variant_cmd, arch_cmd, suite, path, mirror]
 
     run_command(cmd, phase, verbose)
+
+
+def get_version(phase):
+    """
+    Gets the version string of the installed debootstrap (e.g. 'debootstrap 1.0.95').
+    :param phase: a message key which describes the current phase. This is used if something fails.
+    :return: The version string.
+    """
+    return get_command_output(['debootstrap', '--version'], phase).strip()
@@ -17,13 +17,16 @@
 
 ########################################################
 import configparser
+import io
 import os
-import tempfile
+from collections import namedtuple
 
-from system.command import run_command
+import system.privileged as privileged
+from resources.messages import get as _
+from system.command import run_command, get_command_output, ProcessFailedException
 
 
-def create_schroot_config(name, path, directory, user, group, phase, verbose):
+def create_schroot_config(name, path, directory, user, group, phase, verbose, options=None):
     """
     Creates a new schroot config file.
     :param name: The schroot name.
@@ -33,6 +36,7 @@ def create_schroot_config(name, path, directory, user, group, phase, verbose):
     :param group: The group which will be allowed to enter the schroot
     :param phase: a message key which describes the current phase. This is used if something fails.
     :param verbose: True, if a more verbose output is desired.
+    :param options: A dictionary of additional (e.g. custom) options for the schroot config.
     """
     config = configparser.ConfigParser()
     description = name + ' Slingring Universe'
@@ -45,6 +49,9 @@ def create_schroot_config(name, path, directory, user, group, phase, verbose):
     config[name]['root-users'] = user
     config[name]['root-groups'] = "root"
     config[name]['profile'] = "slingring-setup"
+    if options:
+        for option_name, option_value in options.items():
+            config[name][option_name] = option_value
     _write_config_file_as_root(config, path, phase, verbose)
 
 
@@ -59,23 +66,104 @@ def execute_in_schroot(name, command, sudo, phase, verbose, env=None):
     :param env: A dictionary containing environment variables which should be present within the schroot
                 for the time of execution (e.g. { 'VARIABLE': 'content' })
     """
-    effective_command = []
-    if sudo:
-        effective_command.append('sudo')
-    effective_command.append('schroot')
-    effective_command.append('-c')
-    effective_command.append(name)
-    effective_command.append('--directory')
-    effective_command.append('/')
-    effective_command.append('--')
-    effective_command.append('/bin/bash')
-    effective_command.append('-c')
-    environment_exports = str()
-    if env:
-        for variable_name, variable_value in env.items():
-            environment_exports += "export {}={};".format(variable_name, variable_value)
-    effective_command.append(environment_exports + command)
-    run_command(effective_command, phase, verbose)
+    run_command(_schroot_command(['-c', name], command, sudo, env), phase, verbose)
+
+
+def execute_batch_in_schroot(name, commands, phase, verbose, env=None):
+    """
+    Executes the given commands one after another within a single session of the given schroot,
+    so the schroot setup (copying files, mounting file systems etc.) only happens once.
+    :param name: The schroot name.
+    :param commands: An ordered list of SchrootCommand tuples.
+    :param phase: a message key which describes the current phase. This is used if something fails.
+    :param verbose: True, if a more verbose output is desired.
+    :param env: A dictionary containing environment variables which should be present within the schroot
+                for the time of execution (e.g. { 'VARIABLE': 'content' })
+    :return: A list containing the process output of every command.
+    """
+    with SchrootSession(name, phase, verbose) as session:
+        return session.execute_batch(commands, phase, env)
+
+
+# A command which is executed within a schroot session. sudo is True, if it shall be executed as root.
+SchrootCommand = namedtuple('SchrootCommand', ['command', 'sudo'])
+
+
+class SchrootSession:
+    """
+    A schroot session, which stays active until it is ended. Every command executed within the session
+    shares the same setup, so the setup scripts only run once. The session is started by the calling
+    user, commands may be executed as root nonetheless (see SchrootCommand).
+    """
+
+    def __init__(self, name, phase, verbose):
+        """
+        :param name: The schroot name.
+        :param phase: a message key which describes the current phase. This is used if something fails.
+        :param verbose: True, if a more verbose output is desired.
+        """
+        self.name = name
+        self.phase = phase
+        self.verbose = verbose
+        self.session_id = None
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.end()
+
+    def begin(self):
+        """
+        Begins the session. This runs the setup scripts of the schroot.
+        """
+        self.session_id = get_command_output(['schroot', '--begin-session', '-c', self.name], self.phase).strip()
+
+    def end(self):
+        """
+        Ends the session, if it has been started. This runs the teardown of the schroot setup scripts.
+        """
+        if self.session_id:
+            session_id = self.session_id
+            self.session_id = None
+            run_command(['schroot', '--end-session', '-c', session_id], self.phase, self.verbose)
+
+    def execute(self, command, sudo, phase, env=None, verbose=None):
+        """
+        Executes the given command string within the session.
+        :param command: The command as a single string.
+        :param sudo: True, if the command shall be executed as root.
+        :param phase: a message key which describes the current phase. This is used if something fails.
+        :param env: A dictionary containing environment variables which should be present within the schroot
+                    for the time of execution (e.g. { 'VARIABLE': 'content' })
+        :param verbose: Overrides the verbosity of the session for this command, e.g. False to capture the
+                        output of a command which runs concurrently to others.
+        :return: The process output of the command.
+        """
+        if verbose is None:
+            verbose = self.verbose
+        return run_command(_schroot_command(['--run-session', '-c', self.session_id], command, sudo, env), phase,
+                           verbose)
+
+    def execute_batch(self, commands, phase, env=None):
+        """
+        Executes the given commands one after another within the session. The execution stops at the
+        first failing command, which is reported along with its position in the batch.
+        :param commands: An ordered list of SchrootCommand tuples.
+        :param phase: a message key which describes the current phase. This is used if something fails.
+        :param env: A dictionary containing environment variables which should be present within the schroot
+                    for the time of execution (e.g. { 'VARIABLE': 'content' })
+        :return: A list containing the process output of every command.
+        """
+        results = []
+        for index, schroot_command in enumerate(commands):
+            try:
+                results.append(self.execute(schroot_command.command, schroot_command.sudo, phase, env))
+            except ProcessFailedException:
+                print(_('schroot-batch-failed').format(index + 1, len(commands), schroot_command.command))
+                raise
+        return results
 
 
 def change_schroot_profile(name, path, profile, phase, verbose):
@@ -109,14 +197,51 @@ def change_schroot_name(current_name, new_name, current_path, new_path, phase, v
     config[new_name] = config[current_name]
     config[new_name]['description'] = new_name + ' Slingring Universe'
     config.remove_section(current_name)
-    run_command(['sudo', 'rm', current_path], phase, verbose)
+    privileged.remove(current_path, phase, verbose)
     _write_config_file_as_root(config, new_path, phase, verbose)
 
 
+def read_schroot_configs(directory):
+    """
+    Reads all schroot configs in the given directory.
+    :param directory: The schroot config directory (e.g. /etc/schroot/chroot.d).
+    :return: A dictionary containing the options of every schroot (key: name, value: options dictionary).
+    """
+    schroot_configs = dict()
+    if not os.path.isdir(directory):
+        return schroot_configs
+    for file in sorted(os.listdir(directory)):
+        config = configparser.ConfigParser(interpolation=None)
+        try:
+            config.read(os.path.join(directory, file))
+        except configparser.Error:
+            # not every config in chroot.d has been written by slingring
+            continue
+        for name in config.sections():
+            schroot_configs[name] = dict(config[name])
+    return schroot_configs
+
+
+def _schroot_command(schroot_arguments, command, sudo, env):
+    effective_command = []
+    if sudo:
+        effective_command.append('sudo')
+    effective_command.append('schroot')
+    effective_command.extend(schroot_arguments)
+    effective_command.append('--directory')
+    effective_command.append('/')
+    effective_command.append('--')
+    effective_command.append('/bin/bash')
+    effective_command.append('-c')
+    environment_exports = str()
+    if env:
+        for variable_name, variable_value in env.items():
+            environment_exports += "export {}={};".format(variable_name, variable_value)
+    effective_command.append(environment_exports + command)
+    return effective_command
+
+
 def _write_config_file_as_root(config_parser, path, phase, verbose):
-    with tempfile.TemporaryDirectory() as tempdir:
-        file_name = os.path.join(tempdir, 'temp.conf')
-        with open(file_name, 'w') as temp_file:
-            config_parser.write(temp_file, space_around_delimiters=False)
-        command = ['sudo', 'cp', file_name, path]
-        run_command(command, phase, verbose)
+    content = io.StringIO()
+    config_parser.write(content, space_around_delimiters=False)
+    privileged.write_file(path, content.getvalue(), phase, verbose)
@@ -24,7 +24,20 @@ import yaml
 mandatory_attributes = ['arch', 'mirror', 'name', 'suite']
 
 _default_config = {
-    "universe-directory": "/var/lib/slingring"
+    "universe-directory": "/var/lib/slingring",
+    "image-cache-directory": "/var/cache/slingring/images",
+    "image-cache-size-limit": "10G",
+    "package-proxy": False,
+    "package-cache-directory": "/var/cache/slingring/packages",
+    "storage-mode": "directory",
+    "initializer-concurrency": 4,
+    "privileged-helper-command": "sudo",
+    "session-broker": False,
+    "session-broker-idle-timeout": 600,
+    "ansible-mount-namespace": True,
+    "answer-store": True,
+    "answer-store-password-file": None,
+    "lock-timeout": 60
 }
 
 
@@ -54,13 +67,13 @@ class ConfigurationHandler:
         :return: The desired value.
         """
         config_value = self._get_process_config_value(key)
-        if config_value:
+        if config_value is not None:
             return config_value
         config_value = self._get_local_config_value(key)
-        if config_value:
+        if config_value is not None:
             return config_value
         config_value = self._get_global_config_value(key)
-        if config_value:
+        if config_value is not None:
             return config_value
         return self._get_default_config_value(key)
 
@@ -129,6 +142,15 @@ def write_installation_configuration(path, location):
     _write_yaml_file(path, {'location': location})
 
 
+def write_configuration(path, content):
+    """
+    Writes the given configuration dictionary to the given path.
+    :param path: The location of the configuration file.
+    :param content: The configuration as a dictionary.
+    """
+    _write_yaml_file(path, content)
+
+
 def read_configuration(path):
     """
     Reads the configuration file from the given path.
@@ -154,8 +176,8 @@ def _load_yaml_file(path):
     :param path: the path to the configuration file
     :return: the file content as object
     """
-    yaml_file = open(path, 'r')
-    configuration = yaml.safe_load(yaml_file)
+    with open(path, 'r') as yaml_file:
+        configuration = yaml.safe_load(yaml_file)
     return configuration
 
 
@@ -165,8 +187,8 @@ def _write_yaml_file(path, content):
     :param path: the path to the configuration file
     :return: the file content as object
     """
-    yaml_file = open(path, 'w')
-    yaml.safe_dump(content, yaml_file, default_flow_style=False)
+    with open(path, 'w') as yaml_file:
+        yaml.safe_dump(content, yaml_file, default_flow_style=False)
 
 
 class MissingAttributesError(Exception):
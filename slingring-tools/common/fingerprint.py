@@ -0,0 +1,81 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import hashlib
+import os
+import stat
+
+
+def fingerprint_values(*values):
+    """
+    Calculates a fingerprint of the given values. The values are compared by their
+    string representation, so they should be simple types (strings, numbers, None) or
+    dictionaries/lists of simple types.
+    :param values: The values.
+    :return: The fingerprint as a hex string.
+    """
+    digest = hashlib.sha256()
+    for value in values:
+        digest.update(_canonical_string(value).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def fingerprint_tree(path, excluded_paths=()):
+    """
+    Calculates a fingerprint of the given directory tree, which changes whenever a file
+    or directory is added, removed or renamed, or the content, the executable flag or
+    the link target of a file changes.
+    :param path: The path of the directory.
+    :param excluded_paths: Paths relative to the directory which should not be taken into account
+                           (e.g. generated files).
+    :return: The fingerprint as a hex string.
+    """
+    excluded_paths = [os.path.normpath(excluded_path) for excluded_path in excluded_paths]
+    digest = hashlib.sha256()
+    for directory_path, directory_names, file_names in os.walk(path):
+        relative_directory_path = os.path.relpath(directory_path, path)
+        directory_names[:] = sorted(name for name in directory_names
+                                    if os.path.normpath(os.path.join(relative_directory_path, name))
+                                    not in excluded_paths)
+        digest.update('d {}\0'.format(relative_directory_path).encode('utf-8'))
+        for file_name in sorted(file_names):
+            file_path = os.path.join(directory_path, file_name)
+            relative_file_path = os.path.join(relative_directory_path, file_name)
+            if os.path.normpath(relative_file_path) in excluded_paths:
+                continue
+            if os.path.islink(file_path):
+                digest.update('l {} {}\0'.format(relative_file_path, os.readlink(file_path)).encode('utf-8'))
+                continue
+            executable = bool(os.stat(file_path).st_mode & stat.S_IXUSR)
+            digest.update('f {} {}\0'.format(relative_file_path, executable).encode('utf-8'))
+            with open(file_path, 'rb') as file:
+                for chunk in iter(lambda: file.read(64 * 1024), b''):
+                    digest.update(chunk)
+            digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _canonical_string(value):
+    if isinstance(value, dict):
+        return '{' + ','.join('{}:{}'.format(_canonical_string(key), _canonical_string(value[key]))
+                              for key in sorted(value, key=str)) + '}'
+    if isinstance(value, (list, tuple)):
+        return '[' + ','.join(_canonical_string(item) for item in value) + ']'
+    return repr(value)
@@ -0,0 +1,130 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+# This is an Ansible callback plugin. It runs within the Python interpreter of Ansible
+# (which might be Python 2), so it must not import anything from slingring.
+
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+import json
+import os
+import time
+
+from ansible.plugins.callback import CallbackBase
+
+DOCUMENTATION = '''
+    callback: slingring_timing
+    type: aggregate
+    short_description: Records the duration of every task for slingring.
+    description:
+      - Writes a JSON file containing the role, task, host, duration and result of every task
+        to the given directory when the playbook has finished.
+    options:
+      output_dir:
+        description: The directory to write the timing records to.
+        ini:
+          - section: callback_slingring_timing
+            key: output_dir
+        env:
+          - name: SLINGRING_TIMING_DIR
+'''
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'slingring_timing'
+    CALLBACK_NEEDS_WHITELIST = True
+    CALLBACK_NEEDS_ENABLED = True
+
+    def __init__(self):
+        super(CallbackModule, self).__init__()
+        self._playbook = None
+        self._start = None
+        self._task = None
+        self._task_start = None
+        self._tasks = []
+
+    def v2_playbook_on_start(self, playbook):
+        self._playbook = os.path.basename(playbook._file_name)
+        self._start = time.time()
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        self._task = task
+        self._task_start = time.time()
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self.v2_playbook_on_task_start(task, False)
+
+    def v2_runner_on_ok(self, result):
+        self._record(result, 'changed' if result._result.get('changed', False) else 'ok')
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self._record(result, 'failed')
+
+    def v2_runner_on_skipped(self, result):
+        self._record(result, 'skipped')
+
+    def v2_runner_on_unreachable(self, result):
+        self._record(result, 'unreachable')
+
+    def v2_playbook_on_stats(self, stats):
+        output_dir = self._output_dir()
+        if not output_dir or self._start is None:
+            return
+        record = {
+            'playbook': self._playbook,
+            'start': self._start,
+            'duration': time.time() - self._start,
+            'tasks': self._tasks
+        }
+        if not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        file_path = os.path.join(output_dir, '{}-{}.json'.format(
+            time.strftime('%Y%m%dT%H%M%S', time.localtime(self._start)), os.getpid()))
+        with open(file_path, 'w') as record_file:
+            json.dump(record, record_file, indent=2)
+        # Ansible runs as root, but the records belong to the user who started slingring.
+        if 'SUDO_UID' in os.environ and 'SUDO_GID' in os.environ:
+            os.chown(file_path, int(os.environ['SUDO_UID']), int(os.environ['SUDO_GID']))
+
+    def _record(self, result, status):
+        task = result._task
+        start = self._task_start if self._task is not None and task._uuid == self._task._uuid else None
+        role = task._role.get_name() if task._role else None
+        name = task.get_name()
+        # newer Ansible versions prefix the task name with the role name
+        if role and name.startswith(role + ' : '):
+            name = name[len(role) + 3:]
+        self._tasks.append({
+            'role': role,
+            'task': name,
+            'host': result._host.get_name(),
+            'duration': time.time() - start if start is not None else 0.0,
+            'status': status
+        })
+
+    def _output_dir(self):
+        try:
+            return self.get_option('output_dir')
+        except (AttributeError, KeyError):
+            # older Ansible versions do not pass the options to callback plugins
+            return os.environ.get('SLINGRING_TIMING_DIR')
@@ -0,0 +1,414 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+# This is an Ansible connection plugin. It runs within the Python interpreter of Ansible
+# (which might be Python 2), so it must not import anything from slingring.
+
+from __future__ import (absolute_import, division, print_function)
+
+__metaclass__ = type
+
+import base64
+import errno
+import fcntl
+import getpass
+import hashlib
+import json
+import os
+import socket
+import stat
+import struct
+import subprocess
+import time
+
+from ansible.errors import AnsibleError, AnsibleFileNotFound
+from ansible.plugins.connection import ConnectionBase
+
+try:
+    from ansible.utils.display import Display
+
+    display = Display()
+except ImportError:
+    display = None
+
+DOCUMENTATION = '''
+    connection: slingring_chroot
+    short_description: Runs tasks in a chroot using a persistent agent.
+    description:
+      - Runs commands and transfers files through an agent which is started once inside the chroot
+        and serves all tasks of the playbook run, instead of starting a new chroot process per command.
+      - Falls back to a chroot process per command if the agent cannot be started
+        (e.g. if there is no Python interpreter in the chroot yet).
+    options:
+      remote_addr:
+        description: The path of the chroot.
+        default: inventory_hostname
+        vars:
+          - name: ansible_host
+'''
+
+# The size of the chunks in which files are transferred.
+_chunk_size = 1024 * 1024
+
+# The time the agent may take to start (in seconds).
+_startup_timeout = 10
+
+# The directory of the agent sockets within the chroot. It is only accessible by root, so no other user
+# can connect to an agent or pose as one.
+_agent_directory = '/run/slingring-agent'
+
+# The agent is started with the Python interpreter of the chroot (which might be Python 2). It serves the
+# requests of the connections to a Unix socket in the agent directory. Only processes of the same user (root)
+# may connect. It exits when the Ansible process which started it is gone or if it has not been used for a while.
+_agent_source = r'''
+import base64, errno, json, os, socket, struct, subprocess, sys, threading, time
+
+IDLE_TIMEOUT = 300
+
+
+def b64(data):
+    return base64.b64encode(data).decode('ascii')
+
+
+def execute(request):
+    process = subprocess.Popen([request['executable'], '-c', request['command']], stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate(base64.b64decode(request['stdin']) if request.get('stdin') else None)
+    return {'rc': process.returncode, 'stdout': b64(stdout), 'stderr': b64(stderr)}
+
+
+def put(request):
+    with open(request['path'], 'ab' if request['append'] else 'wb') as target:
+        target.write(base64.b64decode(request['data']))
+    return {}
+
+
+def fetch(request):
+    with open(request['path'], 'rb') as source:
+        source.seek(request['offset'])
+        data = source.read(request['size'])
+    return {'data': b64(data), 'eof': len(data) < request['size']}
+
+
+OPERATIONS = {'exec': execute, 'put': put, 'fetch': fetch, 'ping': lambda request: {}}
+
+
+class Agent(object):
+    def __init__(self, owner):
+        self.owner = owner
+        self.lock = threading.Lock()
+        self.active = 0
+        self.last_used = time.time()
+
+    def serve(self, server):
+        while True:
+            try:
+                connection, address = server.accept()
+            except socket.timeout:
+                if not self.owner_alive() or self.idle():
+                    return
+                continue
+            connection.settimeout(None)
+            with self.lock:
+                self.active += 1
+            thread = threading.Thread(target=self.handle, args=(connection,))
+            thread.daemon = True
+            thread.start()
+
+    def handle(self, connection):
+        try:
+            credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+            if struct.unpack('3i', credentials)[1] != os.getuid():
+                return
+            stream = connection.makefile('rwb')
+            while True:
+                line = stream.readline()
+                if not line:
+                    return
+                request = json.loads(line.decode('utf-8'))
+                try:
+                    response = OPERATIONS[request['op']](request)
+                except Exception as exception:
+                    response = {'error': '{0}: {1}'.format(type(exception).__name__, exception)}
+                stream.write(json.dumps(response).encode('utf-8') + b'\n')
+                stream.flush()
+        finally:
+            connection.close()
+            with self.lock:
+                self.active -= 1
+                self.last_used = time.time()
+
+    def owner_alive(self):
+        try:
+            os.kill(self.owner, 0)
+        except OSError as error:
+            return error.errno == errno.EPERM
+        return True
+
+    def idle(self):
+        with self.lock:
+            return self.active == 0 and time.time() - self.last_used > IDLE_TIMEOUT
+
+
+def main():
+    os.chdir('/')
+    os.umask(0o077)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(sys.argv[1])
+    try:
+        server.listen(8)
+        server.settimeout(1.0)
+        # the agent has started, so it detaches from the pipes of the connection which started it
+        null = os.open(os.devnull, os.O_RDWR)
+        for descriptor in (0, 1, 2):
+            os.dup2(null, descriptor)
+        Agent(int(sys.argv[2])).serve(server)
+    finally:
+        os.unlink(sys.argv[1])
+
+
+main()
+'''
+
+# Starts the agent with the first Python interpreter found in the chroot.
+_launcher = ('for interpreter in python3 python; do '
+             'if command -v "$interpreter" >/dev/null 2>&1; then exec "$interpreter" -c "$0" "$@"; fi; '
+             'done; echo "no Python interpreter found" >&2; exit 127')
+
+
+class Connection(ConnectionBase):
+    """
+    Runs tasks in a chroot using a persistent agent.
+    """
+
+    transport = 'slingring_chroot'
+    has_pipelining = True
+    has_tty = False
+    default_user = getpass.getuser()
+
+    def __init__(self, play_context, new_stdin, *args, **kwargs):
+        super(Connection, self).__init__(play_context, new_stdin, *args, **kwargs)
+        self.chroot = self._play_context.remote_addr
+        if os.geteuid() != 0:
+            raise AnsibleError('slingring_chroot connection requires running as root')
+        if not os.path.isdir(self.chroot):
+            raise AnsibleError('{0} is not a directory'.format(self.chroot))
+        self._socket = None
+        self._stream = None
+
+    def _connect(self):
+        super(Connection, self)._connect()
+        if not self._connected:
+            self._socket = self._connect_agent()
+            if self._socket is not None:
+                self._stream = self._socket.makefile('rwb')
+            self._connected = True
+        return self
+
+    def exec_command(self, cmd, in_data=None, sudoable=False):
+        super(Connection, self).exec_command(cmd, in_data=in_data, sudoable=sudoable)
+        executable = self._play_context.executable or '/bin/sh'
+        if self._stream is None:
+            process = subprocess.Popen(['chroot', self.chroot, executable, '-c', cmd], stdin=subprocess.PIPE,
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            stdout, stderr = process.communicate(in_data)
+            return process.returncode, stdout, stderr
+        response = self._request({'op': 'exec', 'executable': executable, 'command': cmd,
+                                  'stdin': _encode(in_data) if in_data else None})
+        if 'error' in response:
+            raise AnsibleError('failed to execute the command in {0}: {1}'.format(self.chroot, response['error']))
+        return response['rc'], base64.b64decode(response['stdout']), base64.b64decode(response['stderr'])
+
+    def put_file(self, in_path, out_path):
+        super(Connection, self).put_file(in_path, out_path)
+        out_path = _absolute_path(out_path)
+        if not os.path.exists(in_path):
+            raise AnsibleFileNotFound('file or module does not exist: {0}'.format(in_path))
+        if self._stream is None:
+            with open(in_path, 'rb') as source:
+                rc, stdout, stderr = self.exec_command('dd of={0} bs={1}'.format(_quote(out_path), _chunk_size),
+                                                       in_data=source.read())
+            if rc != 0:
+                raise AnsibleError('failed to transfer file {0} to {1}:\n{2}'.format(in_path, out_path, stderr))
+            return
+        with open(in_path, 'rb') as source:
+            append = False
+            while True:
+                data = source.read(_chunk_size)
+                response = self._request({'op': 'put', 'path': out_path, 'data': _encode(data), 'append': append})
+                if 'error' in response:
+                    raise AnsibleError('failed to transfer file {0} to {1}:\n{2}'.format(in_path, out_path,
+                                                                                       response['error']))
+                if len(data) < _chunk_size:
+                    return
+                append = True
+
+    def fetch_file(self, in_path, out_path):
+        super(Connection, self).fetch_file(in_path, out_path)
+        in_path = _absolute_path(in_path)
+        if self._stream is None:
+            rc, stdout, stderr = self.exec_command('cat {0}'.format(_quote(in_path)))
+            if rc != 0:
+                raise AnsibleError('failed to transfer file {0} to {1}:\n{2}'.format(in_path, out_path, stderr))
+            with open(out_path, 'wb') as target:
+                target.write(stdout)
+            return
+        with open(out_path, 'wb') as target:
+            offset = 0
+            while True:
+                response = self._request({'op': 'fetch', 'path': in_path, 'offset': offset, 'size': _chunk_size})
+                if 'error' in response:
+                    raise AnsibleError('failed to transfer file {0} to {1}:\n{2}'.format(in_path, out_path,
+                                                                                       response['error']))
+                data = base64.b64decode(response['data'])
+                target.write(data)
+                offset += len(data)
+                if response['eof']:
+                    return
+
+    def close(self):
+        # the agent keeps running for the next task
+        super(Connection, self).close()
+        if self._socket is not None:
+            self._stream.close()
+            self._socket.close()
+        self._socket = None
+        self._stream = None
+        self._connected = False
+
+    def reset(self):
+        self.close()
+
+    def _request(self, request):
+        self._stream.write(json.dumps(request).encode('utf-8') + b'\n')
+        self._stream.flush()
+        line = self._stream.readline()
+        if not line:
+            raise AnsibleError('the agent in {0} closed the connection'.format(self.chroot))
+        return json.loads(line.decode('utf-8'))
+
+    def _connect_agent(self):
+        """
+        Connects to the agent of this playbook run in the chroot and starts it if necessary.
+        :return: The connected socket or None, if the agent cannot be started.
+        """
+        # The agent belongs to the Ansible process, which is the parent of the worker processes.
+        owner = os.getppid()
+        chroot = os.path.realpath(self.chroot)
+        name = hashlib.sha1('{0}:{1}'.format(chroot, owner).encode('utf-8')).hexdigest()[:16]
+        directory = os.path.join(chroot, _agent_directory.lstrip('/'))
+        try:
+            _create_private_directory(directory)
+            directory_descriptor = os.open(directory, os.O_RDONLY)
+        except (OSError, AnsibleError) as error:
+            if display:
+                display.vvv('cannot use the agent in {0}, running a chroot process per command: {1}'
+                            .format(self.chroot, error), host=self.chroot)
+            return None
+        try:
+            # the socket is addressed relative to the directory, the path within the chroot might be too long
+            address = '/proc/self/fd/{0}/{1}'.format(directory_descriptor, name)
+            # the worker processes of a playbook run start the agent one at a time
+            with open(os.path.join(directory, name + '.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                connection = _try_connect(address)
+                if connection is not None:
+                    return connection
+                # the socket of an agent which has been killed
+                if os.path.lexists(address):
+                    os.unlink(address)
+                return self._start_agent(address, _agent_directory + '/' + name, owner)
+        finally:
+            os.close(directory_descriptor)
+
+    def _start_agent(self, address, path_in_chroot, owner):
+        with open(os.devnull, 'rb') as null:
+            agent = subprocess.Popen(['chroot', self.chroot, '/bin/sh', '-c', _launcher, _agent_source,
+                                      path_in_chroot, str(owner)], stdin=null, stdout=null, stderr=subprocess.PIPE,
+                                     preexec_fn=os.setsid)
+        deadline = time.time() + _startup_timeout
+        while time.time() < deadline:
+            # chroot and the launcher exec the interpreter, so the agent keeps the process id
+            connection = _try_connect(address, agent.pid)
+            if connection is not None:
+                agent.stderr.close()
+                return connection
+            if agent.poll() is not None and agent.returncode != 0:
+                break
+            time.sleep(0.05)
+        if agent.poll() is None:
+            agent.kill()
+        stderr = agent.stderr.read().decode('utf-8', 'replace').strip()
+        agent.stderr.close()
+        agent.wait()
+        if display:
+            display.vvv('could not start the agent in {0}, running a chroot process per command: {1}'
+                        .format(self.chroot, stderr), host=self.chroot)
+        return None
+
+
+def _create_private_directory(path):
+    # Creates a directory which only root can access. An existing directory is only used if it is
+    # a real directory owned by root and not accessible by anybody else.
+    parent = os.path.dirname(path)
+    if not os.path.isdir(parent):
+        os.makedirs(parent, 0o755)
+    # a symbolic link could lead out of the chroot
+    if os.path.realpath(parent) != parent:
+        raise AnsibleError('{0} is a symbolic link'.format(parent))
+    try:
+        os.mkdir(path, 0o700)
+    except OSError as error:
+        if error.errno != errno.EEXIST:
+            raise
+    status = os.lstat(path)
+    if not stat.S_ISDIR(status.st_mode) or status.st_uid != 0 or stat.S_IMODE(status.st_mode) & 0o077:
+        raise AnsibleError('{0} is not a private directory of root'.format(path))
+
+
+def _try_connect(address, agent_pid=None):
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(address)
+        # only an agent running as root is trusted with the module payloads
+        credentials = connection.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        pid, uid, _ = struct.unpack('3i', credentials)
+        if uid != 0 or (agent_pid is not None and pid != agent_pid):
+            connection.close()
+            return None
+    except socket.error:
+        connection.close()
+        return None
+    return connection
+
+
+def _encode(data):
+    if not isinstance(data, bytes):
+        data = data.encode('utf-8')
+    return base64.b64encode(data).decode('ascii')
+
+
+def _absolute_path(path):
+    if not path.startswith(os.path.sep):
+        path = os.path.join(os.path.sep, path)
+    return os.path.normpath(path)
+
+
+def _quote(value):
+    return "'" + value.replace("'", "'\"'\"'") + "'"
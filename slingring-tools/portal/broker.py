@@ -0,0 +1,227 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+# The session broker is an optional per-user daemon which keeps the schroot sessions of recently
+# used universes warm. The launcher asks the broker for a session over a Unix socket instead of
+# creating it itself and the broker ends a session only after it has been idle for a while (no
+# open portals, no processes inside). The sessions keep their usual names (<name>-seu-session),
+# so they can still be managed using the plain schroot tools.
+#
+# Run 'python3 -m portal.broker' from the slingring-tools directory to start the broker manually.
+# The launcher starts it automatically if the 'session-broker' configuration value is set.
+
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import portal.session as sessions
+from common.configuration import ConfigurationHandler
+from portal.session import SessionState, session_name
+
+# The number of seconds between two checks for idle sessions.
+_check_interval = 10
+
+# The number of seconds the launcher waits for a freshly started broker.
+_startup_timeout = 5
+
+
+def broker_socket_path():
+    """
+    :return: The path of the Unix socket of the session broker of the current user.
+    """
+    runtime_directory = os.environ.get('XDG_RUNTIME_DIR')
+    if not runtime_directory:
+        runtime_directory = os.path.join(tempfile.gettempdir(), 'slingring-{}'.format(os.getuid()))
+    return os.path.join(runtime_directory, 'slingring', 'broker.sock')
+
+
+def acquire_session(universe_name, display=None):
+    """
+    Asks the session broker to prepare the session of the given universe (create or recover it).
+    The broker is started if it is not running yet.
+    :param universe_name: The name of the universe.
+    :param display: The X11 display whose authority is copied into the universe if the session is created.
+    :return: The broker response (a dictionary containing the 'session' name, whether it has been 'created'
+             and whether it is 'valid') or None if the broker is not available.
+    """
+    request = {'operation': 'acquire', 'universe': universe_name, 'display': display}
+    response = _send_request(request)
+    if response is None and _start_broker():
+        response = _send_request(request)
+    return response
+
+
+def release_session(universe_name):
+    """
+    Tells the session broker that a portal to the given universe has been closed.
+    :param universe_name: The name of the universe.
+    :return: The broker response or None if the broker is not available.
+    """
+    return _send_request({'operation': 'release', 'universe': universe_name})
+
+
+class SessionBroker:
+    def __init__(self, idle_timeout):
+        """
+        Keeps track of the brokered sessions and ends them once they have been idle for the given time.
+        :param idle_timeout: The number of seconds a session without portals and processes is kept.
+        """
+        self.idle_timeout = idle_timeout
+        self._last_used = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, universe_name, display):
+        """
+        Prepares the session of the given universe. Sessions which are invalid are recovered,
+        unless there are still processes running inside them (the launcher asks the user in that case).
+        :param universe_name: The name of the universe.
+        :param display: The X11 display whose authority is copied into the universe.
+        :return: The response for the launcher.
+        """
+        session = session_name(universe_name)
+        with self._lock:
+            created = False
+            state = SessionState.probe(session)
+            if not state.exists:
+                sessions.create_session(universe_name, display)
+                created = True
+                state = SessionState.probe(session)
+            if state.exists and not state.is_valid() and sessions.processes_stopped(universe_name):
+                sessions.recover_session(session)
+                state = SessionState.probe(session)
+            self._last_used[universe_name] = time.monotonic()
+            return {'session': session, 'created': created, 'valid': state.is_valid()}
+
+    def release(self, universe_name):
+        """
+        Marks the session of the given universe as used right now, so its idle period starts.
+        :param universe_name: The name of the universe.
+        :return: The response for the launcher.
+        """
+        with self._lock:
+            self._last_used[universe_name] = time.monotonic()
+        return {'session': session_name(universe_name)}
+
+    def end_idle_sessions(self):
+        """
+        Ends all brokered sessions which have neither portals nor processes and have been idle
+        for longer than the idle timeout.
+        :return: The number of sessions which are still brokered.
+        """
+        with self._lock:
+            now = time.monotonic()
+            for universe_name, last_used in list(self._last_used.items()):
+                state = SessionState.probe(session_name(universe_name))
+                if not state.exists:
+                    del self._last_used[universe_name]
+                elif state.is_running():
+                    self._last_used[universe_name] = now
+                elif now - last_used >= self.idle_timeout and sessions.processes_stopped(universe_name):
+                    sessions.end_session(state.session)
+                    del self._last_used[universe_name]
+            return len(self._last_used)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode('UTF-8'))
+            if request.get('operation') == 'acquire':
+                response = self.server.broker.acquire(request['universe'], request.get('display'))
+            elif request.get('operation') == 'release':
+                response = self.server.broker.release(request['universe'])
+            elif request.get('operation') == 'ping':
+                response = {}
+            else:
+                response = {'error': 'unsupported operation'}
+        except (ValueError, KeyError) as e:
+            response = {'error': str(e)}
+        self.wfile.write((json.dumps(response) + '\n').encode('UTF-8'))
+
+
+class _BrokerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def run_broker():
+    """
+    Runs the session broker until it has not brokered any session for the idle timeout.
+    """
+    idle_timeout = int(ConfigurationHandler().get_config_value('session-broker-idle-timeout'))
+    socket_path = broker_socket_path()
+    os.makedirs(os.path.dirname(socket_path), mode=0o700, exist_ok=True)
+    if _send_request({'operation': 'ping'}) is not None:
+        # another broker is already running
+        return
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+
+    server = _BrokerServer(socket_path, _RequestHandler)
+    server.broker = SessionBroker(idle_timeout)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    unused_since = time.monotonic()
+    try:
+        while True:
+            time.sleep(_check_interval)
+            if server.broker.end_idle_sessions():
+                unused_since = time.monotonic()
+            elif time.monotonic() - unused_since >= idle_timeout:
+                break
+    finally:
+        server.shutdown()
+        server.server_close()
+        os.remove(socket_path)
+
+
+def _send_request(request):
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(broker_socket_path())
+            client.sendall((json.dumps(request) + '\n').encode('UTF-8'))
+            with client.makefile('rb') as response:
+                line = response.readline()
+    except OSError:
+        return None
+    if not line:
+        return None
+    response = json.loads(line.decode('UTF-8'))
+    return None if 'error' in response else response
+
+
+def _start_broker():
+    tools_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.Popen([sys.executable, '-m', 'portal.broker'], cwd=tools_directory, start_new_session=True,
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + _startup_timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(broker_socket_path()):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+if __name__ == '__main__':
+    run_broker()
@@ -0,0 +1,104 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import os
+import signal
+import subprocess
+import time
+
+import portal.broker as broker
+import portal.session as sessions
+import universe.workflow.tools.index as index
+from common.configuration import ConfigurationHandler
+from portal.session import SessionState, session_name, portal_command
+from resources.messages import get as _
+
+# Environment variables which are passed into the portal.
+_exported_variables = ['DISPLAY', 'SSH_AUTH_SOCK', 'DBUS_SESSION_BUS_ADDRESS']
+
+
+def open_portal(universe_name, command=None):
+    """
+    Opens a portal to the given universe. All portals of a universe share a single schroot session,
+    which is created by the first portal and ended by the last one. If the session is invalid
+    (e.g. after a reboot), it is recovered first.
+
+    If the session broker is enabled, the broker prepares the session and keeps it after the
+    last portal has been closed. It ends the session once it has been idle for a while.
+    :param universe_name: The name of the universe.
+    :param command: The command to run in the universe (defaults to a login shell).
+    :return: The exit code of the launcher.
+    """
+    session = session_name(universe_name)
+    brokered = False
+    if ConfigurationHandler().get_config_value('session-broker'):
+        response = broker.acquire_session(universe_name, os.environ.get('DISPLAY'))
+        if response is not None:
+            brokered = True
+            if response.get('created'):
+                print(_('session-creating'))
+    state = SessionState.probe(session)
+
+    if not state.exists:
+        print(_('session-creating'))
+        sessions.create_session(universe_name, os.environ.get('DISPLAY'))
+        state = SessionState.probe(session)
+
+    while not state.is_valid():
+        if not sessions.processes_stopped(universe_name):
+            print(_('session-invalid-processes-running'))
+            print()
+            input(_('press-any-key'))
+        else:
+            sessions.recover_session(session)
+            if not SessionState.probe(session).is_valid():
+                print(_('session-recovery-failed'))
+                print()
+                input(_('press-any-key'))
+        state = SessionState.probe(session)
+
+    index.update_entry(universe_name, last_session=int(time.time()))
+    _run_portal(session, command or '/bin/bash -l')
+
+    if brokered:
+        broker.release_session(universe_name)
+        return 0
+    if SessionState.probe(session).is_running():
+        return 0
+    if not sessions.processes_stopped(universe_name):
+        print()
+        print(_('last-portal-closed-processes-running'))
+        return 0
+    return sessions.end_session(session)
+
+
+def _run_portal(session, command):
+    export_string = ''
+    for variable in _exported_variables:
+        if os.environ.get(variable):
+            export_string += ' export {}="{}";'.format(variable, os.environ[variable])
+    portal = portal_command(session) + ['--directory=' + os.path.expanduser('~'), '--',
+                                        '/bin/bash', '-c', '{} {}'.format(export_string, command)]
+    # CTRL+C is meant for the processes within the portal, not for the launcher
+    previous_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        subprocess.run(portal)
+    finally:
+        signal.signal(signal.SIGINT, previous_handler)
+
@@ -0,0 +1,160 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import os
+import re
+import subprocess
+
+from applications.schroot import read_schroot_configs
+from system.mounttable import mount_table
+from system.process import processes_within
+from universe.workflow.tools.paths import schroot_config_directory_path, session_name, session_mount_point, \
+    session_mount_path
+
+_schroot_session_directory = '/var/lib/schroot/session'
+
+# The mounts every valid portal session has (relative to the session's mount location).
+_required_mounts = ['/proc', '/sys', '/dev', '/dev/pts', '/tmp/.X11-unix']
+
+
+class SessionState:
+    def __init__(self, session, exists, portal_count):
+        """
+        The state of a portal session at a certain point in time (see probe).
+        :param session: The name of the schroot session.
+        :param exists: True, if schroot knows the session.
+        :param portal_count: The number of portals (schroot run-session clients) which are open.
+        """
+        self.session = session
+        self.exists = exists
+        self.portal_count = portal_count
+
+    @classmethod
+    def probe(cls, session):
+        """
+        Determines the state of the given session. This reads the schroot session directory and the
+        process list once instead of running external commands.
+        :param session: The name of the schroot session.
+        :return: The SessionState.
+        """
+        exists = os.path.isfile(os.path.join(_schroot_session_directory, session))
+        return cls(session, exists, _count_portals(session))
+
+    def is_valid(self):
+        """
+        Checks whether the session root and all virtual file systems the runtime profile mounts
+        into the session are present. The mount table is only read again if it has changed since
+        the last check.
+        :return: True, if the session is valid.
+        """
+        # the exact paths are checked, so the mounts of e.g. 'xfoo-seu-session' are not taken for 'foo-seu-session'
+        table = mount_table()
+        mount_point = session_mount_path(self.session)
+        if not table.is_mount_point(mount_point):
+            return False
+        return all(table.is_mount_point(os.path.join(mount_point, required_mount.lstrip('/')))
+                   for required_mount in _required_mounts)
+
+    def is_running(self):
+        """
+        :return: True, if there is at least one open portal to the session.
+        """
+        return self.portal_count > 0
+
+
+def portal_command(session):
+    """
+    :param session: The name of the schroot session.
+    :return: The leading arguments of the schroot command which runs a portal in the given session.
+             They are used to recognize open portals in the process list.
+    """
+    return ['schroot', '-r', '-c', session]
+
+
+def create_session(universe_name, display=None):
+    """
+    Creates the schroot session of the given universe. The X11 authority of the given
+    display is copied into the universe first.
+    :param universe_name: The name of the universe.
+    :param display: The X11 display (e.g. ':0') or None.
+    """
+    _export_x11_authority(universe_name, display or '')
+    subprocess.run(['schroot', '-b', '-c', universe_name, '-n', session_name(universe_name)],
+                   stdout=subprocess.DEVNULL)
+
+
+def recover_session(session):
+    """
+    Recovers the given schroot session, e.g. after a reboot (re-mounts the file systems etc.).
+    :param session: The name of the schroot session.
+    """
+    subprocess.run(['schroot', '--recover-session', '-c', session])
+
+
+def end_session(session):
+    """
+    Ends the given schroot session.
+    :param session: The name of the schroot session.
+    :return: The exit code of schroot.
+    """
+    return subprocess.run(['schroot', '-e', '-c', session]).returncode
+
+
+def processes_stopped(universe_name):
+    """
+    Checks whether all processes within the session of the given universe have been stopped.
+    :param universe_name: The name of the universe.
+    :return: True, if there are no processes running in the session.
+    """
+    return not processes_within([session_mount_point(universe_name)]).count
+
+
+def _export_x11_authority(universe_name, display):
+    # get the X11 authority into the chroot
+    try:
+        cookies = subprocess.run(['xauth', 'list'] + ([display] if display else []), stdout=subprocess.PIPE,
+                                 stderr=subprocess.DEVNULL)
+    except OSError:
+        return
+    cookie_lines = cookies.stdout.decode('UTF-8', errors='replace').splitlines()
+    if not cookie_lines:
+        return
+    cookie_name = re.sub(r'[: ]*MIT-MAGIC-COOKIE-[ a-f0-9]*', display, cookie_lines[0], count=1)
+    schroot_config = read_schroot_configs(schroot_config_directory_path()).get(universe_name)
+    if cookie_name and schroot_config:
+        authority_path = schroot_config['directory'] + os.path.join(os.path.expanduser('~'), '.Xauthority')
+        subprocess.run(['xauth', 'extract', authority_path, cookie_name])
+
+
+def _count_portals(session):
+    expected_arguments = portal_command(session)
+    count = 0
+    for entry in os.scandir('/proc'):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(os.path.join(entry.path, 'cmdline'), 'rb') as cmdline_file:
+                arguments = cmdline_file.read().decode('UTF-8', errors='replace').split('\0')
+        except OSError:
+            # the process has already exited
+            continue
+        if arguments and os.path.basename(arguments[0]) == expected_arguments[0] \
+                and arguments[1:len(expected_arguments)] == expected_arguments[1:]:
+            count += 1
+    return count
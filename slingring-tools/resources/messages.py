@@ -24,16 +24,79 @@ _msg = {
     'start':
         'Initializing "{}" universe.',
 
+    'clone-start':
+        'Copying the freshly bootstrapped base layout from {}...',
+
+    'install-batch-start':
+        'Installing {} universes, {} at a time. Universes with the same suite, architecture, variant and mirror '
+        'share their base layout. The output of each installation is written to a log file in ~/.slingring/logs.',
+
+    'install-duplicate-universes':
+        'Error: Several seeds describe universes with the same name: {}',
+
+    'resume-start':
+        'Resuming the installation of the "{}" universe. Completed phases will be skipped.',
+
     'update-start':
         'Updating "{}" universe. This will re-run the Ansible playbook on the chroot.',
 
+    'update-no-universe':
+        'Error: Please name the universes which should be updated or use --all to update all of them.',
+
+    'update-batch-start':
+        'Updating {} universes, {} at a time. The output of each update is written to the update.log file '
+        'in its local multiverse directory (e.g. ~/.slingring/multiverse/universe-name/update.log).',
+
+    'update-result-playbook':
+        'playbook run',
+
+    'update-result-roles':
+        'roles: {}',
+
+    'update-result-up-to-date':
+        'up to date',
+
+    'update-up-to-date':
+        'The playbook, its roles and the variables have not changed since the last run. Nothing to do. '
+        'Use --force to run the playbook anyway.',
+
+    'update-partial':
+        'Only the following roles have changed and will run again: {}',
+
     'list-start':
         'These are the available universes on this system:',
 
+    'universe-processes':
+        '{} processes using {}',
+
+    'universe-session-active':
+        'portal session active',
+
+    'du-universe':
+        'Disk usage of the universe "{}":',
+
+    'du-total':
+        'total',
+
+    'du-shared':
+        'of it in extents shared with other files (counted once)',
+
+    'du-no-chroot':
+        'The chroot of the universe "{}" does not exist.',
+
+    'du-all-universes':
+        'All universes use {} in total.',
+
+    'reindex-done':
+        'Indexed {} universes in {}.',
+
     'no-universes-found':
         '''There are not yet any universes on this system.
 Use 'universe install' to create your first universe.''',
 
+    'input-universe':
+        'The "{}" universe:',
+
     'input-header':
         '''This universe seed requests additional information. If you
 obtained this universe seed from an unsafe source, make sure to
@@ -41,18 +104,93 @@ check all included playbooks before providing credentials of any kind!
 
 Information requested by the universe seed:''',
 
+    'answer-store-create':
+        '''Your answers to the variables of universe seeds are kept in an encrypted answer store,
+so you will not be asked for them again. Please choose a password for the answer store.''',
+
+    'answer-store-new-password':
+        'New answer store password (will not be echoed): ',
+
+    'answer-store-repeat-password':
+        'Repeat the answer store password (will not be echoed): ',
+
+    'answer-store-password-mismatch':
+        'Error: The passwords do not match.',
+
+    'answer-store-password':
+        'Answer store password (will not be echoed): ',
+
+    'answer-store-wrong-password':
+        'The password is wrong.',
+
+    'answer-store-wrong-password-file':
+        'Error: The password in the answer store password file {} is wrong.',
+
+    'answer-store-password-file-unreadable':
+        'Error: The answer store password file {} cannot be read: {}',
+
+    'answer-store-answers-removed': 'Stored answers removed.',
+
+    'answer-store-phase':
+        'writing the answer store',
+
+    'lock-universe':
+        'The universe "{}"',
+
+    'lock-universe-directory':
+        'The universe directory',
+
+    'lock-waiting':
+        '{} is in use by {}. Waiting...',
+
+    'lock-timeout':
+        'Error: Gave up waiting after {} seconds. The lock is still held by {}.',
+
+    'lock-permission-denied':
+        'Error: The lock file {} cannot be opened. Make sure it is readable and writable by all users.',
+
+    'lock-holder-unknown':
+        'another process',
+
     'coffee-time':
         'That\'s it! Your universe will be ready shortly. Time to get a cup of coffee.',
 
     'debootstrap':
         'Bootstrapping "{} ({})" base layout...',
 
+    'image-cache-hit':
+        'Restoring base image {} from the image cache...',
+
+    'image-cache-store':
+        'Storing base image {} in the image cache...',
+
+    'package-proxy':
+        'Caching downloaded packages using the package proxy at {}',
+
+    'base-layer-exists':
+        'Using the existing base layer {}...',
+
     'schroot':
         'Setting up schroot...',
 
     'prepare-chroot':
         'Preparing chroot...',
 
+    'initializers-summary':
+        'Initializer scripts:',
+
+    'initializer-succeeded':
+        'done',
+
+    'initializer-failed':
+        'failed (exit status {})',
+
+    'initializer-skipped':
+        'skipped',
+
+    'initializer-output':
+        '--- Output of the initializer {} ---',
+
     'config-files':
         'Creating variable files for Ansible...',
 
@@ -88,12 +226,60 @@ Don't have too much fun ;)''',
     'exec-in-schroot-phase':
         'executing a command in the schroot',
 
+    'schroot-batch-failed':
+        'Command {} of {} within the schroot session failed: {}',
+
+    'disk-usage-phase':
+        'measuring the disk usage of a universe',
+
     'debootstrap-phase':
         'debootstrapping the image',
 
     'create-base-directory-phase':
         'creating the universe base directory',
 
+    'debootstrap-version-phase':
+        'determining the debootstrap version',
+
+    'clone-chroot-phase':
+        'copying the bootstrapped chroot',
+
+    'image-cache-restore-phase':
+        'restoring the base image from the image cache',
+
+    'image-cache-store-phase':
+        'storing the base image in the image cache',
+
+    'image-cache-prune-phase':
+        'removing base images from the image cache',
+
+    'package-cache-directory-phase':
+        'creating the package cache directory',
+
+    'apt-proxy-phase':
+        'configuring the package proxy for apt within the chroot',
+
+    'sudo-phase':
+        'refreshing the sudo credentials',
+
+    'remove-local-seed-phase':
+        'removing the local seed of the universe',
+
+    'rename-schroot-phase':
+        'renaming the Schroot config files',
+
+    'copy-seed-phase':
+        'copying the seed to the local multiverse',
+
+    'create-overlay-directories-phase':
+        'creating the overlay directories of the universe',
+
+    'overlay-mount-phase':
+        'mounting the overlay file system of the universe',
+
+    'overlay-umount-phase':
+        'unmounting the overlay file system of the universe',
+
     'tmpfs-mount-phase':
         'mounting the tmpfs for the debootstrap process',
 
@@ -140,6 +326,13 @@ Don't have too much fun ;)''',
     'remove-intro':
         'Removing the "{}" universe...',
 
+    'still-running-error':
+        '''There are still {} processes ({} resident memory) running in the universe.
+Please make sure that all portals are closed and all services within the universe are stopped.''',
+
+    'running-process':
+        '   - {} ({}, {})',
+
     'still-mounted-error':
         '''There are still mount-points active in the universe.
 Please make sure that all portals are closed and
@@ -150,6 +343,8 @@ The output of the 'mount' command might help you.''',
 
     'installation-path-does-not-exist': 'Chroot does not exist.',
 
+    'base-layer-removed': 'Base layer {} removed, since no other universe uses it.',
+
     'schroot-config-removed': 'Schroot configuration removed.',
 
     'schroot-config-does-not-exist': 'Schroot configuration does not exist.',
@@ -158,6 +353,10 @@ The output of the 'mount' command might help you.''',
 
     'local-cache-does-not-exist': 'Universe configuration does not exist.',
 
+    'universes-do-not-exist':
+        'Error: These universes do not exist: {}. Use the \'list\' operation to see a list of all existing '
+        'universes on this computer.',
+
     'universe-does-not-exist':
         'Error: The given universe does not exist. Use the \'list\' operation to see a list of all existing universes '
         'on this computer.',
@@ -205,6 +404,57 @@ Do you want to proceed?''',
 
 Do you want to proceed?''',
 
+    'image-cache-list-start':
+        'These are the base images in the image cache (most recently used first):',
+
+    'image-cache-empty':
+        'The image cache is empty.',
+
+    'image-cache-total':
+        'Total size: {}',
+
+    'image-cache-removed':
+        'Removed base image {} {} ({}, {}).',
+
+    'image-cache-nothing-to-prune':
+        'The image cache does not exceed the size limit. Nothing to remove.',
+
+    'batch-status-waiting':
+        'waiting',
+
+    'batch-status-running':
+        'running',
+
+    'batch-status-done':
+        'done   ',
+
+    'batch-status-failed':
+        'FAILED ',
+
+    'batch-succeeded':
+        '   - {}: succeeded after {}{}',
+
+    'batch-failed':
+        '   - {}: FAILED after {}, see {}',
+
+    'batch-summary':
+        '{} succeeded, {} failed.',
+
+    'profile-no-records':
+        'There are no timing records of "{}" yet. They are written whenever the Ansible playbook runs.',
+
+    'profile-runs':
+        'These are the recorded playbook runs of "{}":',
+
+    'profile-slowest':
+        'The {} slowest tasks of the last run:',
+
+    'profile-average':
+        'average {} in {} previous runs',
+
+    'profile-regression':
+        'SLOWER THAN USUAL',
+
     # seed
 
     'create-ascii-art-text-phase':
@@ -218,7 +468,27 @@ Do you want to proceed?''',
 Please remove/rename the directory or choose another universe name.''',
 
     'template-not-found': 'Error: The \'{}\' template cannot be found. Ensure it is not misspelled or re-install it.',
-    'template-invalid': 'Error: The \'{}\' template is invalid: The universe.yml file is missing.'
+    'template-invalid': 'Error: The \'{}\' template is invalid: The universe.yml file is missing.',
+
+    # portal
+
+    'session-creating':
+        'Session does not exist. Creating...',
+
+    'session-invalid-processes-running':
+        'The universe seems to be in an invalid state, but there are still processes running inside it. '
+        'Please make sure that all services are stopped and all portals are closed.',
+
+    'session-recovery-failed':
+        'The universe seems to be in an invalid state. That usually means that there is a schroot session but '
+        'some expected mounts are missing. Unfortunately, slingring could not automatically recover the session.',
+
+    'press-any-key':
+        'Press any key to retry or CTRL+C to abort.',
+
+    'last-portal-closed-processes-running':
+        '''INFO: You closed the last portal to this universe but there are still processes running inside it.
+Please make sure to stop them before shutting down your computer to avoid umount locks.'''
 
 }
 
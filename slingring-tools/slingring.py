@@ -0,0 +1,35 @@
+#!/usr/bin/python3
+
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+import argparse
+
+from portal.launcher import open_portal
+
+
+def main():
+    parser = argparse.ArgumentParser(description="slingring opens a portal to a slingring universe.")
+    parser.add_argument('universe', help='the universe to enter')
+    parser.add_argument('command', nargs='?', help='the command to run in the universe (default: /bin/bash -l)')
+    args = parser.parse_args()
+    exit(open_portal(args.universe, args.command))
+
+
+if __name__ == "__main__":
+    main()
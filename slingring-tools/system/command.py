@@ -17,6 +17,7 @@
 
 ########################################################
 
+import threading
 from subprocess import PIPE
 from subprocess import Popen
 from subprocess import run
@@ -24,25 +25,30 @@ from subprocess import run
 from resources.messages import get as _
 
 
+# Commands may run concurrently, the error output of one command must not be interleaved with another's.
+_print_lock = threading.Lock()
+
+
 def _command_print(cmd_output, phase, command, verbose, pipe_command=None):
     if cmd_output.returncode:
-        if verbose:
-            print(_('cmd-error-verbose').format(phase))
-        else:
-            print(_('cmd-error').format(phase))
-            print()
-            print(_('stdout').format(phase))
-            print(cmd_output.stdout)
-            print()
-            print(_('stderr').format(phase))
-            print(cmd_output.stderr)
-        print(_('failed-command').format(' '.join(command)))
-        if pipe_command:
-            print(_('failed-pipe-command').format(' '.join(pipe_command)))
+        with _print_lock:
+            if verbose:
+                print(_('cmd-error-verbose').format(phase))
+            else:
+                print(_('cmd-error').format(phase))
+                print()
+                print(_('stdout').format(phase))
+                print(cmd_output.stdout)
+                print()
+                print(_('stderr').format(phase))
+                print(cmd_output.stderr)
+            print(_('failed-command').format(' '.join(command)))
+            if pipe_command:
+                print(_('failed-pipe-command').format(' '.join(pipe_command)))
     return cmd_output
 
 
-def run_command(command, phase_key, verbose, env=None):
+def run_command(command, phase_key, verbose, env=None, input_data=None):
     """
     Runs a command on the local machine. The stdout/stderr is hidden, unless an error
     occurs. In that case, an error message containing the stderr is shown and a
@@ -52,13 +58,27 @@ def run_command(command, phase_key, verbose, env=None):
     :param phase_key: a message key which describes the current phase. This is used if something fails.
     :param verbose: True, if a more verbose output is desired.
     :param env: A dictionary of environment variables for the given command.
+    :param input_data: Bytes which are written to the stdin of the command.
     :return: The process output of the command.
     """
     if verbose:
-        result = _command_print(run(command, env=env), phase_key, command, verbose)
+        result = run(command, env=env, input=input_data)
     else:
-        result = _command_print(run(command, env=env, stdout=PIPE, stderr=PIPE), phase_key, command,
-                                verbose)
+        result = run(command, env=env, input=input_data, stdout=PIPE, stderr=PIPE)
+    return check_result(command, result, phase_key, verbose)
+
+
+def check_result(command, result, phase_key, verbose):
+    """
+    Checks the process output of a command which has already been run. If the command failed,
+    an error message is shown and a ProcessFailedException is raised (see run_command).
+    :param command: The command which has been run as list.
+    :param result: The process output of the command (e.g. a CompletedProcess).
+    :param phase_key: a message key which describes the current phase. This is used if something fails.
+    :param verbose: True, if the output of the command has already been shown.
+    :return: The process output of the command.
+    """
+    _command_print(result, phase_key, command, verbose)
     if result.returncode:
         raise ProcessFailedException(command, result)
 
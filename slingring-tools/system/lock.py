@@ -0,0 +1,214 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import fcntl
+import os
+import pwd
+import threading
+import time
+from collections import namedtuple
+
+# A process holding a lock.
+LockHolder = namedtuple('LockHolder', ['pid', 'user', 'command', 'exclusive'])
+
+# The interval in which a lock is tried again while waiting for it (in seconds).
+_poll_interval = 0.1
+
+# The locks held by this process (key: path, value: [file, exclusive, count]). A lock which is already
+# held is not acquired again, since flock would treat the second acquisition as a competing one.
+_held_locks = {}
+_held_locks_lock = threading.Lock()
+
+
+class Lock:
+    def __init__(self, path, exclusive=True, timeout=None, on_wait=None):
+        """
+        An advisory lock on a file (see flock(2)). Shared locks can be held by several processes
+        at the same time, an exclusive lock only by one. Locks are released when the process
+        holding them ends, so they are never left behind. The lock can be used as a context manager.
+
+        A process may acquire a lock it already holds (e.g. a workflow calling another workflow),
+        unless it holds it shared and wants it exclusively.
+        :param path: The path of the lock file. It is created if it does not exist.
+        :param exclusive: True for an exclusive lock, False for a shared one.
+        :param timeout: The number of seconds to wait for the lock or None to wait forever.
+        :param on_wait: A function which is called with the current holders (a list of LockHolders)
+                        if the lock is not available immediately.
+        """
+        self.path = path
+        self.exclusive = exclusive
+        self.timeout = timeout
+        self.on_wait = on_wait
+
+    def acquire(self):
+        """
+        Acquires the lock. Raises a LockTimeoutError if the lock cannot be acquired in time.
+        """
+        with _held_locks_lock:
+            held_lock = _held_locks.get(self.path)
+            if held_lock is not None:
+                if self.exclusive and not held_lock[1]:
+                    raise RuntimeError('cannot upgrade the shared lock {} to an exclusive one'.format(self.path))
+                held_lock[2] += 1
+                return
+
+        try:
+            lock_file = _open_lock_file(self.path)
+        except PermissionError as error:
+            raise LockPermissionError(self.path) from error
+        operation = fcntl.LOCK_EX if self.exclusive else fcntl.LOCK_SH
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        waiting = False
+        while True:
+            try:
+                fcntl.flock(lock_file, operation | fcntl.LOCK_NB)
+                break
+            except BlockingIOError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    lock_file.close()
+                    raise LockTimeoutError(self.path, lock_holders(self.path))
+                if not waiting and self.on_wait:
+                    self.on_wait(lock_holders(self.path))
+                waiting = True
+                time.sleep(_poll_interval)
+
+        with _held_locks_lock:
+            _held_locks[self.path] = [lock_file, self.exclusive, 1]
+
+    def release(self):
+        """
+        Releases the lock.
+        """
+        with _held_locks_lock:
+            held_lock = _held_locks[self.path]
+            held_lock[2] -= 1
+            if held_lock[2]:
+                return
+            del _held_locks[self.path]
+        # closing the file releases the lock
+        held_lock[0].close()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+def lock_holders(path):
+    """
+    Finds the processes holding a lock on the given file (see /proc/locks).
+    :param path: The path of the lock file.
+    :return: A list of LockHolders (empty if the file does not exist).
+    """
+    try:
+        status = os.stat(path)
+        with open('/proc/locks') as locks_file:
+            lines = locks_file.readlines()
+    except OSError:
+        return []
+    file_id = (os.major(status.st_dev), os.minor(status.st_dev), status.st_ino)
+
+    holders = []
+    for line in lines:
+        fields = line.split()
+        # waiting processes are marked with '->'
+        if len(fields) < 6 or fields[1] != 'FLOCK':
+            continue
+        try:
+            major, minor, inode = fields[5].split(':')
+            if (int(major, 16), int(minor, 16), int(inode)) != file_id:
+                continue
+            pid = int(fields[4])
+        except ValueError:
+            continue
+        holders.append(LockHolder(pid, _process_user(pid), _process_command(pid), fields[3] == 'WRITE'))
+    return holders
+
+
+def format_holders(holders):
+    """
+    :param holders: A list of LockHolders.
+    :return: A human readable description of the holders, e.g. 'alice (pid 1234: universe update foo)'.
+    """
+    return ', '.join('{} (pid {}: {})'.format(holder.user, holder.pid, holder.command) for holder in holders)
+
+
+def _open_lock_file(path):
+    # An existing lock file is opened without O_CREAT: in sticky directories like /run/lock, the kernel
+    # refuses to open files of other users with O_CREAT (fs.protected_regular).
+    directory = os.path.dirname(path)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, exist_ok=True)
+    while True:
+        try:
+            descriptor = os.open(path, os.O_RDWR)
+            break
+        except FileNotFoundError:
+            pass
+        try:
+            descriptor = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            # created by another process in the meantime
+            continue
+        # lock files in shared directories must be usable by every user, regardless of the umask
+        os.fchmod(descriptor, 0o666)
+        break
+    return os.fdopen(descriptor, 'r+')
+
+
+def _process_user(pid):
+    try:
+        return pwd.getpwuid(os.stat('/proc/{}'.format(pid)).st_uid).pw_name
+    except (OSError, KeyError):
+        return 'unknown'
+
+
+def _process_command(pid):
+    try:
+        with open('/proc/{}/cmdline'.format(pid), 'rb') as cmdline_file:
+            arguments = cmdline_file.read().rstrip(b'\0').split(b'\0')
+    except OSError:
+        return 'unknown'
+    # the interpreter of python scripts is not interesting
+    if len(arguments) > 1 and os.path.basename(arguments[0].decode('UTF-8', 'replace')).startswith('python'):
+        arguments = arguments[1:]
+        arguments[0] = os.path.basename(arguments[0])
+    return ' '.join(argument.decode('UTF-8', 'replace') for argument in arguments)
+
+
+class LockTimeoutError(Exception):
+    def __init__(self, path, holders):
+        """
+        :param path: The path of the lock file.
+        :param holders: The processes holding the lock (a list of LockHolders).
+        """
+        super().__init__(path)
+        self.path = path
+        self.holders = holders
+
+
+class LockPermissionError(Exception):
+    def __init__(self, path):
+        """
+        :param path: The path of the lock file which cannot be opened or created.
+        """
+        super().__init__(path)
+        self.path = path
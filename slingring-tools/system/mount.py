@@ -17,10 +17,14 @@
 
 ########################################################
 
-from system.command import run_command
+import shutil
+from shlex import quote
 
+import system.privileged as privileged
+from system.mounttable import mount_table
 
-def mount(source, mount_point, phase_key, verbose, bind=False, fstype=None):
+
+def mount(source, mount_point, phase_key, verbose, bind=False, fstype=None, options=None):
     """
     Mounts a given source onto an mount point.
     :param source: The source (e.g. /dev/sda1)
@@ -29,18 +33,9 @@ def mount(source, mount_point, phase_key, verbose, bind=False, fstype=None):
     :param verbose: True, if a more verbose output is desired.
     :param bind: If bind option shall be used.
     :param fstype: The filesystem type.
+    :param options: A list of additional mount options (e.g. ['lowerdir=/foo', 'upperdir=/bar']).
     """
-    mount_cmd = ['sudo', 'mount']
-    if bind:
-        mount_cmd.append('-o')
-        mount_cmd.append('bind')
-    if fstype:
-        mount_cmd.append('-t')
-        mount_cmd.append(fstype)
-    mount_cmd.append(source)
-    mount_cmd.append(mount_point)
-
-    run_command(mount_cmd, phase_key, verbose)
+    privileged.mount(source, mount_point, phase_key, verbose, bind, fstype, options)
 
 
 def umount(mount_point, phase_key, verbose):
@@ -50,16 +45,53 @@ def umount(mount_point, phase_key, verbose):
     :param phase_key: a message key which describes the current phase. This is used if something fails.
     :param verbose: True, if a more verbose output is desired.
     """
-    umount_cmd = ['sudo', 'umount', mount_point]
-    run_command(umount_cmd, phase_key, verbose)
+    privileged.umount(mount_point, phase_key, verbose)
+
+
+def supports_private_namespaces():
+    """
+    :return: True, if commands can be run in a private mount namespace (see private_namespace_command).
+    """
+    return shutil.which('unshare') is not None
+
+
+def private_namespace_command(command, mounts):
+    """
+    Wraps the given command, so it runs in a private mount namespace. The given file systems are
+    mounted within the namespace before the command starts. They are neither visible on the host
+    nor do they have to be unmounted: they vanish along with the namespace once the command exits.
+    The wrapped command has to be run as root (e.g. using sudo).
+    :param command: The command to run as list (e.g. ['ls', '-l', '/etc'])
+    :param mounts: A list of the file systems to mount as tuples (source, mount point, bind, fstype)
+                   (e.g. [('/proc', '/foo/proc', False, 'proc'), ('/dev', '/foo/dev', True, None)]).
+    :return: The wrapped command as list.
+    """
+    script = ''
+    for source, mount_point, bind, fstype in mounts:
+        mount_command = ['mount'] + (['-o', 'bind'] if bind else []) + (['-t', fstype] if fstype else []) + \
+                        [source, mount_point]
+        script += ' '.join(quote(argument) for argument in mount_command) + ' && '
+    # the command is passed as positional parameters, so it does not have to be quoted
+    script += 'exec "$@"'
+    return ['unshare', '--mount', '--propagation', 'private', '--', 'sh', '-c', script, 'sh'] + command
+
+
+def is_mount_point(path):
+    """
+    Checks if something is mounted on the given path.
+    :param path: The path to check.
+    :return: True, if the path is a mount point.
+    """
+    return mount_table().is_mount_point(path)
 
 
-def contains_active_mount_point(mount_point):
+def contains_active_mount_point(mount_point, include_self=True):
     """
     Checks if the given mount point contains an active mount. E.g. if /mnt/ is given and
-    something is mounted in /mnt/foo/bar, this will return True
+    something is mounted in /mnt/foo/bar, this will return True. Other directories which
+    merely start with the same name (e.g. /mnt2) do not count.
     :param mount_point: The directory to check.
+    :param include_self: True, if a mount on the directory itself counts.
     :return: True, if something is mounted beneath the given mount_point.
     """
-    output = run_command('mount', 'mount-check', False).stdout.decode('utf-8')
-    return mount_point in output
+    return mount_table().has_mounts_within(mount_point, include_self)
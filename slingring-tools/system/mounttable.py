@@ -0,0 +1,184 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import bisect
+import re
+import select
+import threading
+from collections import namedtuple
+
+# A single line of /proc/<pid>/mountinfo (see proc(5)). mount_point and root are unescaped.
+MountEntry = namedtuple('MountEntry', ['mount_id', 'parent_id', 'device', 'root', 'mount_point', 'options',
+                                       'fstype', 'source', 'super_options'])
+
+_escape_sequence = re.compile(r'\\([0-7]{3})')
+
+_mount_table = None
+_mount_table_lock = threading.Lock()
+
+
+class MountTable:
+    def __init__(self, path='/proc/self/mountinfo'):
+        """
+        An index of the mount table which is keyed by mount point and supports subtree queries.
+        The mountinfo file is kept open and only read again once the kernel signals a change of the
+        mount table (the file becomes readable with POLLPRI/POLLERR).
+        :param path: The path to the mountinfo file (defaults to the mount namespace of this process).
+        """
+        self._file = open(path, 'rb')
+        self._poll = select.poll()
+        self._poll.register(self._file, select.POLLPRI | select.POLLERR)
+        self._lock = threading.Lock()
+        self._entries = []
+        self._index = {}
+        self._sorted_mount_points = []
+        self._read()
+
+    def close(self):
+        """
+        Closes the mountinfo file.
+        """
+        self._file.close()
+
+    def refresh(self):
+        """
+        Reads the mount table again if it has changed since it has been read the last time.
+        """
+        with self._lock:
+            if self._poll.poll(0):
+                self._read()
+
+    def entries(self):
+        """
+        :return: A list of all MountEntry tuples in the order of the mountinfo file.
+        """
+        self.refresh()
+        return list(self._entries)
+
+    def mount_points(self):
+        """
+        :return: A sorted list of all (distinct) mount points.
+        """
+        self.refresh()
+        return list(self._sorted_mount_points)
+
+    def is_mount_point(self, path):
+        """
+        :param path: The path to check.
+        :return: True, if something is mounted on the given path.
+        """
+        self.refresh()
+        return _normalize(path) in self._index
+
+    def mounts_on(self, path):
+        """
+        :param path: The mount point.
+        :return: A list of the MountEntry tuples mounted on the given path (the last one is visible).
+        """
+        self.refresh()
+        return list(self._index.get(_normalize(path), []))
+
+    def mount_points_within(self, path, include_self=True):
+        """
+        Lists all mount points in the subtree of the given path. E.g. if /mnt is given and
+        something is mounted on /mnt/foo/bar, /mnt/foo/bar is part of the result, but /mnt2 is not.
+        :param path: The root of the subtree.
+        :param include_self: True, if a mount on the path itself is part of the result.
+        :return: A sorted list of mount points.
+        """
+        self.refresh()
+        path = _normalize(path)
+        prefix = path.rstrip('/') + '/'
+        # all paths starting with the prefix are sorted between the prefix and the prefix with '/'
+        # replaced by its successor '0'
+        start = bisect.bisect_left(self._sorted_mount_points, prefix)
+        end = bisect.bisect_left(self._sorted_mount_points, prefix[:-1] + '0')
+        mount_points = [mount_point for mount_point in self._sorted_mount_points[start:end] if mount_point != path]
+        if include_self and path in self._index:
+            mount_points.insert(0, path)
+        return mount_points
+
+    def has_mounts_within(self, path, include_self=True):
+        """
+        :param path: The root of the subtree.
+        :param include_self: True, if a mount on the path itself counts.
+        :return: True, if something is mounted in the subtree of the given path.
+        """
+        return bool(self.mount_points_within(path, include_self))
+
+    def _read(self):
+        self._file.seek(0)
+        content = self._file.read().decode('UTF-8', errors='surrogateescape')
+        self._entries = [parse_mountinfo_line(line) for line in content.splitlines() if line]
+        self._index = {}
+        for entry in self._entries:
+            self._index.setdefault(entry.mount_point, []).append(entry)
+        self._sorted_mount_points = sorted(self._index)
+
+
+def mount_table():
+    """
+    :return: The MountTable of this process, which is shared by all callers.
+    """
+    global _mount_table
+    with _mount_table_lock:
+        if _mount_table is None:
+            _mount_table = MountTable()
+        return _mount_table
+
+
+def read_mountinfo(path='/proc/self/mountinfo'):
+    """
+    Reads the mount table of a process in a single pass.
+    :param path: The path to the mountinfo file (defaults to the mount namespace of this process).
+    :return: A list of MountEntry tuples in the order of the mountinfo file.
+    """
+    with open(path, 'rb') as mountinfo_file:
+        content = mountinfo_file.read().decode('UTF-8', errors='surrogateescape')
+    return [parse_mountinfo_line(line) for line in content.splitlines() if line]
+
+
+def parse_mountinfo_line(line):
+    """
+    Parses a single line of a mountinfo file.
+    :param line: The line, e.g. '36 35 98:0 /mnt1 /mnt2 rw,noatime master:1 - ext3 /dev/root rw,errors=continue'
+    :return: A MountEntry tuple.
+    """
+    fields = line.split(' ')
+    # the optional fields are terminated by a single hyphen
+    separator = fields.index('-', 6)
+    return MountEntry(mount_id=int(fields[0]),
+                      parent_id=int(fields[1]),
+                      device=fields[2],
+                      root=_unescape(fields[3]),
+                      mount_point=_unescape(fields[4]),
+                      options=fields[5],
+                      fstype=fields[separator + 1],
+                      source=_unescape(fields[separator + 2]),
+                      super_options=fields[separator + 3] if len(fields) > separator + 3 else '')
+
+
+def _normalize(path):
+    path = path.rstrip('/')
+    return path if path else '/'
+
+
+def _unescape(field):
+    # spaces, tabs, newlines and backslashes are escaped as octal numbers (e.g. \040)
+    return _escape_sequence.sub(lambda match: chr(int(match.group(1), 8)), field)
@@ -0,0 +1,216 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import atexit
+import json
+import os
+import shlex
+import sys
+import threading
+from subprocess import CompletedProcess, Popen, PIPE
+
+from common.configuration import ConfigurationHandler
+from system.command import check_result
+
+_helper_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'privileged_helper.py')
+
+_helper = None
+_helper_lock = threading.Lock()
+
+
+class PrivilegedHelper:
+    def __init__(self, escalation_command):
+        """
+        A helper process which runs with elevated privileges and executes a restricted set of
+        file system operations on behalf of Slingring (see privileged_helper.py). The operations
+        are sent to the helper over a pipe, so sudo only has to be run once.
+        :param escalation_command: The command used to elevate the helper as list (e.g. ['sudo']).
+                                   If the list is empty, the helper runs with the privileges of the
+                                   current user.
+        """
+        self.command = list(escalation_command) + [sys.executable, _helper_script]
+        self._process = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Starts the helper process.
+        """
+        self._process = Popen(self.command, stdin=PIPE, stdout=PIPE, universal_newlines=True)
+
+    def stop(self):
+        """
+        Stops the helper process, if it is running.
+        """
+        if self._process:
+            self._process.stdin.close()
+            self._process.wait()
+            self._process = None
+
+    def execute(self, operation, arguments):
+        """
+        Executes the given operation within the helper process.
+        :param operation: The operation name (e.g. 'mkdir').
+        :param arguments: A dictionary containing the arguments of the operation.
+        :return: The process output (CompletedProcess) of the operation. Its args contain the executed command.
+        """
+        request = json.dumps({'operation': operation, 'arguments': arguments}) + '\n'
+        with self._lock:
+            try:
+                self._process.stdin.write(request)
+                self._process.stdin.flush()
+                response = self._process.stdout.readline()
+            except OSError:
+                response = None
+        if not response:
+            command = [operation] + [str(value) for value in arguments.values()]
+            return CompletedProcess(command, 1, b'', b'the privileged helper process is not running')
+        response = json.loads(response)
+        return CompletedProcess(response['command'], response['returncode'], response['stdout'].encode('UTF-8'),
+                                response['stderr'].encode('UTF-8'))
+
+
+def mkdir(path, phase_key, verbose, parents=True):
+    """
+    Creates a directory as root.
+    :param path: The directory path.
+    :param phase_key: a message key which describes the current phase. This is used if something fails.
+    :param verbose: True, if a more verbose output is desired.
+    :param parents: True, if missing parent directories shall be created as well (no error if the directory exists).
+    :return: The process output of the operation.
+    """
+    return _execute('mkdir', {'path': path, 'parents': parents}, phase_key, verbose)
+
+
+def copy(source, target, phase_key, verbose, recursive=False, archive=False, reflink=False):
+    """
+    Copies a file or directory as root. The target is the path of the copy (not its parent directory).
+    :param source: The source path.
+    :param target: The target path.
+    :param phase_key: a message key which describes the current phase. This is used if something fails.
+    :param verbose: True, if a more verbose output is desired.
+    :param recursive: True, to copy directories.
+    :param archive: True, to copy directories while preserving ownership, permissions, links etc.
+    :param reflink: True, to use copy-on-write copies if the file system supports them.
+    :return: The process output of the operation.
+    """
+    return _execute('copy', {'source': source, 'target': target, 'recursive': recursive, 'archive': archive,
+                             'reflink': reflink}, phase_key, verbose)
+
+
+def move(source, target, phase_key, verbose):
+    """
+    Moves (or renames) a file or directory as root. The target is the new path (not its parent directory).
+    :param source: The source path.
+    :param target: The target path.
+    :param phase_key: a message key which describes the current phase. This is used if something fails.
+    :param verbose: True, if a more verbose output is desired.
+    :return: The process output of the operation.
+    """
+    return _execute('move', {'source': source, 'target': target}, phase_key, verbose)
+
+
+def mount(source, mount_point, phase_key, verbose, bind=False, fstype=None, options=None):
+    """
+    Mounts a given source onto an mount point.
+    :param source: The source (e.g. /dev/sda1)
+    :param mount_point: The mount point (e.g. /mnt/disk1)
+    :param phase_key: a message key which describes the current phase. This is used if something fails.
+    :param verbose: True, if a more verbose output is desired.
+    :param bind: If bind option shall be used.
+    :param fstype: The filesystem type.
+    :param options: A list of additional mount options (e.g. ['lowerdir=/foo', 'upperdir=/bar']).
+    :return: The process output of the operation.
+    """
+    return _execute('mount', {'source': source, 'mount_point': mount_point, 'bind': bind, 'fstype': fstype,
+                              'options': options}, phase_key, verbose)
+
+
+def umount(mount_point, phase_key, verbose):
+    """
+    Unmounts a mount point.
+    :param mount_point: The mount point (e.g. /mnt/disk1)
+    :param phase_key: a message key which describes the current phase. This is used if something fails.
+    :param verbose: True, if a more verbose output is desired.
+    :return: The process output of the operation.
+    """
+    return _execute('umount', {'mount_point': mount_point}, phase_key, verbose)
+
+
+def remove(path, phase_key, verbose, recursive=False):
+    """
+    Removes a file (or a directory, if recursive is True) as root. It is no error if the path does not exist.
+    :param path: The path to remove.
+    :param phase_key: a message key which describes the current phase. This is used if something fails.
+    :param verbose: True, if a more verbose output is desired.
+    :param recursive: True, to remove directories including their content.
+    :return: The process output of the operation.
+    """
+    return _execute('remove', {'path': path, 'recursive': recursive}, phase_key, verbose)
+
+
+def write_file(path, content, phase_key, verbose):
+    """
+    Writes the given content to a file as root. An existing file is overwritten.
+    :param path: The file path.
+    :param content: The file content as string.
+    :param phase_key: a message key which describes the current phase. This is used if something fails.
+    :param verbose: True, if a more verbose output is desired.
+    :return: The process output of the operation.
+    """
+    return _execute('write-file', {'path': path, 'content': content}, phase_key, verbose)
+
+
+def disk_usage(path, cache, phase_key, workers=16):
+    """
+    Collects the disk usage of all directories below the given path as root, using several threads.
+    File systems mounted below the path are not taken into account.
+    :param path: The path of the directory tree.
+    :param cache: The directory records of a previous call (or None). The records of directories whose
+                  inode and mtime have not changed are reused without reading the directories again.
+    :param phase_key: a message key which describes the current phase. This is used if something fails.
+    :param workers: The number of directories read at the same time.
+    :return: A dictionary with the paths of the directories (relative to the given path) as keys and their
+             records as values (see privileged_helper.py).
+    """
+    # the records are not printed in verbose mode, they are far too long
+    result = _get_helper().execute('disk-usage', {'path': path, 'cache': cache, 'workers': workers})
+    check_result(result.args, result, phase_key, False)
+    return json.loads(result.stdout.decode('UTF-8'))
+
+
+def _execute(operation, arguments, phase_key, verbose):
+    result = _get_helper().execute(operation, arguments)
+    if verbose:
+        for output in (result.stdout, result.stderr):
+            if output:
+                print(output.decode('UTF-8'), end='')
+    return check_result(result.args, result, phase_key, verbose)
+
+
+def _get_helper():
+    global _helper
+    with _helper_lock:
+        if _helper is None:
+            # The helper is started once per invocation and stopped when Slingring exits.
+            escalation_command = ConfigurationHandler().get_config_value('privileged-helper-command')
+            _helper = PrivilegedHelper(shlex.split(escalation_command or ''))
+            _helper.start()
+            atexit.register(_helper.stop)
+        return _helper
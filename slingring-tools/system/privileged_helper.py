@@ -0,0 +1,259 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+# This script is run as root by system/privileged.py (e.g. using sudo). It reads one JSON encoded
+# operation per line from stdin, executes it and writes the JSON encoded result as a single line to
+# stdout. Only the operations defined below are supported, the helper never runs arbitrary commands.
+# It must not import any Slingring module, since it is started as a stand-alone script.
+
+import fcntl
+import json
+import os
+import re
+import stat
+import struct
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# The file systems on which files may share extents (e.g. copies made with --reflink).
+_extent_sharing_file_systems = ['btrfs', 'xfs']
+
+# see linux/fiemap.h
+_FS_IOC_FIEMAP = 0xC020660B
+_FIEMAP_MAX_OFFSET = 0xFFFFFFFFFFFFFFFF
+_FIEMAP_EXTENT_LAST = 0x1
+_FIEMAP_EXTENT_SHARED = 0x2000
+_fiemap_header = struct.Struct('=QQLLLL')
+_fiemap_extent = struct.Struct('=QQQQQLLLL')
+_fiemap_extent_count = 64
+
+
+def _mkdir(path, parents=True):
+    return _run(['mkdir', '-p', path] if parents else ['mkdir', path])
+
+
+def _copy(source, target, recursive=False, archive=False, reflink=False):
+    command = ['cp']
+    if archive:
+        command.append('-a')
+    elif recursive:
+        command.append('-r')
+    if reflink:
+        command.append('--reflink=auto')
+    return _run(command + ['-T', source, target])
+
+
+def _move(source, target):
+    return _run(['mv', '-T', source, target])
+
+
+def _mount(source, mount_point, bind=False, fstype=None, options=None):
+    command = ['mount']
+    mount_options = (['bind'] if bind else []) + (options or [])
+    if mount_options:
+        command.append('-o')
+        command.append(','.join(mount_options))
+    if fstype:
+        command.append('-t')
+        command.append(fstype)
+    return _run(command + [source, mount_point])
+
+
+def _umount(mount_point):
+    return _run(['umount', mount_point])
+
+
+def _remove(path, recursive=False):
+    # a recursive removal never descends into file systems mounted below the path (e.g. /proc of a chroot)
+    return _run(['rm', '-rf', '--one-file-system', path] if recursive else ['rm', '-f', path])
+
+
+def _write_file(path, content):
+    command = ['write-file', path]
+    try:
+        with open(path, 'w') as file:
+            file.write(content)
+    except (OSError, IOError) as e:
+        return _result(command, 1, '', str(e))
+    return _result(command, 0, '', '')
+
+
+def _disk_usage(path, cache=None, workers=16):
+    # Walks the directory tree below the given path (without crossing file systems) using several threads
+    # and returns a record of every directory as JSON. A record contains the space allocated by the directory
+    # and the files in it ('size'), the inode numbers and sizes of files with several hard links ('links'),
+    # the physical offsets and lengths of extents shared with other files ('extents', the shared part is
+    # not included in the sizes) and the names of the subdirectories ('directories').
+    # Records in the given cache are used for directories whose inode and mtime ('key') are unchanged.
+    cache = cache or {}
+    try:
+        device = os.lstat(path).st_dev
+    except OSError as e:
+        return _result(['disk-usage', path], 1, '', str(e))
+    shared_extents = _file_system_type(path) in _extent_sharing_file_systems
+    records = {}
+    with ThreadPoolExecutor(workers) as executor:
+        pending = {executor.submit(_scan_directory, path, '.', device, cache.get('.'), shared_extents)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                relative_path, record = future.result()
+                records[relative_path] = record
+                for name in record['directories']:
+                    child_path = os.path.normpath(os.path.join(relative_path, name))
+                    pending.add(executor.submit(_scan_directory, path, child_path, device, cache.get(child_path),
+                                                shared_extents))
+    return _result(['disk-usage', path], 0, json.dumps(records), '')
+
+
+def _scan_directory(root_path, relative_path, device, cached_record, shared_extents):
+    directory_path = os.path.join(root_path, relative_path)
+    try:
+        status = os.lstat(directory_path)
+    except OSError:
+        return relative_path, {'key': None, 'size': 0, 'links': [], 'extents': [], 'directories': []}
+    key = [status.st_ino, status.st_mtime_ns]
+    if cached_record and cached_record.get('key') == key:
+        return relative_path, cached_record
+
+    record = {'key': key, 'size': status.st_blocks * 512, 'links': [], 'extents': [], 'directories': []}
+    try:
+        entries = list(os.scandir(directory_path))
+    except OSError:
+        # the incomplete record must not be taken from the cache next time
+        record['key'] = None
+        return relative_path, record
+    for entry in entries:
+        try:
+            entry_status = entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        if stat.S_ISDIR(entry_status.st_mode):
+            if entry_status.st_dev == device:
+                record['directories'].append(entry.name)
+            continue
+        size = entry_status.st_blocks * 512
+        if shared_extents and stat.S_ISREG(entry_status.st_mode) and size:
+            extents = _shared_extents(entry.path)
+            size = max(0, size - sum(length for _, length in extents))
+            record['extents'].extend(extents)
+        if entry_status.st_nlink > 1:
+            record['links'].append([entry_status.st_ino, size])
+        else:
+            record['size'] += size
+    return relative_path, record
+
+
+def _shared_extents(file_path):
+    try:
+        descriptor = os.open(file_path, os.O_RDONLY | os.O_NOFOLLOW | getattr(os, 'O_NOATIME', 0))
+    except OSError:
+        return []
+    extents = []
+    start = 0
+    try:
+        while True:
+            request = bytearray(_fiemap_header.size + _fiemap_extent.size * _fiemap_extent_count)
+            _fiemap_header.pack_into(request, 0, start, _FIEMAP_MAX_OFFSET - start, 0, 0, _fiemap_extent_count, 0)
+            fcntl.ioctl(descriptor, _FS_IOC_FIEMAP, request)
+            mapped_extents = _fiemap_header.unpack_from(request, 0)[3]
+            if not mapped_extents:
+                break
+            for index in range(mapped_extents):
+                extent = _fiemap_extent.unpack_from(request, _fiemap_header.size + index * _fiemap_extent.size)
+                logical, physical, length, flags = extent[0], extent[1], extent[2], extent[5]
+                if flags & _FIEMAP_EXTENT_SHARED:
+                    extents.append([physical, length])
+                if flags & _FIEMAP_EXTENT_LAST:
+                    return extents
+            start = logical + length
+    except OSError:
+        pass
+    finally:
+        os.close(descriptor)
+    return extents
+
+
+def _file_system_type(path):
+    # the file system of the mount point with the longest matching path (see proc(5))
+    path = os.path.realpath(path)
+    file_system_type = None
+    mount_point_length = -1
+    try:
+        with open('/proc/self/mountinfo') as mountinfo:
+            for line in mountinfo:
+                fields, separator, file_system_fields = line.partition(' - ')
+                mount_point = re.sub(r'\\([0-7]{3})', lambda match: chr(int(match.group(1), 8)), fields.split()[4])
+                if (path == mount_point or path.startswith(mount_point.rstrip('/') + '/')) \
+                        and len(mount_point) > mount_point_length:
+                    file_system_type = file_system_fields.split()[0]
+                    mount_point_length = len(mount_point)
+    except (OSError, IndexError):
+        return None
+    return file_system_type
+
+
+_operations = {
+    'mkdir': _mkdir,
+    'copy': _copy,
+    'move': _move,
+    'mount': _mount,
+    'umount': _umount,
+    'remove': _remove,
+    'write-file': _write_file,
+    'disk-usage': _disk_usage
+}
+
+
+def _run(command):
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL)
+    stdout, stderr = process.communicate()
+    return _result(command, process.returncode, stdout.decode('UTF-8', errors='replace'),
+                   stderr.decode('UTF-8', errors='replace'))
+
+
+def _result(command, returncode, stdout, stderr):
+    return {'command': command, 'returncode': returncode, 'stdout': stdout, 'stderr': stderr}
+
+
+def _execute(request):
+    operation = _operations.get(request.get('operation'))
+    if operation is None:
+        return _result([str(request.get('operation'))], 1, '', 'unsupported operation')
+    try:
+        return operation(**request.get('arguments', {}))
+    except TypeError as e:
+        return _result([request['operation']], 1, '', str(e))
+
+
+def main():
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            response = _execute(json.loads(line))
+        except ValueError as e:
+            response = _result([], 1, '', str(e))
+        sys.stdout.write(json.dumps(response) + '\n')
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import os
+from collections import namedtuple
+
+from system.mounttable import read_mountinfo, parse_mountinfo_line
+
+# A process of the local machine. root is the root directory of the process (e.g. the chroot
+# it runs in) or None if it cannot be determined. root_id is the device and inode number of the root
+# directory or None if it cannot be read. rss is the resident set size in bytes.
+ProcessInfo = namedtuple('ProcessInfo', ['pid', 'root', 'root_id', 'rss', 'command'])
+
+# The processes running within a directory tree (e.g. a universe).
+ProcessGroup = namedtuple('ProcessGroup', ['processes', 'count', 'rss'])
+
+_page_size = os.sysconf('SC_PAGE_SIZE')
+
+# The mounts of the root directory are among the first lines of a mountinfo file, there is no need to read all of it.
+_mountinfo_head_size = 8192
+
+
+def scan_processes():
+    """
+    Lists all processes of the local machine in a single sweep over /proc.
+
+    The root directory of processes owned by other users (/proc/<pid>/root) cannot be read without
+    root privileges. For those, the root is derived from their mountinfo, which is readable by
+    everyone: the mounts a chrooted process sees (e.g. '/' or '/proc') are mounts within its chroot.
+    This does not work for processes in another mount namespace or in a chroot without any mounts.
+    :return: A list of ProcessInfo tuples.
+    """
+    mount_points = None
+    processes = []
+    for entry in os.scandir('/proc'):
+        if not entry.name.isdigit():
+            continue
+        root_path = os.path.join(entry.path, 'root')
+        try:
+            root = os.readlink(root_path)
+            root_status = os.stat(root_path)
+            root_id = (root_status.st_dev, root_status.st_ino)
+        except PermissionError:
+            if mount_points is None:
+                mount_points = {mount.mount_id: mount.mount_point for mount in read_mountinfo()}
+            root = _root_from_mountinfo(entry.path, mount_points)
+            root_id = None
+        except OSError:
+            # the process has already exited
+            continue
+        processes.append(ProcessInfo(int(entry.name), root, root_id, _read_rss(entry.path),
+                                     _read_command(entry.path)))
+    return processes
+
+
+def group_processes(roots, processes=None):
+    """
+    Groups processes by the directory tree their root lies in. Processes whose root is one of the
+    directories are recognized by its inode as well, since the path of the root directory differs
+    in another mount namespace.
+    :param roots: A dictionary containing the group names as keys and a list of directory paths as values
+                  (e.g. {'foo': ['/var/lib/slingring/foo', '/run/schroot/mount/foo-seu-session']}).
+    :param processes: The processes to group (see scan_processes). The processes are scanned if this is None.
+    :return: A dictionary containing the group names as keys and a ProcessGroup as values.
+    """
+    if processes is None:
+        processes = scan_processes()
+    groups = {}
+    for name, paths in roots.items():
+        root_ids = _directory_ids(paths)
+        members = [process for process in processes
+                   if (process.root and _is_within(process.root, paths)) or process.root_id in root_ids]
+        groups[name] = ProcessGroup(members, len(members), sum(process.rss for process in members))
+    return groups
+
+
+def processes_within(paths, processes=None):
+    """
+    Lists the processes whose root lies within one of the given directory trees.
+    :param paths: A list of directory paths.
+    :param processes: The processes to filter (see scan_processes). The processes are scanned if this is None.
+    :return: A ProcessGroup.
+    """
+    return group_processes({None: paths}, processes)[None]
+
+
+def _is_within(root, paths):
+    for path in paths:
+        path = path.rstrip('/')
+        if root == path or root.startswith(path + '/'):
+            return True
+    return False
+
+
+def _directory_ids(paths):
+    directory_ids = set()
+    for path in paths:
+        try:
+            status = os.stat(path)
+        except OSError:
+            continue
+        directory_ids.add((status.st_dev, status.st_ino))
+    return directory_ids
+
+
+def _root_from_mountinfo(process_path, mount_points):
+    try:
+        with open(os.path.join(process_path, 'mountinfo'), 'rb') as mountinfo_file:
+            head = mountinfo_file.read(_mountinfo_head_size).decode('UTF-8', errors='surrogateescape')
+    except OSError:
+        return None
+    lines = head.splitlines()
+    if len(head) == _mountinfo_head_size:
+        # the last line might be incomplete
+        lines = lines[:-1]
+    for line in lines:
+        mount = parse_mountinfo_line(line)
+        # Mount ids are unique within the mount namespace. The mount points are relative to the root
+        # of the process, so the root is the part of the actual mount point in front of them.
+        mount_point = mount_points.get(mount.mount_id)
+        if mount_point is None:
+            continue
+        if mount.mount_point == '/':
+            return mount_point
+        if mount_point.endswith(mount.mount_point):
+            return mount_point[:-len(mount.mount_point)] or '/'
+    return None
+
+
+def _read_rss(process_path):
+    try:
+        with open(os.path.join(process_path, 'statm')) as statm_file:
+            return int(statm_file.read().split()[1]) * _page_size
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def _read_command(process_path):
+    try:
+        with open(os.path.join(process_path, 'comm')) as comm_file:
+            return comm_file.read().strip()
+    except OSError:
+        return ''
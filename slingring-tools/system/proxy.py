@@ -0,0 +1,214 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import email.utils
+import os
+import shutil
+import socketserver
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+from urllib.request import Request, urlopen
+
+# Files which never change once they have been published on a mirror.
+# Everything else (Release, Packages, Sources etc.) is revalidated on every request.
+_immutable_suffixes = ('.deb', '.udeb', '.dsc', '.tar.gz', '.tar.xz', '.tar.bz2', '.diff.gz')
+
+_chunk_size = 64 * 1024
+
+
+class PackageProxy:
+    def __init__(self, cache_directory):
+        """
+        A small apt-cacher style HTTP proxy which keeps the packages and index
+        files it fetches in the given cache directory. Packages are served from the
+        cache once they have been downloaded, index files are revalidated against
+        the upstream mirror using If-Modified-Since requests.
+        The proxy is bound to the loopback interface on a random port and runs in a
+        background thread while it is used as context manager.
+        :param cache_directory: The directory the fetched files are stored in.
+        """
+        self.cache_directory = cache_directory
+        self._server = None
+        self._thread = None
+
+    @property
+    def address(self):
+        """
+        :return: The proxy URL (e.g. http://127.0.0.1:34567/).
+        """
+        host, port = self._server.server_address
+        return 'http://{}:{}/'.format(host, port)
+
+    def start(self):
+        """
+        Starts the proxy in a background thread.
+        """
+        self._server = _ThreadingHTTPServer(('127.0.0.1', 0), _PackageProxyRequestHandler)
+        self._server.cache_directory = self.cache_directory
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the proxy and waits for the background thread to finish.
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class _PackageProxyRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._handle_request(send_body=True)
+
+    def do_HEAD(self):
+        self._handle_request(send_body=False)
+
+    def log_message(self, format, *args):
+        # apt and debootstrap report failed downloads themselves
+        pass
+
+    def _handle_request(self, send_body):
+        url = urlsplit(self.path)
+        if url.scheme != 'http' or not url.netloc:
+            self.send_error(400, 'Only absolute http URLs can be proxied')
+            return
+
+        cache_path = _cache_path(self.server.cache_directory, url)
+        if cache_path is None:
+            self.send_error(400, 'The URL does not map to a path within the cache')
+            return
+        try:
+            if url.path.endswith(_immutable_suffixes) and os.path.isfile(cache_path):
+                self._send_cached_file(cache_path, send_body)
+            else:
+                self._fetch(url, cache_path, send_body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _fetch(self, url, cache_path, send_body):
+        request = Request(url.geturl())
+        if os.path.isfile(cache_path):
+            modification_time = os.path.getmtime(cache_path)
+            request.add_header('If-Modified-Since', email.utils.formatdate(modification_time, usegmt=True))
+        try:
+            response = urlopen(request)
+        except HTTPError as error:
+            if error.code == 304:
+                self._send_cached_file(cache_path, send_body)
+            else:
+                self.send_error(error.code, error.reason)
+            return
+        except URLError:
+            # the mirror is unreachable, so a stale index file is better than nothing
+            if os.path.isfile(cache_path):
+                self._send_cached_file(cache_path, send_body)
+            else:
+                self.send_error(502, 'The upstream mirror is not reachable')
+            return
+
+        with response:
+            self._send_upstream_response(response, cache_path, send_body)
+
+    def _send_upstream_response(self, response, cache_path, send_body):
+        self.send_response(200)
+        for header in ['Content-Length', 'Content-Type', 'Last-Modified']:
+            if response.headers.get(header):
+                self.send_header(header, response.headers.get(header))
+        if not response.headers.get('Content-Length'):
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        if not send_body:
+            return
+
+        cache_file = _open_cache_file(cache_path)
+        try:
+            while True:
+                chunk = response.read(_chunk_size)
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                if cache_file:
+                    cache_file.write(chunk)
+        except BaseException:
+            if cache_file:
+                cache_file.close()
+                os.remove(cache_file.name)
+            raise
+
+        if cache_file:
+            cache_file.close()
+            _publish_cache_file(cache_file.name, cache_path, response.headers.get('Last-Modified'))
+
+    def _send_cached_file(self, cache_path, send_body):
+        self.send_response(200)
+        self.send_header('Content-Length', str(os.path.getsize(cache_path)))
+        self.send_header('Last-Modified', email.utils.formatdate(os.path.getmtime(cache_path), usegmt=True))
+        self.end_headers()
+        if send_body:
+            with open(cache_path, 'rb') as cache_file:
+                shutil.copyfileobj(cache_file, self.wfile, _chunk_size)
+
+
+def _cache_path(cache_directory, url):
+    # The path of the cached file or None, if it would not be within the cache directory
+    # (e.g. because of a host name like '..' or a symbolic link in the cache).
+    cache_path = os.path.join(cache_directory, url.netloc.replace(':', '_'), os.path.normpath(url.path).lstrip('/'))
+    if not os.path.realpath(cache_path).startswith(os.path.realpath(cache_directory) + os.sep):
+        return None
+    return cache_path
+
+
+def _open_cache_file(cache_path):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        return tempfile.NamedTemporaryFile(dir=os.path.dirname(cache_path), prefix='.partial-', delete=False)
+    except OSError:
+        # serve the file anyway, it simply won't be cached
+        return None
+
+
+def _publish_cache_file(temp_path, cache_path, last_modified):
+    try:
+        os.chmod(temp_path, 0o644)
+        parsed_last_modified = email.utils.parsedate_tz(last_modified) if last_modified else None
+        if parsed_last_modified:
+            modification_time = email.utils.mktime_tz(parsed_last_modified)
+            os.utime(temp_path, (modification_time, modification_time))
+        os.replace(temp_path, cache_path)
+    except OSError:
+        os.remove(temp_path)
@@ -0,0 +1,117 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import binascii
+import hashlib
+import hmac
+import os
+
+try:
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+except ImportError:
+    Cipher = None
+
+# The Ansible vault format (version 1.1, AES256), see ansible.parsing.vault.VaultAES256.
+_header = b'$ANSIBLE_VAULT;1.1;AES256'
+_salt_length = 32
+_key_length = 32
+_iv_length = 16
+_iterations = 10000
+_block_size = 16
+_line_length = 80
+
+
+def is_available():
+    """
+    :return: True, if vault files can be encrypted and decrypted in-process. This requires
+             the (optional) cryptography package, which Ansible depends on as well.
+    """
+    return Cipher is not None
+
+
+def encrypt(plaintext, password):
+    """
+    Encrypts the given data into an Ansible vault (which can be decrypted using ansible-vault
+    or be referenced in a playbook).
+    :param plaintext: The data to encrypt as bytes or string.
+    :param password: The vault password.
+    :return: The vault file content as a string.
+    """
+    if isinstance(plaintext, str):
+        plaintext = plaintext.encode('UTF-8')
+    salt = os.urandom(_salt_length)
+    cipher_key, hmac_key, iv = _derive_keys(password, salt)
+    # Ansible pads the plaintext like for a block cipher mode, even though CTR does not need it.
+    padding = _block_size - len(plaintext) % _block_size
+    encryptor = _cipher(cipher_key, iv).encryptor()
+    ciphertext = encryptor.update(plaintext + bytes([padding]) * padding) + encryptor.finalize()
+    signature = hmac.new(hmac_key, ciphertext, hashlib.sha256).digest()
+
+    vault_text = binascii.hexlify(b'\n'.join([binascii.hexlify(salt), binascii.hexlify(signature),
+                                              binascii.hexlify(ciphertext)]))
+    lines = [_header] + [vault_text[index:index + _line_length] for index in range(0, len(vault_text), _line_length)]
+    return (b'\n'.join(lines) + b'\n').decode('ascii')
+
+
+def decrypt(vault_content, password):
+    """
+    Decrypts the given Ansible vault.
+    Raises a VaultError if the content is no AES256 vault or if the password is wrong.
+    :param vault_content: The vault file content as bytes or string.
+    :param password: The vault password.
+    :return: The decrypted data as bytes.
+    """
+    if isinstance(vault_content, str):
+        vault_content = vault_content.encode('ascii')
+    lines = vault_content.strip().splitlines()
+    if not lines or lines[0].strip() != _header:
+        raise VaultError('not an AES256 Ansible vault')
+    try:
+        salt, signature, ciphertext = [binascii.unhexlify(part) for part in
+                                       binascii.unhexlify(b''.join(line.strip() for line in lines[1:])).split(b'\n')]
+    except (ValueError, binascii.Error):
+        raise VaultError('malformed Ansible vault')
+
+    cipher_key, hmac_key, iv = _derive_keys(password, salt)
+    if not hmac.compare_digest(hmac.new(hmac_key, ciphertext, hashlib.sha256).digest(), signature):
+        raise VaultError('wrong vault password')
+    decryptor = _cipher(cipher_key, iv).decryptor()
+    padded_plaintext = decryptor.update(ciphertext) + decryptor.finalize()
+    # the plaintext is always padded (see encrypt)
+    if not padded_plaintext or not 1 <= padded_plaintext[-1] <= min(_block_size, len(padded_plaintext)):
+        raise VaultError('malformed Ansible vault')
+    return padded_plaintext[:-padded_plaintext[-1]]
+
+
+def _derive_keys(password, salt):
+    if isinstance(password, str):
+        password = password.encode('UTF-8')
+    derived_key = hashlib.pbkdf2_hmac('sha256', password, salt, _iterations, 2 * _key_length + _iv_length)
+    return derived_key[:_key_length], derived_key[_key_length:2 * _key_length], derived_key[2 * _key_length:]
+
+
+def _cipher(key, iv):
+    if Cipher is None:
+        raise VaultError('the cryptography package is not installed')
+    return Cipher(algorithms.AES(key), modes.CTR(iv), backend=default_backend())
+
+
+class VaultError(Exception):
+    pass
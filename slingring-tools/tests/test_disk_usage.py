@@ -0,0 +1,147 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import system.privileged_helper as privileged_helper  # noqa: E402
+import universe.workflow.tools.disk_usage as disk_usage  # noqa: E402
+
+
+def _record(size=0, links=(), extents=(), directories=()):
+    return {'key': [1, 1], 'size': size, 'links': [list(link) for link in links],
+            'extents': [list(extent) for extent in extents], 'directories': list(directories)}
+
+
+class SummarizeTest(unittest.TestCase):
+    def test_hard_links_are_counted_once(self):
+        records = {'.': _record(4096, directories=['usr', 'var']),
+                   'usr': _record(4096, links=[(10, 8192)]),
+                   'var': _record(4096, links=[(10, 8192), (11, 4096)])}
+        usage = disk_usage._summarize('/chroot', records)
+        self.assertEqual(usage.total, 3 * 4096 + 8192 + 4096)
+        # the parents come first, so the link is counted in /usr
+        self.assertEqual(usage.directories, {'/usr': 4096 + 8192, '/var': 4096 + 4096})
+
+    def test_shared_extents_are_counted_once(self):
+        records = {'.': _record(directories=['a', 'b']),
+                   'a': _record(extents=[(0, 8192)]),
+                   # a clone sharing a part of the extent and an adjacent range
+                   'b': _record(extents=[(4096, 8192), (0, 8192)])}
+        usage = disk_usage._summarize('/chroot', records)
+        self.assertEqual(usage.total, 12288)
+        self.assertEqual(usage.shared, 12288)
+        self.assertEqual(usage.directories['/a'], 8192)
+        self.assertEqual(usage.directories['/b'], 4096)
+
+    def test_detailed_directories(self):
+        records = {'.': _record(directories=['var']),
+                   'var': _record(100, directories=['log']),
+                   'var/log': _record(200)}
+        usage = disk_usage._summarize('/chroot', records)
+        self.assertEqual(list(usage.directories.items()), [('/var', 300), ('/var/log', 200)])
+
+
+class CountedSpaceTest(unittest.TestCase):
+    def test_space_shared_between_universes_is_counted_once(self):
+        first = {'.': _record(4096, links=[(10, 100)], extents=[(0, 8192)])}
+        clone = {'.': _record(4096, links=[(10, 100)], extents=[(0, 8192), (65536, 4096)])}
+        counted_space = disk_usage.CountedSpace()
+        counted_space.add(1, first)
+        counted_space.add(1, clone)
+        self.assertEqual(counted_space.total, 4096 + 100 + 8192 + 4096 + 4096)
+
+    def test_devices_are_separate(self):
+        records = {'.': _record(links=[(10, 100)], extents=[(0, 8192)])}
+        counted_space = disk_usage.CountedSpace()
+        counted_space.add(1, records)
+        counted_space.add(2, records)
+        self.assertEqual(counted_space.total, 2 * (100 + 8192))
+
+
+class ExtentSetTest(unittest.TestCase):
+    def test_overlapping_ranges(self):
+        extents = disk_usage._ExtentSet()
+        self.assertEqual(extents.add(100, 100), 100)
+        self.assertEqual(extents.add(300, 100), 100)
+        self.assertEqual(extents.add(100, 100), 0)
+        self.assertEqual(extents.add(150, 200), 100)
+        self.assertEqual(extents.add(0, 500), 200)
+        self.assertEqual(extents.add(500, 10), 10)
+
+
+class ScanDirectoryTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.root = self.temp_dir.name
+        os.mkdir(os.path.join(self.root, 'directory'))
+        with open(os.path.join(self.root, 'file'), 'wb') as file:
+            file.write(b'x' * 10000)
+        with open(os.path.join(self.root, 'linked'), 'wb') as file:
+            file.write(b'x' * 10000)
+        os.link(os.path.join(self.root, 'linked'), os.path.join(self.root, 'directory', 'link'))
+        self.device = os.lstat(self.root).st_dev
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _blocks(self, *names):
+        return sum(os.lstat(os.path.join(self.root, *name.split('/'))).st_blocks * 512 for name in names)
+
+    def test_record(self):
+        relative_path, record = privileged_helper._scan_directory(self.root, '.', self.device, None, False)
+        self.assertEqual(relative_path, '.')
+        self.assertEqual(record['directories'], ['directory'])
+        self.assertEqual(record['size'], self._blocks('.', 'file'))
+        linked = os.lstat(os.path.join(self.root, 'linked'))
+        self.assertEqual(record['links'], [[linked.st_ino, linked.st_blocks * 512]])
+        self.assertEqual(record['extents'], [])
+
+    def test_unchanged_directory_is_taken_from_the_cache(self):
+        _, record = privileged_helper._scan_directory(self.root, 'directory', self.device, None, False)
+        cached_record = dict(record, size=-1)
+        _, record = privileged_helper._scan_directory(self.root, 'directory', self.device, cached_record, False)
+        self.assertIs(record, cached_record)
+
+        os.remove(os.path.join(self.root, 'directory', 'link'))
+        _, record = privileged_helper._scan_directory(self.root, 'directory', self.device, cached_record, False)
+        self.assertEqual(record['links'], [])
+        self.assertNotEqual(record['size'], -1)
+
+    def test_unreadable_directory_is_not_cached(self):
+        # a file cannot be read as a directory
+        _, record = privileged_helper._scan_directory(self.root, 'file', self.device, None, False)
+        self.assertIsNone(record['key'])
+
+    def test_disk_usage(self):
+        result = privileged_helper._disk_usage(self.root, workers=2)
+        self.assertEqual(result['returncode'], 0)
+        records = json.loads(result['stdout'])
+        self.assertEqual(sorted(records), ['.', 'directory'])
+        usage = disk_usage._summarize(self.root, records)
+        self.assertEqual(usage.total, self._blocks('.', 'file', 'linked', 'directory'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import system.process as process  # noqa: E402
+
+# The mounts of the host (mount ids and mount points).
+_mount_points = {1: '/', 2: '/proc', 10: '/var/lib/slingring/foo/proc', 11: '/var/lib/slingring/foo/dev',
+                 20: '/run/schroot/mount/foo-session'}
+
+
+class RootFromMountinfoTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def _root(self, *mounts):
+        with open(os.path.join(self.temp_dir.name, 'mountinfo'), 'w') as mountinfo_file:
+            for mount_id, mount_point in mounts:
+                mountinfo_file.write('{} 1 0:1 / {} rw - ext4 /dev/sda1 rw\n'.format(mount_id, mount_point))
+        return process._root_from_mountinfo(self.temp_dir.name, _mount_points)
+
+    def test_host_process(self):
+        self.assertEqual(self._root((1, '/'), (2, '/proc')), '/')
+
+    def test_chroot_on_a_mount(self):
+        self.assertEqual(self._root((20, '/'), (21, '/proc')), '/run/schroot/mount/foo-session')
+
+    def test_plain_directory_chroot(self):
+        self.assertEqual(self._root((10, '/proc'), (11, '/dev')), '/var/lib/slingring/foo')
+
+    def test_other_mount_namespace(self):
+        self.assertIsNone(self._root((30, '/'), (31, '/proc')))
+
+
+class GroupProcessesTest(unittest.TestCase):
+    def test_processes_are_matched_by_path_and_inode(self):
+        with tempfile.TemporaryDirectory() as universe_path:
+            status = os.stat(universe_path)
+            processes = [process.ProcessInfo(1, universe_path + '/home', None, 100, 'a'),
+                         # e.g. a process in another mount namespace
+                         process.ProcessInfo(2, '/', (status.st_dev, status.st_ino), 200, 'b'),
+                         process.ProcessInfo(3, '/', None, 400, 'c')]
+            group = process.processes_within([universe_path], processes)
+        self.assertEqual([member.pid for member in group.processes], [1, 2])
+        self.assertEqual(group.rss, 300)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import functools
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+from urllib.request import ProxyHandler, build_opener
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import system.proxy as proxy  # noqa: E402
+
+
+class _QuietRequestHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class CachePathTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_directory = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_path_within_the_cache(self):
+        self.assertEqual(proxy._cache_path(self.cache_directory, urlsplit('http://mirror:80/debian/../pool/a.deb')),
+                         os.path.join(self.cache_directory, 'mirror_80', 'pool', 'a.deb'))
+
+    def test_host_leading_out_of_the_cache(self):
+        self.assertIsNone(proxy._cache_path(self.cache_directory, urlsplit('http://../etc/passwd')))
+
+    def test_path_leading_out_of_the_cache(self):
+        self.assertEqual(proxy._cache_path(self.cache_directory, urlsplit('http://mirror/../../etc/passwd')),
+                         os.path.join(self.cache_directory, 'mirror', 'etc', 'passwd'))
+
+    def test_symbolic_link_leading_out_of_the_cache(self):
+        os.symlink('/etc', os.path.join(self.cache_directory, 'mirror'))
+        self.assertIsNone(proxy._cache_path(self.cache_directory, urlsplit('http://mirror/passwd')))
+
+
+class PackageProxyTest(unittest.TestCase):
+    def setUp(self):
+        # a stand-in for the mirror which serves the files of a temporary directory
+        self.mirror_directory = tempfile.TemporaryDirectory()
+        self.cache_directory = tempfile.TemporaryDirectory()
+        os.makedirs(os.path.join(self.mirror_directory.name, 'pool'))
+        self._write_mirror_file('pool/a.deb', b'package')
+        self._write_mirror_file('Release', b'release')
+        self.mirror = HTTPServer(('127.0.0.1', 0), functools.partial(_QuietRequestHandler,
+                                                                     directory=self.mirror_directory.name))
+        self.mirror_thread = threading.Thread(target=self.mirror.serve_forever)
+        self.mirror_thread.start()
+        self.mirror_url = 'http://127.0.0.1:{}/'.format(self.mirror.server_address[1])
+        self.proxy = proxy.PackageProxy(self.cache_directory.name)
+        self.proxy.start()
+        self.opener = build_opener(ProxyHandler({'http': self.proxy.address}))
+
+    def tearDown(self):
+        self.proxy.stop()
+        self.mirror.shutdown()
+        self.mirror.server_close()
+        self.mirror_thread.join()
+        self.mirror_directory.cleanup()
+        self.cache_directory.cleanup()
+
+    def _write_mirror_file(self, name, content):
+        with open(os.path.join(self.mirror_directory.name, name), 'wb') as mirror_file:
+            mirror_file.write(content)
+
+    def _get(self, name):
+        with self.opener.open(self.mirror_url + name) as response:
+            return response.read()
+
+    def _cached_file_path(self, name):
+        return os.path.join(self.cache_directory.name, '127.0.0.1_{}'.format(self.mirror.server_address[1]), name)
+
+    def _wait_for_cached_file(self, name):
+        # the file is published after the response has been sent
+        deadline = time.time() + 5
+        while not os.path.isfile(self._cached_file_path(name)) and time.time() < deadline:
+            time.sleep(0.01)
+        return os.path.isfile(self._cached_file_path(name))
+
+    def test_cache_miss_and_hit(self):
+        self.assertEqual(self._get('pool/a.deb'), b'package')
+        self.assertTrue(self._wait_for_cached_file('pool/a.deb'))
+
+        # packages never change, so they are served from the cache without asking the mirror
+        os.remove(os.path.join(self.mirror_directory.name, 'pool', 'a.deb'))
+        self.assertEqual(self._get('pool/a.deb'), b'package')
+
+    def test_index_files_are_revalidated(self):
+        self.assertEqual(self._get('Release'), b'release')
+        self.assertTrue(self._wait_for_cached_file('Release'))
+        self.assertEqual(self._get('Release'), b'release')
+        os.remove(os.path.join(self.mirror_directory.name, 'Release'))
+        with self.assertRaises(HTTPError) as context:
+            self._get('Release')
+        self.assertEqual(context.exception.code, 404)
+
+    def test_missing_file(self):
+        with self.assertRaises(HTTPError) as context:
+            self._get('pool/b.deb')
+        self.assertEqual(context.exception.code, 404)
+        self.assertFalse(os.path.exists(self._cached_file_path('pool/b.deb')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,193 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import binascii
+import hashlib
+import hmac
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import system.vault as vault  # noqa: E402
+
+# Encrypted with ansible-vault (format 1.1, AES256) using the password below.
+_password = 'vault_test_password'
+_plaintext = b'user_secrets:\n  git_password: s3cr3t\n'
+_ansible_vault = '''$ANSIBLE_VAULT;1.1;AES256
+62633535343737666230356566373862363463656133613034616338626533613962623165326234
+3862663833653634613964636566313231396131646630630a333262306639383639363531653031
+35333139386637643833646466313432393461303238633930316562626561306131663266646631
+3963376333326163360a326364636264373633346166386664613537616636613531663537363238
+34333863333333653135306334303764353330373630343666376337623263316438353832643830
+3732316365666239343130653261613866613363333562616332
+'''
+
+
+def _substitution_box():
+    # the AES S-box, calculated from the multiplicative inverses in GF(2^8) (see FIPS 197)
+    def rotate(value, shift):
+        return ((value << shift) | (value >> (8 - shift))) & 0xff
+    box = [0x63] * 256
+    p = q = 1
+    while True:
+        p = p ^ ((p << 1) & 0xff) ^ (0x1b if p & 0x80 else 0)
+        q ^= q << 1
+        q ^= q << 2
+        q ^= q << 4
+        q &= 0xff
+        if q & 0x80:
+            q ^= 0x09
+        box[p] = q ^ rotate(q, 1) ^ rotate(q, 2) ^ rotate(q, 3) ^ rotate(q, 4) ^ 0x63
+        if p == 1:
+            return box
+
+
+_sbox = _substitution_box()
+
+
+def _multiply_by_two(value):
+    return ((value << 1) ^ (0x1b if value & 0x80 else 0)) & 0xff
+
+
+class _PythonAESCounterMode:
+    def __init__(self, key, iv):
+        """
+        A slow AES implementation in counter mode (like cryptography's Cipher(AES(key), CTR(iv))), so the vault
+        can be tested against ansible-vault without the cryptography package.
+        :param key: The key (16, 24 or 32 bytes).
+        :param iv: The initial counter block (16 bytes).
+        """
+        self._round_keys = self._expand_key(key)
+        self._counter = int.from_bytes(iv, 'big')
+
+    def encryptor(self):
+        return self
+
+    def decryptor(self):
+        return self
+
+    def update(self, data):
+        output = bytearray()
+        for offset in range(0, len(data), 16):
+            key_stream = self._encrypt_block(self._counter.to_bytes(16, 'big'))
+            self._counter = (self._counter + 1) % (1 << 128)
+            output += bytes(a ^ b for a, b in zip(data[offset:offset + 16], key_stream))
+        return bytes(output)
+
+    def finalize(self):
+        return b''
+
+    @staticmethod
+    def _expand_key(key):
+        key_words = len(key) // 4
+        rounds = key_words + 6
+        words = [list(key[index:index + 4]) for index in range(0, len(key), 4)]
+        round_constant = 1
+        for index in range(key_words, 4 * (rounds + 1)):
+            word = list(words[index - 1])
+            if index % key_words == 0:
+                word = [_sbox[byte] for byte in word[1:] + word[:1]]
+                word[0] ^= round_constant
+                round_constant = _multiply_by_two(round_constant)
+            elif key_words > 6 and index % key_words == 4:
+                word = [_sbox[byte] for byte in word]
+            words.append([a ^ b for a, b in zip(words[index - key_words], word)])
+        return [sum(words[index:index + 4], []) for index in range(0, len(words), 4)]
+
+    def _encrypt_block(self, block):
+        # the state is stored column by column
+        state = [a ^ b for a, b in zip(block, self._round_keys[0])]
+        for round_index in range(1, len(self._round_keys)):
+            state = [_sbox[byte] for byte in state]
+            state = [state[(index + 4 * (index % 4)) % 16] for index in range(16)]
+            if round_index < len(self._round_keys) - 1:
+                mixed = []
+                for column in range(4):
+                    a = state[4 * column:4 * column + 4]
+                    doubled = [_multiply_by_two(byte) for byte in a]
+                    mixed += [doubled[row] ^ doubled[(row + 1) % 4] ^ a[(row + 1) % 4] ^ a[(row + 2) % 4] ^
+                              a[(row + 3) % 4] for row in range(4)]
+                state = mixed
+            state = [a ^ b for a, b in zip(state, self._round_keys[round_index])]
+        return bytes(state)
+
+
+def _vault_content(salt, signature, ciphertext):
+    vault_text = binascii.hexlify(b'\n'.join(binascii.hexlify(part) for part in [salt, signature, ciphertext]))
+    return '$ANSIBLE_VAULT;1.1;AES256\n' + vault_text.decode('ascii') + '\n'
+
+
+class VaultTest(unittest.TestCase):
+    def setUp(self):
+        # without the cryptography package, the vault format is tested with a slow AES implementation
+        if not vault.is_available():
+            patcher = mock.patch.object(vault, '_cipher', _PythonAESCounterMode)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_round_trip(self):
+        content = vault.encrypt(_plaintext, _password)
+        self.assertTrue(content.startswith('$ANSIBLE_VAULT;1.1;AES256\n'))
+        self.assertEqual(vault.decrypt(content, _password), _plaintext)
+
+    def test_round_trip_of_string(self):
+        self.assertEqual(vault.decrypt(vault.encrypt('s3cr3t', _password), _password), b's3cr3t')
+
+    def test_round_trip_of_full_block(self):
+        self.assertEqual(vault.decrypt(vault.encrypt(b'x' * 32, _password), _password), b'x' * 32)
+
+    def test_decrypt_ansible_vault(self):
+        self.assertEqual(vault.decrypt(_ansible_vault, _password), _plaintext)
+
+    def test_encrypt_like_ansible_vault(self):
+        # the same salt results in the same vault as created by ansible-vault
+        salt = binascii.unhexlify(binascii.unhexlify(''.join(_ansible_vault.splitlines()[1:])).split(b'\n')[0])
+        with mock.patch.object(vault.os, 'urandom', return_value=salt):
+            self.assertEqual(vault.encrypt(_plaintext, _password), _ansible_vault)
+
+    def test_wrong_password(self):
+        with self.assertRaisesRegex(vault.VaultError, 'wrong vault password'):
+            vault.decrypt(_ansible_vault, 'wrong password')
+
+    def test_no_vault(self):
+        with self.assertRaises(vault.VaultError):
+            vault.decrypt('user_secrets: {}', _password)
+
+    def test_empty_ciphertext(self):
+        salt = b'\0' * 32
+        hmac_key = vault._derive_keys(_password, salt)[1]
+        content = _vault_content(salt, hmac.new(hmac_key, b'', hashlib.sha256).digest(), b'')
+        with self.assertRaisesRegex(vault.VaultError, 'malformed'):
+            vault.decrypt(content, _password)
+
+
+@unittest.skipUnless(vault.is_available(), 'the cryptography package is not installed')
+class PythonAESCounterModeTest(unittest.TestCase):
+    def test_same_as_cryptography(self):
+        key, iv = os.urandom(32), b'\xff' * 15 + b'\xfe'
+        data = os.urandom(100)
+        self.assertEqual(_PythonAESCounterMode(key, iv).update(data),
+                         vault._cipher(key, iv).encryptor().update(data))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -20,11 +20,14 @@
 ########################################################
 import argparse
 
+from universe.workflow.caching import list_images_by_args, prune_images_by_args
 from universe.workflow.creation import install_universe_by_args
 from universe.workflow.deletion import remove_universe_by_args
-from universe.workflow.listing import list_universes_by_args
+from universe.workflow.listing import list_universes_by_args, reindex_universes_by_args
+from universe.workflow.profiling import profile_universe_by_args
 from universe.workflow.update import update_universe_by_args
 from universe.workflow.upgrade import upgrade_universe_by_args
+from universe.workflow.usage import disk_usage_by_args
 
 
 def main():
@@ -43,12 +46,25 @@ def process_cli_arguments():
     subparsers = parser.add_subparsers(help='the desired operation', dest='operation', metavar='operation')
 
     list_parser = subparsers.add_parser('list', help='list installed universes')
+    list_parser.add_argument('-f', '--format', choices=['text', 'json'], default='text',
+                             help='the output format (default: text)')
     list_parser.set_defaults(func=list_universes_by_args)
 
+    reindex_parser = subparsers.add_parser('reindex', help='rebuilds the metadata index of the installed universes')
+    reindex_parser.set_defaults(func=reindex_universes_by_args)
+
     install_parser = subparsers.add_parser('install', help='installs a new universe from a seed')
-    install_parser.add_argument('seed', metavar='DIRECTORY', type=str,
-                                help='the seed directory to build the universe from')
+    install_parser.add_argument('seed', metavar='DIRECTORY', type=str, nargs='+',
+                                help='the seed directories to build the universes from')
     install_parser.add_argument('-t', '--temp', type=str, help='the temp directory to use (defaults to system temp)')
+    install_parser.add_argument('--no-cache', action='store_true',
+                                help='bootstrap the base image even if it is available in the image cache')
+    install_parser.add_argument('-r', '--resume', action='store_true',
+                                help='resume a failed installation, skipping all phases which have been completed')
+    install_parser.add_argument('-j', '--jobs', type=int, default=2,
+                                help='the maximum number of universes installed at the same time (default: 2)')
+    install_parser.add_argument('--reprompt', action='store_true',
+                                help='ask for all variables again instead of using the stored answers')
     install_parser.set_defaults(func=install_universe_by_args)
 
     remove_parser = subparsers.add_parser('remove', help='removes an existing universe')
@@ -56,17 +72,54 @@ def process_cli_arguments():
     remove_parser.set_defaults(func=remove_universe_by_args)
 
     update_parser = subparsers.add_parser('update', help='re-runs the Ansible playbook for an existing universe')
-    update_parser.add_argument('universe', help='the universe which should be updated')
+    update_parser.add_argument('universe', nargs='*', help='the universes which should be updated')
+    update_parser.add_argument('-a', '--all', action='store_true', help='update all universes')
+    update_parser.add_argument('-j', '--jobs', type=int, default=2,
+                               help='the maximum number of universes updated at the same time (default: 2)')
+    update_parser.add_argument('-f', '--force', action='store_true',
+                               help='run the whole playbook, even if nothing has changed since the last run')
+    update_parser.add_argument('--reprompt', action='store_true',
+                               help='ask for all variables again instead of using the stored answers')
     update_parser.set_defaults(func=update_universe_by_args)
 
     upgrade_parser = subparsers.add_parser('upgrade', help='upgrades an existing universe to a new seed version')
     upgrade_parser.add_argument('universe', help='the universe which should be upgraded')
     upgrade_parser.add_argument('seed', metavar='DIRECTORY', type=str,
                                 help='the seed directory to upgrade the universe to')
+    upgrade_parser.add_argument('--reprompt', action='store_true',
+                                help='ask for all variables again instead of using the stored answers')
     upgrade_parser.set_defaults(func=upgrade_universe_by_args)
 
+    profile_parser = subparsers.add_parser('profile', help='shows the slowest Ansible tasks of a universe')
+    profile_parser.add_argument('universe', help='the universe which should be profiled')
+    profile_parser.add_argument('-t', '--top', type=int, default=15, help='the number of tasks to show')
+    profile_parser.add_argument('-r', '--runs', type=int, default=5,
+                                help='the number of previous runs to compare the last run with')
+    profile_parser.set_defaults(func=profile_universe_by_args)
+
+    du_parser = subparsers.add_parser('du', help='shows the disk usage of universes')
+    du_parser.add_argument('universe', nargs='*', help='the universes which should be measured (default: all)')
+    du_parser.add_argument('--no-cache', action='store_true',
+                           help='read every directory again instead of only the changed ones')
+    du_parser.set_defaults(func=disk_usage_by_args)
+
+    cache_parser = subparsers.add_parser('cache', help='manages the base image cache')
+    cache_subparsers = cache_parser.add_subparsers(help='the desired cache operation', dest='cache_operation',
+                                                   metavar='cache_operation')
+    cache_list_parser = cache_subparsers.add_parser('list', help='list cached base images')
+    cache_list_parser.set_defaults(func=list_images_by_args)
+    cache_prune_parser = cache_subparsers.add_parser('prune', help='removes the least recently used base images')
+    cache_prune_parser.add_argument('-s', '--max-size', type=str,
+                                    help='the maximum cache size, e.g. 10G (defaults to the configured limit)')
+    cache_prune_parser.add_argument('-a', '--all', action='store_true', help='remove all cached base images')
+    cache_prune_parser.set_defaults(func=prune_images_by_args)
+
     args = parser.parse_args()
 
+    if args.operation == 'cache' and not args.cache_operation:
+        cache_parser.print_help()
+        exit(1)
+
     if not args.operation:
         parser.print_help()
         exit(1)
@@ -0,0 +1,91 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import time
+
+import universe.workflow.tools.image_cache as image_cache
+from common.configuration import ConfigurationHandler
+from resources.messages import get as _
+from universe.workflow.tools.locks import locked
+
+
+def list_images_by_args(args):
+    """
+    Lists all base images in the image cache.
+    :param args: The command line arguments as parsed by argparse.
+                 This is expected to contain the following information:
+                    - verbose: True, for more verbose output.
+    """
+    list_images(args.verbose)
+
+
+def list_images(verbose):
+    """
+    Lists all base images in the image cache, most recently used first.
+    :param verbose: True, for more verbose output.
+    """
+    images = image_cache.list_images()
+    if not images:
+        print(_('image-cache-empty'))
+        return
+
+    print(_('image-cache-list-start'))
+    for image in images:
+        last_used = time.strftime('%Y/%m/%d %H:%M', time.localtime(image['last-used']))
+        print('   - {} {} ({}, {}) {}, last used {}'.format(image['key'], image['suite'], image['arch'],
+                                                          image['variant'], image_cache.format_size(image['size']),
+                                                          last_used))
+        if verbose:
+            print('     {}, {}'.format(image['mirror'], image['debootstrap']))
+    print(_('image-cache-total').format(image_cache.format_size(sum(image['size'] for image in images))))
+
+
+def prune_images_by_args(args):
+    """
+    Removes the least recently used base images from the image cache.
+    :param args: The command line arguments as parsed by argparse.
+                 This is expected to contain the following information:
+                    - max_size: The maximum cache size (e.g. '10G') or None for the configured limit.
+                    - all: True, if all images should be removed.
+                    - verbose: True, for more verbose output.
+    """
+    if args.all:
+        size_limit = 0
+    elif args.max_size:
+        size_limit = image_cache.parse_size(args.max_size)
+    else:
+        size_limit = image_cache.parse_size(ConfigurationHandler().get_config_value('image-cache-size-limit'))
+    prune_images(size_limit, args.verbose)
+
+
+def prune_images(size_limit, verbose):
+    """
+    Removes the least recently used base images until the image cache
+    does not exceed the given size.
+    :param size_limit: The maximum cache size in bytes.
+    :param verbose: True, for more verbose output.
+    """
+    # the installations restore the base images from the cache
+    with locked([], global_exclusive=True):
+        removed_images = image_cache.prune_images(size_limit, 'image-cache-prune-phase', verbose)
+    for image in removed_images:
+        print(_('image-cache-removed').format(image['key'], image['suite'], image['arch'],
+                                              image_cache.format_size(image['size'])))
+    if not removed_images:
+        print(_('image-cache-nothing-to-prune'))
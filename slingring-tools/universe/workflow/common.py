@@ -1,24 +1,102 @@
 import os
 import time
+from contextlib import contextmanager
 
+import system.privileged as privileged
+import system.user as user
+import universe.workflow.tools.answers as answers
+from common.configuration import ConfigurationHandler
 from resources.messages import get as _
-from universe.workflow.tools.interaction import retrieve_variables_from_user
+from system.command import run_command
+from system.proxy import PackageProxy
+from universe.workflow.tools.interaction import retrieve_variables_from_user, unanswered_variables
+from universe.workflow.tools.paths import package_cache_base, user_home_in_chroot
 
+_max_concurrent_phases = 4
 
-def gather_variables_from_user(seed_dictionary):
+
+def gather_variables_from_user(seed_dictionary, universe_name=None, reprompt=False, announce_universe=False):
     """
-    Gathers the variables defined in the given description.
+    Gathers the variables defined in the given description. If the answer store is enabled,
+    only the variables which have not been answered for the given universe yet are asked.
     :param seed_dictionary: The seed universe file contents (as a dictionary).
+    :param universe_name: The name of the universe the answers are stored for or None,
+                          if the answer store should not be used.
+    :param reprompt: True, if all variables should be asked again.
+    :param announce_universe: True, if the name of the universe should be shown before the variables are asked
+                              (e.g. if the variables of several universes are asked one after another).
     :return: the retrieved user vars, the retrieved user secrets as dictionaries
              or None, None if no variables are defined in the description.
     """
-    if 'variables' in seed_dictionary:
-        print('')
-        print(_('input-header'))
-        return retrieve_variables_from_user(seed_dictionary['variables'])
-    else:
+    if 'variables' not in seed_dictionary:
         return None, None
 
+    variables = seed_dictionary['variables']
+    if universe_name is None or not answers.is_enabled():
+        _print_input_header(universe_name if announce_universe else None)
+        return retrieve_variables_from_user(variables)
+
+    store = answers.unlock()
+    stored_answers = {} if reprompt else store.answers(universe_name)
+    if unanswered_variables(variables, stored_answers):
+        _print_input_header(universe_name if announce_universe else None)
+    # answers of variables which have been removed from the seed are dropped
+    current_answers = {variable['name']: stored_answers[variable['name']] for variable in variables
+                       if variable['name'] in stored_answers}
+    user_vars, user_secrets = retrieve_variables_from_user(variables, current_answers)
+    store.set_answers(universe_name, current_answers)
+    return user_vars, user_secrets
+
+
+def _print_input_header(universe_name):
+    print('')
+    if universe_name is not None:
+        print(_('input-universe').format(universe_name))
+    print(_('input-header'))
+
+
+def gather_variables_phase(seed_dictionary, universe_name=None, reprompt=False):
+    """
+    Workflow phase which gathers the variables defined in the given description
+    (see gather_variables_from_user).
+    :param seed_dictionary: The seed universe file contents (as a dictionary).
+    :param universe_name: The name of the universe the answers are stored for.
+    :param reprompt: True, if all variables should be asked again.
+    :return: A dictionary containing the user vars ('user_vars') and the user secrets ('user_secrets').
+    """
+    user_vars, user_secrets = gather_variables_from_user(seed_dictionary, universe_name, reprompt)
+    print_spaced(_('coffee-time'))
+    return {'user_vars': user_vars, 'user_secrets': user_secrets}
+
+
+def resolve_user_phase():
+    """
+    Workflow phase which resolves the executing user.
+    :return: A dictionary containing the user name ('user_name'), the user's primary group ('user_group') and
+             the user's home directory within the chroot ('user_home').
+    """
+    user_name = user.get_user()
+    return {'user_name': user_name, 'user_group': user.get_user_group(), 'user_home': user_home_in_chroot(user_name)}
+
+
+def max_concurrent_phases(verbose):
+    """
+    :param verbose: True, if a more verbose output is desired.
+    :return: The number of workflow phases which may run at the same time. The verbose output
+             of the wrapped commands is only readable if the phases run one by one.
+    """
+    return 1 if verbose else _max_concurrent_phases
+
+
+def refresh_sudo_credentials(verbose):
+    """
+    Refreshes the cached sudo credentials before workflow phases run concurrently,
+    so sudo does not ask for the password in the middle of another prompt.
+    :param verbose: True, if a more verbose output is desired.
+    """
+    if max_concurrent_phases(verbose) > 1:
+        run_command(['sudo', '-v'], 'sudo-phase', verbose)
+
 
 def create_slingring_vars_dict(user_name, user_group, user_home, mirror, universe_name, universe_version):
     """
@@ -37,6 +115,29 @@ def create_slingring_vars_dict(user_name, user_group, user_home, mirror, univers
             'current_date': str(time.strftime('%Y/%m/%d'))}
 
 
+@contextmanager
+def package_proxy(verbose):
+    """
+    Runs the caching package proxy for the duration of the with-block, if it
+    has been enabled in the configuration ('package-proxy').
+    :param verbose: True, if a more verbose output is desired.
+    :return: The proxy URL or None if the proxy is disabled.
+    """
+    if not ConfigurationHandler().get_config_value('package-proxy'):
+        yield None
+        return
+
+    cache_directory = package_cache_base()
+    if not os.access(cache_directory, os.W_OK):
+        privileged.mkdir(cache_directory, 'package-cache-directory-phase', verbose)
+        run_command(['sudo', 'chown', '{}:{}'.format(user.get_user(), user.get_user_group()), cache_directory],
+                    'package-cache-directory-phase', verbose)
+
+    with PackageProxy(cache_directory) as proxy:
+        print(_('package-proxy').format(proxy.address))
+        yield proxy.address
+
+
 def get_seed_directory_from_argument(seed_argument):
     if os.path.isdir(seed_argument):
         return seed_argument
@@ -17,38 +17,62 @@
 
 ########################################################
 
+import time
+from collections import OrderedDict
 from tempfile import gettempdir
 
 import applications.schroot as schroot
-import system.user as user
 import universe.workflow.tools.chroot as chroot
+import universe.workflow.tools.index as index
+import universe.workflow.tools.playbook as playbook
+import universe.workflow.tools.storage as storage
 from os import path
 from common import configuration
+from common.fingerprint import fingerprint_tree, fingerprint_values
 from resources.messages import get as _
-from universe.workflow.common import gather_variables_from_user, create_slingring_vars_dict, print_spaced, \
-    get_seed_directory_from_argument
+from system.command import run_command
+from universe.workflow.common import create_slingring_vars_dict, print_spaced, get_seed_directory_from_argument, \
+    package_proxy, gather_variables_phase, gather_variables_from_user, resolve_user_phase, refresh_sudo_credentials, \
+    max_concurrent_phases
+from universe.workflow.tools.batch import BatchTask, BatchResult, run_batch, print_summary
+from universe.workflow.tools.checkpoints import InstallationCheckpoints
+from universe.workflow.tools.locks import locked
+from universe.workflow.tools.phases import PhaseGraph
 from universe.workflow.tools.paths import source_universe_file_path, copy_seed_to_local_home, installation_file_path, \
-    schroot_config_file_path, initializer_directory_path, designated_universe_path, colliding_paths_exist
+    schroot_config_file_path, initializer_directory_path, colliding_paths_exist, local_universe_dir, \
+    playbook_directory_path, playbook_generated_file_paths, install_log_path, bootstrap_log_path
 
 
 def install_universe_by_args(args):
     """"
-    Installs a new universe from a universe description.
+    Installs new universes from universe descriptions.
     :param args: The command line arguments as parsed by argparse.
                  This is expected to contain the following information:
-                    - seed: The path to the universe seed directory as string.
+                    - seed: The paths to the universe seed directories as strings.
                     - temp: An alternative temp directory for debootstrapping (must not contain spaces).
+                    - no_cache: True, if the base image cache should not be used.
+                    - resume: True, if failed installations of the universes should be resumed.
+                    - reprompt: True, if the variables should be asked again instead of using the stored answers.
+                    - jobs: The maximum number of universes installed at the same time.
                     - verbose: True, for more verbose output.
     """
-    install_universe(args.seed, args.temp, args.verbose)
+    if len(args.seed) == 1:
+        install_universe(args.seed[0], args.temp, args.verbose, not args.no_cache, args.resume, args.reprompt)
+    else:
+        install_universes(args.seed, args.temp, args.jobs, args.verbose, not args.no_cache, args.resume,
+                          args.reprompt)
 
 
-def install_universe(seed_path, temp_dir, verbose):
+def install_universe(seed_path, temp_dir, verbose, use_cache=True, resume=False, reprompt=False):
     """"
     Installs a new universe from a universe description.
     :param seed_path: The path to the universe seed directory as string.
     :param temp_dir: An alternative temp directory for debootstrapping (must not contain spaces).
     :param verbose: True, for more verbose output.
+    :param use_cache: True, if the base image cache should be used.
+    :param resume: True, if a failed installation of the universe should be resumed. Phases which have been
+                   completed before are skipped, unless their inputs have changed.
+    :param reprompt: True, if the variables should be asked again instead of using the stored answers.
     """
     source_seed_directory = get_seed_directory_from_argument(seed_path)
     source_seed_universe_path = source_universe_file_path(source_seed_directory)
@@ -56,73 +80,344 @@ def install_universe(seed_path, temp_dir, verbose):
 
     seed_dictionary = configuration.read_seed_file(source_seed_universe_path)
     universe_name = seed_dictionary['name']
-    temp_dir = _get_temp_dir_from_argument(temp_dir)
+    with locked([universe_name]):
+        temp_dir = _get_temp_dir_from_argument(temp_dir)
+        installation_path = installation_file_path(universe_name)
+
+        resume = resume and path.exists(installation_path)
+        if not resume:
+            _validate_paths_for_collision(universe_name)
+
+        if resume:
+            print(_('resume-start').format(universe_name))
+            installation_configuration = configuration.read_configuration(installation_path)
+        else:
+            print(_('start').format(universe_name))
+            installation_configuration = storage.create_storage_configuration(universe_name, seed_dictionary)
+
+        # The phases run concurrently where possible, e.g. the user is asked for the variables while
+        # debootstrap is running.
+        refresh_sudo_credentials(verbose)
+        graph = _create_installation_graph(max_concurrent_phases(verbose))
+
+        # The package proxy (if enabled) caches the packages downloaded by debootstrap, the initializers and Ansible.
+        with package_proxy(verbose) as proxy:
+            graph.run({'seed_dictionary': seed_dictionary,
+                       'source_seed_directory': source_seed_directory,
+                       'universe_name': universe_name,
+                       'installation_configuration': installation_configuration,
+                       'checkpoints': InstallationCheckpoints(installation_path, resume),
+                       'resume': resume,
+                       'reprompt': reprompt,
+                       'temp_dir': temp_dir,
+                       'use_cache': use_cache,
+                       'proxy': proxy,
+                       'verbose': verbose})
+        _index_phase(seed_dictionary, universe_name, installation_configuration, verbose)
+
+    if ' ' in universe_name:
+        quote = '"'
+    else:
+        quote = ''
+
+    print_spaced(_('done').format(quote, universe_name, quote))
+
+
+def install_universes(seed_paths, temp_dir, jobs, verbose, use_cache=True, resume=False, reprompt=False):
+    """
+    Installs several universes (see install_universe) at the same time. The variables of all
+    universes are gathered first. Universes with the same bootstrap parameters (suite, architecture,
+    variant and mirror) are grouped and each group is bootstrapped once. Overlay universes are grouped
+    by their base layer instead. Then the remaining phases of all universes run in separate processes.
+    The output of every installation goes to a log file in ~/.slingring/logs. Exits with an error if
+    any installation fails.
+    :param seed_paths: The paths to the universe seed directories as strings.
+    :param temp_dir: An alternative temp directory for debootstrapping (must not contain spaces).
+    :param jobs: The maximum number of universes installed at the same time.
+    :param verbose: True, for more verbose output (in the log files).
+    :param use_cache: True, if the base image cache should be used.
+    :param resume: True, if failed installations of the universes should be resumed.
+    :param reprompt: True, if the variables should be asked again instead of using the stored answers.
+    """
+    universes = []
+    for seed_path in seed_paths:
+        source_seed_directory = get_seed_directory_from_argument(seed_path)
+        source_seed_universe_path = source_universe_file_path(source_seed_directory)
+        _validate_seed_path_exists(source_seed_universe_path, seed_path)
+        seed_dictionary = configuration.read_seed_file(source_seed_universe_path)
+        universes.append({'universe_name': seed_dictionary['name'], 'source_seed_directory': source_seed_directory,
+                          'seed_dictionary': seed_dictionary})
+
+    universe_names = [universe['universe_name'] for universe in universes]
+    duplicate_names = sorted(set(name for name in universe_names if universe_names.count(name) > 1))
+    if duplicate_names:
+        print(_('install-duplicate-universes').format(', '.join(duplicate_names)))
+        exit(1)
+
+    # the child processes of the batches run under the locks of this process
+    with locked(universe_names):
+        temp_dir = _get_temp_dir_from_argument(temp_dir)
+        for universe in universes:
+            universe_name = universe['universe_name']
+            installation_path = installation_file_path(universe_name)
+            universe['resume'] = resume and path.exists(installation_path)
+            if universe['resume']:
+                universe['installation_configuration'] = configuration.read_configuration(installation_path)
+            else:
+                _validate_paths_for_collision(universe_name)
+                universe['installation_configuration'] = storage.create_storage_configuration(
+                    universe_name, universe['seed_dictionary'])
+
+        # nothing may interact with the user once the installations are running
+        for universe in universes:
+            universe['user_vars'], universe['user_secrets'] = gather_variables_from_user(
+                universe['seed_dictionary'], universe['universe_name'], reprompt, announce_universe=True)
+        refresh_sudo_credentials(True)
 
-    _validate_paths_for_collision(universe_name)
+        groups = OrderedDict()
+        for universe in universes:
+            seed_dictionary = universe['seed_dictionary']
+            installation_configuration = universe['installation_configuration']
+            if storage.is_overlay(installation_configuration):
+                # the base layer does not depend on the mirror, so seeds with different mirrors share it as well
+                # and must not bootstrap it at the same time
+                group_key = ('overlay', installation_configuration['lower'])
+            else:
+                group_key = (seed_dictionary['arch'], seed_dictionary['suite'], seed_dictionary.get('variant'),
+                             seed_dictionary['mirror'])
+            groups.setdefault(group_key, []).append(universe)
 
-    print(_('start').format(universe_name))
+        print_spaced(_('install-batch-start').format(len(universes), min(jobs, len(universes))))
+        with package_proxy(verbose) as proxy:
+            bootstrap_tasks = [BatchTask(', '.join(universe['universe_name'] for universe in group),
+                                         _bootstrap_group_task,
+                                         {'group': group, 'temp_dir': temp_dir, 'use_cache': use_cache,
+                                          'proxy': proxy, 'verbose': verbose},
+                                         bootstrap_log_path(group[0]['universe_name']))
+                               for group in groups.values()]
+            bootstrap_results = run_batch(bootstrap_tasks, jobs)
+            print()
 
-    # Phase 1: Retrieve Ansible variable files from the user now, so we don't need user interaction after this point
-    user_vars, user_secrets = gather_variables_from_user(seed_dictionary)
+            results = {}
+            install_tasks = []
+            for group, bootstrap_result in zip(groups.values(), bootstrap_results):
+                for universe in group:
+                    universe_name = universe['universe_name']
+                    if not bootstrap_result.success:
+                        results[universe_name] = BatchResult(universe_name, False, bootstrap_result.duration, None,
+                                                             bootstrap_result.log_path)
+                        continue
+                    arguments = {name: universe[name] for name in ['universe_name', 'source_seed_directory',
+                                                                   'seed_dictionary', 'installation_configuration',
+                                                                   'user_vars', 'user_secrets']}
+                    arguments.update({'temp_dir': temp_dir, 'use_cache': use_cache, 'proxy': proxy,
+                                      'verbose': verbose})
+                    install_tasks.append(BatchTask(universe_name, _install_task, arguments,
+                                                   install_log_path(universe_name)))
+            for result in run_batch(install_tasks, jobs):
+                results[result.name] = result
 
-    # Phase 2: Copy the universe description to our local home in ~/.slingring and write the installation file
-    #          The installation file contains the directory of the chroot, so the 'remove' operation finds it,
-    #          even if the installation fails.
-    print_spaced(_('coffee-time'))
-    universe_path = designated_universe_path(universe_name)
+    print_summary([results[universe_name] for universe_name in universe_names])
+    if not all(result.success for result in results.values()):
+        exit(1)
+
+
+def _bootstrap_group_task(group, temp_dir, use_cache, proxy, verbose):
+    # Runs in a separate process (see install_universes). Copies the seeds of a group of universes with
+    # the same bootstrap parameters and bootstraps them. Only the first universe which has not been bootstrapped
+    # yet runs debootstrap (or restores the base image from the cache), the others are copied from it before
+    # any other phase modifies it. Overlay universes share their base layer anyway.
+    source_path = None
+    for universe in group:
+        universe_name = universe['universe_name']
+        installation_configuration = universe['installation_configuration']
+        checkpoints = InstallationCheckpoints(installation_file_path(universe_name), universe['resume'])
+        print(_('resume-start' if universe['resume'] else 'start').format(universe_name))
+        _copy_seed_phase(universe['source_seed_directory'], universe_name, installation_configuration, checkpoints,
+                         universe['resume'], verbose)
+        bootstrapped = checkpoints.is_completed('bootstrap', _bootstrap_fingerprint(universe['seed_dictionary'],
+                                                                                    installation_configuration))
+        _bootstrap_phase(universe['seed_dictionary'], installation_configuration, checkpoints, universe['resume'],
+                         temp_dir, use_cache, proxy, verbose, source_path)
+        if not bootstrapped:
+            # the remaining phases run in another process, which does not know that the chroot is new
+            checkpoints.invalidate(['prepare-chroot', 'initializers', 'ansible'])
+        if not bootstrapped and source_path is None and not storage.is_overlay(installation_configuration):
+            source_path = installation_configuration['location']
+
+
+def _install_task(universe_name, source_seed_directory, seed_dictionary, installation_configuration, user_vars,
+                  user_secrets, temp_dir, use_cache, proxy, verbose):
+    # Runs in a separate process (see install_universes), after the universe has been bootstrapped.
+    # The completed phases are skipped like in a resumed installation.
+    print(_('resume-start').format(universe_name))
+    graph = _create_installation_graph(max_concurrent_phases(verbose), gather_variables=False)
+    graph.run({'seed_dictionary': seed_dictionary,
+               'source_seed_directory': source_seed_directory,
+               'universe_name': universe_name,
+               'installation_configuration': installation_configuration,
+               'checkpoints': InstallationCheckpoints(installation_file_path(universe_name), True),
+               'resume': True,
+               'temp_dir': temp_dir,
+               'use_cache': use_cache,
+               'user_vars': user_vars,
+               'user_secrets': user_secrets,
+               'proxy': proxy,
+               'verbose': verbose})
+    _index_phase(seed_dictionary, universe_name, installation_configuration, verbose)
+
+
+def _create_installation_graph(max_workers, gather_variables=True):
+    graph = PhaseGraph(max_workers)
+    # Phase 1: Retrieve Ansible variable files from the user, so we don't need user interaction after this point
+    if gather_variables:
+        graph.add('variables', gather_variables_phase, inputs=['seed_dictionary', 'universe_name', 'reprompt'],
+                  outputs=['user_vars', 'user_secrets'], interactive=True)
+    graph.add('seed', _copy_seed_phase,
+              inputs=['source_seed_directory', 'universe_name', 'installation_configuration', 'checkpoints',
+                      'resume', 'verbose'])
+    graph.add('user', resolve_user_phase, outputs=['user_name', 'user_group', 'user_home'])
+    graph.add('bootstrap', _bootstrap_phase,
+              inputs=['seed_dictionary', 'installation_configuration', 'checkpoints', 'resume', 'temp_dir',
+                      'use_cache', 'proxy', 'verbose'],
+              after=['seed'])
+    graph.add('schroot-config', _schroot_config_phase,
+              inputs=['universe_name', 'installation_configuration', 'user_name', 'user_group', 'checkpoints',
+                      'verbose'],
+              after=['seed'])
+    graph.add('prepare-chroot', _prepare_chroot_phase,
+              inputs=['universe_name', 'user_name', 'user_group', 'checkpoints', 'verbose'],
+              after=['bootstrap', 'schroot-config'])
+    graph.add('initializers', _initializers_phase,
+              inputs=['universe_name', 'installation_configuration', 'user_name', 'user_group', 'checkpoints',
+                      'proxy', 'verbose'],
+              after=['prepare-chroot'])
+    graph.add('ansible', _ansible_phase,
+              inputs=['seed_dictionary', 'universe_name', 'installation_configuration', 'user_name', 'user_group',
+                      'user_home', 'user_vars', 'user_secrets', 'checkpoints', 'proxy', 'verbose'],
+              after=['initializers'])
+    return graph
+
+
+# Phase 2: Copy the universe description to our local home in ~/.slingring and write the installation file
+#          The installation file contains the directory of the chroot, so the 'remove' operation finds it,
+#          even if the installation fails.
+def _copy_seed_phase(source_seed_directory, universe_name, installation_configuration, checkpoints, resume,
+                     verbose):
+    seed_fingerprint = fingerprint_tree(source_seed_directory)
+    if checkpoints.is_completed('seed', seed_fingerprint):
+        return
+    installation_path = installation_file_path(universe_name)
+    if resume:
+        # keep the installation file (and the recorded phases) of the universe
+        installation_configuration = configuration.read_configuration(installation_path)
+        run_command(['rm', '-rf', local_universe_dir(universe_name)], 'copy-seed-phase', verbose)
     copy_seed_to_local_home(source_seed_directory, universe_name)
-    configuration.write_installation_configuration(installation_file_path(universe_name), universe_path)
+    configuration.write_configuration(installation_path, installation_configuration)
+    checkpoints.complete('seed', seed_fingerprint)
 
-    # Phase 3: Run debootstrap to create the chroot
-    print(_('debootstrap').format(seed_dictionary['suite'], seed_dictionary['arch']))
-    chroot.bootstrap(universe_path, seed_dictionary, verbose, temp_dir)
+
+# Phase 3: Run debootstrap to create the chroot (or restore the base image from the cache).
+#          Overlay universes only need this if their base layer does not exist yet.
+#          Several universes with the same bootstrap parameters may be copied from a freshly bootstrapped
+#          chroot instead (see install_universes).
+def _bootstrap_phase(seed_dictionary, installation_configuration, checkpoints, resume, temp_dir, use_cache, proxy,
+                     verbose, source_path=None):
+    bootstrap_fingerprint = _bootstrap_fingerprint(seed_dictionary, installation_configuration)
+    if checkpoints.is_completed('bootstrap', bootstrap_fingerprint):
+        storage.mount(installation_configuration, verbose)
+        return
+    if resume:
+        storage.reset(installation_configuration, verbose)
+    if source_path:
+        print(_('clone-start').format(source_path))
+    else:
+        print(_('debootstrap').format(seed_dictionary['suite'], seed_dictionary['arch']))
+    storage.bootstrap(installation_configuration, seed_dictionary, verbose, temp_dir, use_cache, proxy, source_path)
+    checkpoints.complete('bootstrap', bootstrap_fingerprint)
 
     if verbose:
         print()
 
-    # Phase 4: Create schroot config (setup) file.
+
+def _bootstrap_fingerprint(seed_dictionary, installation_configuration):
+    return fingerprint_values(seed_dictionary['arch'], seed_dictionary['suite'], seed_dictionary.get('variant'),
+                              seed_dictionary['mirror'], storage.storage_fingerprint_values(installation_configuration))
+
+
+# Phase 4: Create schroot config (setup) file.
+def _schroot_config_phase(universe_name, installation_configuration, user_name, user_group, checkpoints, verbose):
+    universe_path = installation_configuration['location']
+    schroot_options = storage.schroot_options(installation_configuration)
+    schroot_fingerprint = fingerprint_values(universe_name, universe_path, user_name, user_group, schroot_options)
+    if checkpoints.is_completed('schroot-config', schroot_fingerprint):
+        return
     print(_('schroot'))
-    schroot_config_path = schroot_config_file_path(universe_name)
+    schroot.create_schroot_config(universe_name, schroot_config_file_path(universe_name),
+                                  universe_path, user_name, user_group, 'schroot-config-phase', verbose,
+                                  schroot_options)
+    checkpoints.complete('schroot-config', schroot_fingerprint)
 
-    user_name = user.get_user()
-    user_group = user.get_user_group()
-    schroot.create_schroot_config(universe_name, schroot_config_path,
-                                  universe_path, user_name, user_group, 'schroot-config-phase', verbose)
 
-    # Phase 4.1: We must run one command in the schroot. Since we create schroots with the setup-profile
-    #            This will copy all necessary files like /etc/passwd, /etc/shadow etc. to the chroot.
+# Phase 4.1: We must run one command in the schroot. Since we create schroots with the setup-profile
+#            This will copy all necessary files like /etc/passwd, /etc/shadow etc. to the chroot.
+def _prepare_chroot_phase(universe_name, user_name, user_group, checkpoints, verbose):
+    prepare_fingerprint = fingerprint_values(user_name, user_group)
+    if checkpoints.is_completed('prepare-chroot', prepare_fingerprint, ['bootstrap', 'schroot-config']):
+        return
     print(_('prepare-chroot'))
-    user_home = chroot.create_user_home(user_name, user_group, universe_name, verbose)
-
+    # Both the user home and the x11 socket dir are created within a single schroot session.
     # The runtime-profile will mount the x11 unix socket into the schroot, so the mount point must exist.
-    chroot.create_x11_socket_dir(universe_name, verbose)
+    chroot.prepare_chroot(user_name, user_group, universe_name, verbose)
 
     # Phase 4.2: Since everything is set up now, we set schroot config to (runtime) after first command.
     #            This will prevent subsequent schroot calls from overwriting the 'copyfiles' (e.g. /etc/passwd).
-    schroot.change_schroot_profile(universe_name, schroot_config_path, 'slingring-runtime',
+    schroot.change_schroot_profile(universe_name, schroot_config_file_path(universe_name), 'slingring-runtime',
                                    'enable-runtime-profile-phase', verbose)
+    checkpoints.complete('prepare-chroot', prepare_fingerprint)
+
 
-    # Phase 5: Run the initializer scripts. These are shell scripts provided by the author of the universe description.
-    #          Their task is to prepare the chroot for the Ansible playbooks (install Python, create _apt user for
-    #          Debian based distros etc.)
+# Phase 5: Run the initializer scripts. These are shell scripts provided by the author of the universe
+#          description. Their task is to prepare the chroot for the Ansible playbooks (install Python,
+#          create _apt user for Debian based distros etc.)
+def _initializers_phase(universe_name, installation_configuration, user_name, user_group, checkpoints, proxy,
+                        verbose):
     initializer_directory = initializer_directory_path(universe_name)
-    chroot.run_initializers(initializer_directory, universe_path, universe_name, user_name, user_group, verbose)
+    initializers_fingerprint = fingerprint_tree(initializer_directory)
+    if checkpoints.is_completed('initializers', initializers_fingerprint, ['prepare-chroot']):
+        return
+    chroot.run_initializers(initializer_directory, installation_configuration['location'], universe_name,
+                            user_name, user_group, verbose, proxy)
+    checkpoints.complete('initializers', initializers_fingerprint)
+
 
-    # Phase 6: Run the Ansible playbook on our chroot.
+# Phase 6: Run the Ansible playbook on our chroot.
+def _ansible_phase(seed_dictionary, universe_name, installation_configuration, user_name, user_group, user_home,
+                   user_vars, user_secrets, checkpoints, proxy, verbose):
+    playbook_directory = playbook_directory_path(universe_name)
+    generated_files = [path.relpath(generated_file_path, playbook_directory)
+                       for generated_file_path in playbook_generated_file_paths(universe_name)]
+    ansible_fingerprint = fingerprint_tree(playbook_directory, generated_files)
+    if checkpoints.is_completed('ansible', ansible_fingerprint, ['initializers']):
+        return
     slingring_vars = create_slingring_vars_dict(user_name, user_group, user_home, seed_dictionary['mirror'],
                                                 universe_name,
                                                 seed_dictionary['version'])
     if verbose:
         print()
-    chroot.run_ansible(universe_name, universe_path, user_vars,
-                       user_secrets, slingring_vars, verbose)
+    chroot.run_ansible(universe_name, installation_configuration['location'], user_vars,
+                       user_secrets, slingring_vars, verbose, proxy)
+    # allows 'universe update' to skip the roles which have not changed since the installation
+    playbook.store_fingerprints(universe_name,
+                                playbook.playbook_fingerprints(universe_name, user_vars, user_secrets, slingring_vars))
+    checkpoints.complete('ansible', ansible_fingerprint)
 
-    if ' ' in universe_name:
-        quote = '"'
-    else:
-        quote = ''
 
-    print_spaced(_('done').format(quote, universe_name, quote))
+# Phase 7: Add the universe to the metadata index of the local multiverse.
+def _index_phase(seed_dictionary, universe_name, installation_configuration, verbose):
+    now = int(time.time())
+    index.record_universe(universe_name, seed_dictionary, installation_configuration, installed=now, updated=now,
+                          size=index.universe_size(universe_name, installation_configuration))
 
 
 def _validate_seed_path_exists(seed_file_path, seed_path):
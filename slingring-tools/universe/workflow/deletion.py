@@ -20,11 +20,18 @@
 import os
 
 import system.mount as mount
+import system.privileged as privileged
+import universe.workflow.tools.answers as answers
+import universe.workflow.tools.index as index
+import universe.workflow.tools.storage as storage
 from common import configuration
 from resources.messages import get as _
 from system.command import run_command
+from system.process import processes_within
+from universe.workflow.tools.image_cache import format_size
+from universe.workflow.tools.locks import locked
 from universe.workflow.tools.paths import installation_file_path, schroot_config_file_path, local_universe_dir, \
-    session_mount_point
+    session_mount_point, universe_process_roots, answer_store_path
 
 
 def remove_universe_by_args(args):
@@ -52,22 +59,44 @@ def remove_universe(universe_name, verbose):
         print(_('universe-does-not-exist'))
         exit(1)
 
-    installation_path = configuration.read_configuration(installation_configuration_path)['location']
+    # the base layer of an overlay universe may be removed, which must not happen while another
+    # universe is installed on top of it
+    overlay = storage.is_overlay(configuration.read_configuration(installation_configuration_path))
+    with locked([universe_name], global_exclusive=overlay):
+        _remove_universe(universe_name, verbose)
+
+
+def _remove_universe(universe_name, verbose):
+    installation_configuration_path = installation_file_path(universe_name)
+
+    # the universe may have been removed while waiting for the lock
+    if not os.path.exists(installation_configuration_path):
+        print(_('universe-does-not-exist'))
+        exit(1)
+
+    installation_configuration = configuration.read_configuration(installation_configuration_path)
     schroot_path = schroot_config_file_path(universe_name)
 
+    running_processes = processes_within(universe_process_roots(universe_name, installation_configuration))
+    if running_processes.count:
+        print(_('still-running-error').format(running_processes.count, format_size(running_processes.rss)))
+        if verbose:
+            for process in running_processes.processes:
+                print(_('running-process').format(process.pid, process.command, process.root))
+        exit(1)
+
     if mount.contains_active_mount_point(session_mount_point(universe_name)) \
-            or mount.contains_active_mount_point(installation_path):
+            or storage.has_active_mounts(installation_configuration):
         print(_('still-mounted-error'))
         exit(1)
 
-    if os.path.exists(installation_path):
-        run_command(['sudo', 'rm', '-rf', installation_path], 'deletion-phase', verbose)
+    if storage.remove(installation_configuration, verbose):
         print(_('installation-path-removed'))
     else:
         print(_('installation-path-does-not-exist'))
 
     if os.path.exists(schroot_path):
-        run_command(['sudo', 'rm', schroot_path], 'deletion-phase', verbose)
+        privileged.remove(schroot_path, 'deletion-phase', verbose)
         print(_('schroot-config-removed'))
     else:
         print(_('schroot-config-does-not-exist'))
@@ -78,3 +107,9 @@ def remove_universe(universe_name, verbose):
         print(_('local-cache-removed'))
     else:
         print(_('local-cache-does-not-exist'))
+
+    index.remove_entry(universe_name)
+
+    # a new universe with the same name should not get the answers of this one
+    if answers.is_enabled() and os.path.exists(answer_store_path()) and answers.unlock().remove(universe_name):
+        print(_('answer-store-answers-removed'))
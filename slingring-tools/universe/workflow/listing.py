@@ -17,11 +17,15 @@
 
 ########################################################
 
-import os
+import json
 
+import system.mount as mount
+import universe.workflow.tools.index as index
 import universe.workflow.tools.paths as paths
-from common import configuration
+import universe.workflow.tools.storage as storage
 from resources.messages import get as _
+from system.process import group_processes
+from universe.workflow.tools.image_cache import format_size
 
 
 def list_universes_by_args(args):
@@ -29,26 +33,45 @@ def list_universes_by_args(args):
     Lists all universes on the local machine.
     :param args: The command line arguments as parsed by argparse.
                  This is expected to contain the following information:
+                    - format: The output format ('text' or 'json').
                     - verbose: True, for more verbose output.
     """
-    list_universes(args.verbose)
+    if args.format == 'json':
+        list_universes_as_json()
+    else:
+        list_universes(args.verbose)
 
 
 def list_universes(verbose):
     """
     Lists all universes on the local machine.
     """
-    multiverse_directory = _get_directories_in_multiverse()
+    universes = index.read_index()
+    installation_configurations = [(universe, universes[universe]) for universe in sorted(universes)]
+
+    if verbose:
+        # a single sweep over all processes yields the processes of every universe
+        process_groups = group_processes({universe: paths.universe_process_roots(universe, installation_configuration)
+                                          for universe, installation_configuration
+                                          in installation_configurations})
+
     universe_list = []
-    for universe in multiverse_directory:
-        installation_file_path = paths.installation_file_path(universe)
-        if os.path.exists(installation_file_path):
-            install_path = configuration.read_configuration(installation_file_path)['location']
-            if verbose:
-                output = '   - {} ({})'.format(universe, install_path)
-            else:
-                output = '   - {}'.format(universe)
-            universe_list.append(output)
+    for universe, installation_configuration in installation_configurations:
+        install_path = installation_configuration['location']
+        if verbose and storage.is_overlay(installation_configuration):
+            output = '   - {} ({}, overlay on {}'.format(universe, install_path, installation_configuration['lower'])
+        elif verbose:
+            output = '   - {} ({}'.format(universe, install_path)
+        else:
+            output = '   - {}'.format(universe)
+        if verbose:
+            if mount.is_mount_point(paths.session_mount_point(universe)):
+                output += ', ' + _('universe-session-active')
+            process_group = process_groups[universe]
+            if process_group.count:
+                output += ', ' + _('universe-processes').format(process_group.count, format_size(process_group.rss))
+            output += ')'
+        universe_list.append(output)
 
     if universe_list:
         print(_('list-start'))
@@ -57,8 +80,36 @@ def list_universes(verbose):
     else:
         print(_('no-universes-found'))
 
-def _get_directories_in_multiverse():
-    multiverse_directory_path = paths.local_multiverse_dir()
-    if os.path.exists(multiverse_directory_path):
-        return os.listdir(multiverse_directory_path)
-    return []
+
+def list_universes_as_json():
+    """
+    Prints the metadata index entries of all universes on the local machine as a JSON array
+    (see index.read_index). Every entry contains the universe name ('name').
+    """
+    universes = index.read_index()
+    entries = []
+    for universe in sorted(universes):
+        entry = dict(universes[universe])
+        entry['name'] = universe
+        entries.append(entry)
+    print(json.dumps(entries, indent=2, sort_keys=True))
+
+
+def reindex_universes_by_args(args):
+    """
+    Rebuilds the metadata index of the local multiverse.
+    :param args: The command line arguments as parsed by argparse.
+                 This is expected to contain the following information:
+                    - verbose: True, for more verbose output.
+    """
+    reindex_universes(args.verbose)
+
+
+def reindex_universes(verbose):
+    """
+    Rebuilds the metadata index of the local multiverse from the installed universes
+    and measures their disk usage.
+    :param verbose: True, for more verbose output.
+    """
+    universes = index.rebuild_index(True)
+    print(_('reindex-done').format(len(universes), paths.multiverse_index_path()))
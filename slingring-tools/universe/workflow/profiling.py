@@ -0,0 +1,146 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import json
+import os
+import time
+
+from resources.messages import get as _
+from universe.workflow.tools.locks import locked
+from universe.workflow.tools.paths import local_universe_dir, ansible_timing_path
+
+# A task is reported as a regression if it takes this factor longer than on average in the previous runs...
+_regression_factor = 1.5
+# ...and at least this many seconds longer.
+_regression_threshold = 1.0
+
+
+def profile_universe_by_args(args):
+    """
+    Shows the slowest Ansible tasks of the last playbook run of a universe
+    and compares them to the previous runs.
+    :param args: The command line arguments as parsed by argparse.
+                 This is expected to contain the following information:
+                    - universe: The name of the universe
+                    - top: The number of tasks to show.
+                    - runs: The number of previous runs to compare with.
+                    - verbose: True, for more verbose output.
+    """
+    profile_universe(args.universe, args.top, args.runs, args.verbose)
+
+
+def profile_universe(universe_name, top, runs, verbose):
+    """
+    Shows the slowest Ansible tasks of the last playbook run of a universe
+    and compares them to the previous runs.
+    :param universe_name: The name of the universe.
+    :param top: The number of tasks to show.
+    :param runs: The number of previous runs to compare with.
+    :param verbose: True, to show every run instead of only the compared ones.
+    """
+    # the records are written by running playbooks
+    with locked([universe_name], exclusive=False):
+        if not os.path.exists(local_universe_dir(universe_name)):
+            print(_('universe-does-not-exist'))
+            exit(1)
+
+        records = read_timing_records(universe_name)
+        if not records:
+            print(_('profile-no-records').format(universe_name))
+            return
+
+    latest = records[-1]
+    previous = records[-runs - 1:-1] if runs > 0 else []
+
+    print(_('profile-runs').format(universe_name))
+    for record in records if verbose else previous + [latest]:
+        print('   - {} {} {} ({} tasks)'.format(_format_time(record['start']), record['playbook'],
+                                               _format_duration(record['duration']), len(record['tasks'])))
+
+    latest_durations = task_durations(latest)
+    previous_durations = [task_durations(record) for record in previous]
+    slowest = sorted(latest_durations.items(), key=lambda item: item[1], reverse=True)[:top]
+
+    print()
+    print(_('profile-slowest').format(len(slowest)))
+    for task, duration in slowest:
+        compared = [durations[task] for durations in previous_durations if task in durations]
+        output = '   {:>9} {}'.format(_format_duration(duration), _format_task(task))
+        if compared:
+            average = sum(compared) / len(compared)
+            output += ' (' + _('profile-average').format(_format_duration(average), len(compared))
+            if duration > average * _regression_factor and duration - average >= _regression_threshold:
+                output += ', ' + _('profile-regression')
+            output += ')'
+        print(output)
+
+
+def read_timing_records(universe_name):
+    """
+    Reads the timing records of a universe, which are written by the slingring_timing callback plugin.
+    :param universe_name: The name of the universe.
+    :return: A list of the records (dictionaries, see the callback plugin), oldest first.
+    """
+    timing_directory = ansible_timing_path(universe_name)
+    if not os.path.isdir(timing_directory):
+        return []
+    records = []
+    for file_name in sorted(os.listdir(timing_directory)):
+        if not file_name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(timing_directory, file_name)) as record_file:
+                records.append(json.load(record_file))
+        except (OSError, ValueError):
+            # e.g. a record of an interrupted run
+            continue
+    return records
+
+
+def task_durations(record):
+    """
+    Sums up the durations of the tasks of a timing record. Tasks with the same role and name
+    (e.g. a task of a role which is included twice) are counted as one.
+    :param record: A timing record.
+    :return: A dictionary with (role, task) tuples as keys and durations in seconds as values.
+    """
+    durations = {}
+    for task in record['tasks']:
+        key = (task['role'], task['task'])
+        durations[key] = durations.get(key, 0.0) + task['duration']
+    return durations
+
+
+def _format_task(task):
+    role, name = task
+    return '{} : {}'.format(role, name) if role else name
+
+
+def _format_time(timestamp):
+    return time.strftime('%Y/%m/%d %H:%M', time.localtime(timestamp))
+
+
+def _format_duration(seconds):
+    if seconds < 60:
+        return '{:.1f}s'.format(seconds)
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    if minutes < 60:
+        return '{}m {:02d}s'.format(minutes, seconds)
+    hours, minutes = divmod(minutes, 60)
+    return '{}h {:02d}m'.format(hours, minutes)
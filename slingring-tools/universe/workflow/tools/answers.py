@@ -0,0 +1,194 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import getpass
+import os
+import tempfile
+import threading
+
+import applications.ansible as ansible
+from common.configuration import ConfigurationHandler
+from resources.messages import get as _
+from system.lock import Lock
+from system.vault import VaultError
+from universe.workflow.tools.paths import answer_store_path, answer_store_lock_path
+
+# The namespace of the answers in the vault file.
+_namespace = 'answers'
+
+# The number of attempts to enter the password of an existing answer store.
+_password_attempts = 3
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class AnswerStore:
+    def __init__(self, path, password, answers=None):
+        """
+        The answers the user gave to the variables of the universe seeds, stored encrypted
+        in an Ansible vault. Every answer is stored along with the description and the secret flag
+        of its variable, so a variable which has been changed by a new seed version is asked again.
+
+        Several Slingring processes may use the store at the same time (e.g. parallel installations).
+        Every modification reads the store again under a lock and replaces the vault file atomically,
+        so no answers get lost.
+        :param path: The path of the vault file.
+        :param password: The password of the vault.
+        :param answers: The stored answers (see answers).
+        """
+        self.path = path
+        self.password = password
+        self._answers = answers or {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def open(path, password):
+        """
+        Opens the answer store at the given path. If it does not exist yet, it is empty.
+        Raises a VaultError if the password is wrong.
+        :param path: The path of the vault file.
+        :param password: The password of the vault.
+        :return: The answer store.
+        """
+        if not os.path.exists(path):
+            return AnswerStore(path, password)
+        return AnswerStore(path, password,
+                           ansible.read_vars_vault_file(path, password, _namespace, 'answer-store-phase', False))
+
+    def answers(self, universe_name):
+        """
+        :param universe_name: The name of the universe.
+        :return: A copy of the answers of the given universe: A dictionary with the variable names as keys
+                 and dictionaries containing the 'description', the 'secret' flag and the 'value' as values.
+        """
+        with self._lock:
+            return {name: dict(answer) for name, answer in self._answers.get(universe_name, {}).items()}
+
+    def set_answers(self, universe_name, answers):
+        """
+        Replaces the answers of the given universe and saves the store.
+        :param universe_name: The name of the universe.
+        :param answers: The answers (see answers).
+        """
+        def modification(stored_answers):
+            stored_answers[universe_name] = answers
+            return True
+        self._modify(modification)
+
+    def rename(self, old_universe_name, new_universe_name):
+        """
+        Moves the answers of a universe to a new universe name and saves the store.
+        :param old_universe_name: The old name of the universe.
+        :param new_universe_name: The new name of the universe.
+        """
+        def modification(stored_answers):
+            if old_universe_name not in stored_answers:
+                return False
+            stored_answers[new_universe_name] = stored_answers.pop(old_universe_name)
+            return True
+        self._modify(modification)
+
+    def remove(self, universe_name):
+        """
+        Removes the answers of a universe and saves the store.
+        :param universe_name: The name of the universe.
+        :return: True, if there were answers to remove.
+        """
+        def modification(stored_answers):
+            return stored_answers.pop(universe_name, None) is not None
+        return self._modify(modification)
+
+    def _modify(self, modification):
+        # the modification is applied to the current contents of the store, which another process
+        # might have changed in the meantime; it returns True if the store has to be saved
+        with self._lock, Lock(answer_store_lock_path()):
+            if os.path.exists(self.path):
+                self._answers = ansible.read_vars_vault_file(self.path, self.password, _namespace,
+                                                             'answer-store-phase', False)
+            modified = modification(self._answers)
+            if modified:
+                self._save()
+            return modified
+
+    def _save(self):
+        # the vault file is replaced atomically, so it is never left incomplete (e.g. if Slingring gets killed)
+        descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix='.answers.', suffix='.tmp')
+        os.close(descriptor)
+        try:
+            ansible.write_vars_vault_file(temp_path, self._answers, self.password, _namespace, 'answer-store-phase',
+                                          False)
+            with open(temp_path) as vault_file:
+                os.fsync(vault_file.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+
+def is_enabled():
+    """
+    :return: True, if the answer store has been enabled in the configuration ('answer-store').
+    """
+    return bool(ConfigurationHandler().get_config_value('answer-store'))
+
+
+def unlock():
+    """
+    Unlocks the answer store of the user. The password is read from the configured password file
+    ('answer-store-password-file') or asked once per invocation.
+    :return: The answer store.
+    """
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = _unlock(answer_store_path())
+        return _store
+
+
+def _unlock(path):
+    password_file = ConfigurationHandler().get_config_value('answer-store-password-file')
+    if password_file:
+        try:
+            with open(os.path.expanduser(password_file)) as password_file_handle:
+                password = password_file_handle.read().rstrip('\n')
+        except OSError as e:
+            print(_('answer-store-password-file-unreadable').format(password_file, e.strerror))
+            exit(1)
+        try:
+            return AnswerStore.open(path, password)
+        except VaultError:
+            print(_('answer-store-wrong-password-file').format(password_file))
+            exit(1)
+
+    if not os.path.exists(path):
+        print(_('answer-store-create'))
+        password = getpass.getpass(prompt=_('answer-store-new-password'))
+        if password != getpass.getpass(prompt=_('answer-store-repeat-password')):
+            print(_('answer-store-password-mismatch'))
+            exit(1)
+        return AnswerStore(path, password)
+
+    for _attempt in range(_password_attempts):
+        password = getpass.getpass(prompt=_('answer-store-password'))
+        try:
+            return AnswerStore.open(path, password)
+        except VaultError:
+            print(_('answer-store-wrong-password'))
+    exit(1)
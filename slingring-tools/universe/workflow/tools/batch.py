@@ -0,0 +1,180 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import multiprocessing
+import os
+import queue
+import sys
+import time
+import traceback
+from collections import namedtuple
+
+from resources.messages import get as _
+
+# A task of a batch. The function is called with the arguments (a dictionary) in a separate process,
+# all of its output goes to the log file. It may return a short description of its result.
+BatchTask = namedtuple('BatchTask', ['name', 'function', 'arguments', 'log_path'])
+
+# The result of a task of a batch.
+BatchResult = namedtuple('BatchResult', ['name', 'success', 'duration', 'description', 'log_path'])
+
+# The interval in which the status table is refreshed (in seconds).
+_refresh_interval = 1.0
+
+
+def run_batch(tasks, jobs):
+    """
+    Runs the given tasks in separate processes, at most jobs at the same time. While the tasks run,
+    a status table is shown. The processes are started fresh (not forked), so they do not share
+    any state (e.g. the privileged helper) with this process. They must not interact with the user.
+    :param tasks: A list of BatchTasks.
+    :param jobs: The maximum number of tasks running at the same time.
+    :return: A list of BatchResults in the order of the tasks.
+    """
+    context = multiprocessing.get_context('spawn')
+    results_queue = context.Queue()
+    table = _StatusTable([task.name for task in tasks])
+    pending = list(tasks)
+    running = {}
+    results = {}
+    try:
+        while pending or running:
+            while pending and len(running) < max(jobs, 1):
+                task = pending.pop(0)
+                process = context.Process(target=_run_task, args=(task, results_queue))
+                process.start()
+                running[task.name] = (task, process, time.monotonic())
+                table.update(task.name, 'running')
+            try:
+                name, success, description = results_queue.get(timeout=_refresh_interval)
+            except queue.Empty:
+                name = _find_dead_process(running)
+                success, description = False, None
+            if name is not None:
+                task, process, start = running.pop(name)
+                process.join()
+                results[name] = BatchResult(name, success, time.monotonic() - start, description, task.log_path)
+                table.update(name, 'done' if success else 'failed', description)
+            table.refresh()
+    finally:
+        for task, process, start in running.values():
+            process.terminate()
+            process.join()
+    table.refresh(final=True)
+    return [results[task.name] for task in tasks]
+
+
+def print_summary(results):
+    """
+    Prints a summary of the results of a batch.
+    :param results: A list of BatchResults.
+    """
+    print()
+    for result in results:
+        if result.success:
+            print(_('batch-succeeded').format(result.name, _format_duration(result.duration),
+                                              ': ' + result.description if result.description else ''))
+        else:
+            print(_('batch-failed').format(result.name, _format_duration(result.duration), result.log_path))
+    failed = len([result for result in results if not result.success])
+    print()
+    print(_('batch-summary').format(len(results) - failed, failed))
+
+
+def _find_dead_process(running):
+    # A process which has been killed does not report its result. Processes which exit normally
+    # have always reported it before.
+    for name, (task, process, start) in running.items():
+        if not process.is_alive() and process.exitcode != 0:
+            return name
+    return None
+
+
+def _run_task(task, results_queue):
+    log_directory = os.path.dirname(task.log_path)
+    if not os.path.isdir(log_directory):
+        os.makedirs(log_directory)
+    with open(task.log_path, 'w') as log_file:
+        # the output of the commands run by the task goes to the log file as well
+        os.dup2(log_file.fileno(), 1)
+        os.dup2(log_file.fileno(), 2)
+    sys.stdout = sys.stderr = open(1, 'w', buffering=1, closefd=False)
+    try:
+        description = task.function(**task.arguments)
+        success = True
+    except SystemExit as exception:
+        description = None
+        success = not exception.code
+    except BaseException:
+        traceback.print_exc()
+        description = None
+        success = False
+    sys.stdout.flush()
+    results_queue.put((task.name, success, description))
+
+
+class _StatusTable:
+    def __init__(self, names):
+        """
+        Shows the status of the tasks of a batch. On a terminal, the table is redrawn in place.
+        Otherwise, a line is printed whenever the status of a task changes.
+        :param names: The names of the tasks.
+        """
+        self.names = names
+        self.status = {name: 'waiting' for name in names}
+        self.description = {name: None for name in names}
+        self.start = {}
+        self.end = {}
+        self.interactive = sys.stdout.isatty()
+        self._drawn = False
+        self._width = max(len(name) for name in names) if names else 0
+
+    def update(self, name, status, description=None):
+        self.status[name] = status
+        self.description[name] = description
+        if status == 'running':
+            self.start[name] = time.monotonic()
+        else:
+            self.end[name] = time.monotonic()
+        if not self.interactive:
+            print(self._line(name))
+
+    def refresh(self, final=False):
+        if not self.interactive:
+            return
+        if self._drawn:
+            # move the cursor back to the first line of the table
+            sys.stdout.write('\033[{}F'.format(len(self.names)))
+        for name in self.names:
+            sys.stdout.write('\033[K' + self._line(name) + '\n')
+        sys.stdout.flush()
+        self._drawn = not final
+
+    def _line(self, name):
+        line = '   {} {}'.format(name.ljust(self._width), _('batch-status-' + self.status[name]))
+        if name in self.start:
+            line += ' ' + _format_duration(self.end.get(name, time.monotonic()) - self.start[name])
+        if self.description[name]:
+            line += ' (' + self.description[name] + ')'
+        return line
+
+
+def _format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    return '{}:{:02d}'.format(minutes, seconds)
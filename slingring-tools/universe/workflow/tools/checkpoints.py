@@ -0,0 +1,84 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import threading
+
+from common import configuration
+
+
+class InstallationCheckpoints:
+    def __init__(self, installation_file_path, resume):
+        """
+        Keeps track of the completed installation phases of a universe. Every completed
+        phase is recorded in the installation file along with a fingerprint of its inputs.
+        When an installation is resumed, a phase is skipped if it has been completed
+        with the same fingerprint before and none of the phases it depends on had to be
+        run again. Phases may be checked and completed from different threads.
+        :param installation_file_path: The path to the installation file of the universe.
+        :param resume: True, if the recorded phases should be taken into account.
+        """
+        self.installation_file_path = installation_file_path
+        self.resume = resume
+        self._executed_phases = set()
+        self._lock = threading.Lock()
+
+    def is_completed(self, phase, fingerprint, dependencies=()):
+        """
+        Checks if the given phase can be skipped. If it can't, it is considered
+        executed, which invalidates all phases depending on it.
+        :param phase: The phase name.
+        :param fingerprint: The fingerprint of the phase inputs.
+        :param dependencies: The names of the checkpointed phases the given phase depends on.
+        :return: True, if the phase can be skipped.
+        """
+        with self._lock:
+            if self.resume and not self._executed_phases.intersection(dependencies) and \
+                    self._recorded_phases().get(phase) == fingerprint:
+                return True
+            self._executed_phases.add(phase)
+            return False
+
+    def complete(self, phase, fingerprint):
+        """
+        Records the given phase as completed.
+        :param phase: The phase name.
+        :param fingerprint: The fingerprint of the phase inputs.
+        """
+        with self._lock:
+            installation_configuration = configuration.read_configuration(self.installation_file_path)
+            phases = installation_configuration.get('phases') or {}
+            phases[phase] = fingerprint
+            installation_configuration['phases'] = phases
+            configuration.write_configuration(self.installation_file_path, installation_configuration)
+
+    def invalidate(self, phases):
+        """
+        Removes the records of the given phases, so they run again even if their inputs have not changed
+        (e.g. because a phase they depend on has been run by another process).
+        :param phases: The phase names.
+        """
+        with self._lock:
+            installation_configuration = configuration.read_configuration(self.installation_file_path)
+            recorded_phases = installation_configuration.get('phases') or {}
+            installation_configuration['phases'] = {phase: fingerprint for phase, fingerprint
+                                                    in recorded_phases.items() if phase not in phases}
+            configuration.write_configuration(self.installation_file_path, installation_configuration)
+
+    def _recorded_phases(self):
+        return configuration.read_configuration(self.installation_file_path).get('phases') or {}
@@ -17,24 +17,34 @@
 
 ########################################################
 
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from shlex import quote
 from tempfile import TemporaryDirectory
 
 import os
+import re
+import time
 
 import applications.ansible as ansible
 import applications.debootstrap as debootstrap
 import applications.schroot as schroot
 import system.key as key
 import system.mount as mnt
+import system.privileged as privileged
+import universe.workflow.tools.image_cache as image_cache
+from common.configuration import ConfigurationHandler, read_seed_file
 from resources.messages import get as _
-from system.command import run_command
+from system.command import run_command, ProcessFailedException
 from universe.workflow.tools.paths import playbook_directory_path, playbook_user_vars_path, \
     playbook_slingring_vars_path, \
     playbook_user_secrets_path, playbook_hosts_file_path, initializer_target_path, initializer_target_path_in_chroot, \
-    user_home_in_chroot
+    user_home_in_chroot, apt_proxy_config_path, ansible_config_file_path, ansible_fact_cache_path, universe_file_path, \
+    ansible_timing_path
 
 
-def run_ansible(universe_name, chroot_path, user_vars, user_secrets, slingring_vars, verbose):
+def run_ansible(universe_name, chroot_path, user_vars, user_secrets, slingring_vars, verbose, proxy=None,
+                playbook_file='main.yml'):
     """
     Runs the universe playbook on the given chroot.
     :param universe_name: The universe name.
@@ -43,16 +53,25 @@ def run_ansible(universe_name, chroot_path, user_vars, user_secrets, slingring_v
     :param user_secrets: A dictionary containing user secrets (key: name, value: value)
     :param slingring_vars: A dictionary containing slingring vars (key: name, value: value)
     :param verbose: True, if a more verbose output is desired.
+    :param proxy: An HTTP proxy URL which apt within the chroot should use while the playbook runs.
+    :param playbook_file: The file name of the playbook within the playbook directory.
     """
     print(_('config-files'))
     with open(playbook_hosts_file_path(universe_name), 'w') as hosts_file:
-        hosts_file.write('"{}" {}'.format(chroot_path, " ansible_connection=chroot"))
+        hosts_file.write('"{}" {}'.format(chroot_path, " ansible_connection=slingring_chroot"))
 
     # create ansible variable files
     playbook_directory = playbook_directory_path(universe_name)
     run_command(['mkdir', '-p', playbook_directory], 'create-cache-dir-phase', verbose)
     ansible.write_vars_file(playbook_user_vars_path(universe_name), user_vars, 'user_vars')
     ansible.write_vars_file(playbook_slingring_vars_path(universe_name), slingring_vars, 'slingring')
+    # Ansible runs as root, so the directories must exist beforehand to keep their files removable by the user.
+    fact_cache_path = ansible_fact_cache_path(universe_name)
+    timing_path = ansible_timing_path(universe_name)
+    run_command(['mkdir', '-p', fact_cache_path, timing_path], 'create-cache-dir-phase', verbose)
+    config_file_path = ansible_config_file_path(universe_name)
+    ansible.write_config_file(config_file_path, fact_cache_path, timing_path,
+                              read_seed_file(universe_file_path(universe_name)).get('ansible_config'))
 
     if user_secrets:
         password = key.create_random_password(20)
@@ -62,28 +81,63 @@ def run_ansible(universe_name, chroot_path, user_vars, user_secrets, slingring_v
     else:
         password = None
 
-    # mount chroot
-    print(_('mount-chroot'))
+    # The virtual file systems are mounted in a private mount namespace of the Ansible process if possible.
+    # They vanish with the process, so they are never left behind on the host (e.g. if Slingring gets killed).
+    if _use_private_mount_namespace():
+        namespace_mounts = [(source, chroot_path + target, bind, fstype)
+                            for source, target, bind, fstype in _virtual_file_systems]
+    else:
+        namespace_mounts = None
+        print(_('mount-chroot'))
     try:
-        mount(chroot_path, verbose)
+        if namespace_mounts is None:
+            mount(chroot_path, verbose)
+        if proxy:
+            _write_apt_proxy_config(chroot_path, proxy, verbose)
         # run ansible
         print(_('ansible'))
-        ansible.run_playbook(playbook_directory, verbose, password)
-        print(_('umount-chroot'))
+        ansible.run_playbook(playbook_directory, verbose, password, namespace_mounts, playbook_file,
+                             config_file_path)
+        if namespace_mounts is None:
+            print(_('umount-chroot'))
     finally:
-        umount(chroot_path, verbose)
+        if proxy:
+            privileged.remove(apt_proxy_config_path(chroot_path), 'apt-proxy-phase', verbose)
+        if namespace_mounts is None:
+            umount(chroot_path, verbose)
 
 
-def bootstrap(chroot_path, seed_dictionary, verbose, temp_dir=None):
+def bootstrap(chroot_path, seed_dictionary, verbose, temp_dir=None, use_cache=True, proxy=None):
     """
     Bootstraps a chroot into the given directory. If the parent base directory
-    does not exist, it will be created.
+    does not exist, it will be created. If the image cache is used, the base image
+    is restored from the cache if possible and stored in the cache otherwise.
     :param chroot_path: The path of the created chroot.
     :param seed_dictionary: The universe description as a dictionary.
     :param verbose: True, if a more verbose output is desired.
-    :param temp_dir:
+    :param temp_dir: An alternative temp directory for debootstrapping (must not contain spaces).
+    :param use_cache: True, if the base image cache should be used.
+    :param proxy: An HTTP proxy URL which debootstrap should download the packages through.
     """
-    run_command(['sudo', 'mkdir', '-p', chroot_path], 'create-base-directory-phase', verbose)
+    if use_cache:
+        debootstrap_version = debootstrap.get_version('debootstrap-version-phase')
+        key = image_cache.image_key(seed_dictionary, debootstrap_version)
+        if image_cache.contains_image(key):
+            print(_('image-cache-hit').format(key))
+            privileged.mkdir(os.path.dirname(chroot_path), 'create-base-directory-phase', verbose)
+            image_cache.restore_image(key, chroot_path, 'image-cache-restore-phase', verbose)
+            return
+
+    _debootstrap(chroot_path, seed_dictionary, verbose, temp_dir, proxy)
+
+    if use_cache:
+        print(_('image-cache-store').format(key))
+        image_cache.store_image(key, chroot_path, seed_dictionary, debootstrap_version, 'image-cache-store-phase',
+                                verbose)
+
+
+def _debootstrap(chroot_path, seed_dictionary, verbose, temp_dir, proxy):
+    privileged.mkdir(chroot_path, 'create-base-directory-phase', verbose)
     image_variant = seed_dictionary['variant'] if 'variant' in seed_dictionary else None
     debootstrap_dir = TemporaryDirectory(dir=temp_dir)
     with debootstrap_dir as debootstrap_dir_path:
@@ -91,15 +145,28 @@ def bootstrap(chroot_path, seed_dictionary, verbose, temp_dir=None):
         mnt.mount('none', debootstrap_dir_path, 'tmpfs-mount-phase', verbose, fstype='tmpfs')
 
         # create a dedicated directory inside the tmpfs, so we can mv it later
-        run_command(['sudo', 'mkdir', base_image_path], 'create-base-temp-directory-phase', verbose)
+        privileged.mkdir(base_image_path, 'create-base-temp-directory-phase', verbose, parents=False)
         debootstrap.debootstrap(base_image_path, seed_dictionary['arch'], image_variant, seed_dictionary['suite'],
                                 seed_dictionary['mirror'],
-                                'debootstrap-phase', verbose)
+                                'debootstrap-phase', verbose, proxy)
 
-        run_command(['sudo', 'mv', base_image_path, '-T', chroot_path], 'mv-debootstrap-dir-phase', verbose)
+        privileged.move(base_image_path, chroot_path, 'mv-debootstrap-dir-phase', verbose)
         mnt.umount(debootstrap_dir_path, 'tmpfs-umount-phase', verbose)
 
 
+def prepare_chroot(user_name, user_group, schroot_name, verbose):
+    """
+    Prepares the given schroot for its user within a single schroot session. This creates
+    the user home and the x11 socket dir (see create_user_home and create_x11_socket_dir).
+    :param user_name: The user name
+    :param user_group: The user's primary group
+    :param schroot_name: The name of the schroot
+    :param verbose: True, if a more verbose output is desired.
+    """
+    commands = _user_home_commands(user_name, user_group) + _x11_socket_dir_commands()
+    schroot.execute_batch_in_schroot(schroot_name, commands, 'prepare-chroot-phase', verbose)
+
+
 def create_user_home(user_name, user_group, schroot_name, verbose):
     """
     Creates the user home for the given user within the given schroot.
@@ -109,11 +176,9 @@ def create_user_home(user_name, user_group, schroot_name, verbose):
     :param verbose: True, if a more verbose output is desired.
     :return: The path to the user home within the chroot (e.g. /home/username).
     """
-    user_home = user_home_in_chroot(user_name)
-    schroot.execute_in_schroot(schroot_name, 'mkdir {}'.format(user_home), True, 'prepare-chroot-phase', verbose)
-    schroot.execute_in_schroot(schroot_name, 'chown {}:{} {}'.format(user_name, user_group, user_home), True,
-                               'prepare-chroot-phase', verbose)
-    return user_home
+    schroot.execute_batch_in_schroot(schroot_name, _user_home_commands(user_name, user_group),
+                                     'prepare-chroot-phase', verbose)
+    return user_home_in_chroot(user_name)
 
 
 def create_x11_socket_dir(schroot_name, verbose):
@@ -122,66 +187,198 @@ def create_x11_socket_dir(schroot_name, verbose):
     :param schroot_name: The name of the schroot
     :param verbose: True, if a more verbose output is desired.
     """
-    schroot.execute_in_schroot(schroot_name, 'mkdir -p /tmp/.X11-unix', True, 'prepare-chroot-phase', verbose)
-    schroot.execute_in_schroot(schroot_name, 'chmod 1777 /tmp/.X11-unix', True, 'prepare-chroot-phase', verbose)
+    schroot.execute_batch_in_schroot(schroot_name, _x11_socket_dir_commands(), 'prepare-chroot-phase', verbose)
 
 
 def mount(chroot_path, verbose):
     """
-    Mounts the host systems virtual filesystems into the chroot.
+    Mounts the host systems virtual filesystems into the chroot. File systems which are
+    already mounted (e.g. by an interrupted run) are left as they are.
     :param chroot_path: The chroot path.
     :param verbose: True, if a more verbose output is desired.
     """
-    mnt.mount('/proc', chroot_path + '/proc', 'mount-phase', verbose, False, 'proc')
-    mnt.mount('/sys', chroot_path + '/sys', 'mount-phase', verbose, False, 'sysfs')
-    mnt.mount('/dev', chroot_path + '/dev', 'mount-phase', verbose, True)
-    mnt.mount('/dev/pts', chroot_path + '/dev/pts', 'mount-phase', verbose, True)
+    for source, target, bind, fstype in _virtual_file_systems:
+        if not mnt.is_mount_point(chroot_path + target):
+            mnt.mount(source, chroot_path + target, 'mount-phase', verbose, bind, fstype)
 
 
 def umount(chroot_path, verbose):
     """
-    Unmounts the virtual filesystems withing the chroot.
+    Unmounts the virtual filesystems withing the chroot. File systems which are not mounted are skipped.
     :param chroot_path: The chroot.
     :param verbose: True, if a more verbose output is desired.
     """
-    mnt.umount(chroot_path + '/proc', 'umount-phase', verbose)
-    mnt.umount(chroot_path + '/sys', 'umount-phase', verbose)
-    mnt.umount(chroot_path + '/dev/pts', 'umount-phase', verbose)
-    mnt.umount(chroot_path + '/dev', 'umount-phase', verbose)
+    # nested mounts (e.g. /dev/pts) have to be unmounted first
+    for target in ['/proc', '/sys', '/dev/pts', '/dev']:
+        if mnt.is_mount_point(chroot_path + target):
+            mnt.umount(chroot_path + target, 'umount-phase', verbose)
 
 
-def run_initializers(source_directory, chroot_directory, schroot_name, user_name, user_group, verbose):
+def run_initializers(source_directory, chroot_directory, schroot_name, user_name, user_group, verbose, proxy=None):
     """
     Runs the initializer scripts from a given source directory within a given schroot.
     The scripts will be run as root but the user name and group of the slingring user will
     be available as environment variables SLINGRING_USER_NAME and SLINGRING_USER_GROUP.
+    All scripts are copied to the chroot at once and run within a single schroot session.
+    Scripts which share a numeric prefix (e.g. 10-create-apt-user.sh and 10-create-crontab-group.sh)
+    form a group and run concurrently, the groups run one after another in the sorted order of their
+    scripts. The execution stops after the first group containing a failing script. A summary
+    containing the wall-clock time and the exit status of every script is printed afterwards.
     :param source_directory: The directory in which the initializer scripts lie.
     :param chroot_directory: The path to the chroot root directory.
     :param schroot_name: The schroot name.
     :param user_name: The slingring user.
     :param user_group: The slingring user's primary group.
     :param verbose: True, if a more verbose output is desired.
+    :param proxy: An HTTP proxy URL which is exported as http_proxy to the scripts.
     """
-    initializers_path = initializer_target_path(chroot_directory)
+    initializer_scripts = _copy_initializers_to_chroot(source_directory, initializer_target_path(chroot_directory),
+                                                       verbose)
+    if not initializer_scripts:
+        return
     initializers_path_in_chroot = initializer_target_path_in_chroot()
-    schroot.execute_in_schroot(schroot_name, 'mkdir -p ' + initializers_path_in_chroot, True,
-                               'initializers-phase', verbose)
-    initializer_scripts = _copy_initializers_to_chroot(source_directory, initializers_path, verbose)
+    script_paths = [os.path.join(initializers_path_in_chroot, script) for script in initializer_scripts]
     env = _create_env(user_name, user_group)
-    for script in initializer_scripts:
-        script_path = os.path.join(initializers_path_in_chroot, script)
-        schroot.execute_in_schroot(schroot_name, 'chmod +x ' + script_path, True, 'initializers-phase', verbose,
-                                   env=env)
-        schroot.execute_in_schroot(schroot_name, script_path, True, 'initializers-phase', verbose, env=env)
+    if proxy:
+        env['http_proxy'] = proxy
+    max_concurrent_scripts = int(ConfigurationHandler().get_config_value('initializer-concurrency'))
+    results = {}
+    try:
+        with schroot.SchrootSession(schroot_name, 'initializers-phase', verbose) as session:
+            session.execute('chmod +x ' + ' '.join(quote(script_path) for script_path in script_paths), True,
+                            'initializers-phase')
+            for group in _group_initializers(initializer_scripts):
+                failure = _run_initializer_group(session, group, initializers_path_in_chroot, env,
+                                                 max_concurrent_scripts, results, verbose)
+                if failure:
+                    raise failure
+    finally:
+        _print_initializer_summary(initializer_scripts, results)
+
+
+# The virtual file systems which are mounted into the chroot while Ansible runs (source, target, bind, fstype).
+_virtual_file_systems = [('/proc', '/proc', False, 'proc'),
+                         ('/sys', '/sys', False, 'sysfs'),
+                         ('/dev', '/dev', True, None),
+                         ('/dev/pts', '/dev/pts', True, None)]
+
+
+def _use_private_mount_namespace():
+    return ConfigurationHandler().get_config_value('ansible-mount-namespace') and mnt.supports_private_namespaces()
+
+
+def _write_apt_proxy_config(chroot_path, proxy, verbose):
+    privileged.write_file(apt_proxy_config_path(chroot_path), 'Acquire::http::Proxy "{}";\n'.format(proxy),
+                          'apt-proxy-phase', verbose)
 
 
 def _copy_initializers_to_chroot(source_directory, target_directory, verbose):
-    copied_initializer_scripts = []
-    for file in os.listdir(source_directory):
-        file_path = os.path.join(source_directory, file)
-        run_command(['sudo', 'cp', file_path, target_directory], 'copy-initializers-phase', verbose)
-        copied_initializer_scripts.append(file)
-    return sorted(copied_initializer_scripts)
+    # the whole directory is copied with a single privileged operation
+    privileged.copy(source_directory, target_directory, 'copy-initializers-phase', verbose, recursive=True)
+    return sorted(file for file in os.listdir(source_directory)
+                  if os.path.isfile(os.path.join(source_directory, file)))
+
+
+# The outcome of a single initializer script. exception is the ProcessFailedException of a failed script,
+# output the captured output of a script which ran concurrently to others (None otherwise).
+InitializerResult = namedtuple('InitializerResult', ['script', 'duration', 'exit_status', 'exception', 'output'])
+
+
+def _group_initializers(initializer_scripts):
+    groups = []
+    previous_prefix = None
+    for script in initializer_scripts:
+        prefix = re.match(r'\d+', script)
+        prefix = prefix.group(0) if prefix else None
+        if prefix is not None and prefix == previous_prefix:
+            groups[-1].append(script)
+        else:
+            groups.append([script])
+        previous_prefix = prefix
+    return groups
+
+
+def _run_initializer_group(session, group, initializers_path_in_chroot, env, max_concurrent_scripts, results,
+                           verbose):
+    if len(group) == 1 or max_concurrent_scripts <= 1:
+        for script in group:
+            result = _run_initializer(session, script, os.path.join(initializers_path_in_chroot, script), env, None)
+            results[script] = result
+            if result.exception:
+                return result.exception
+        return None
+
+    # The output of concurrent scripts is captured and printed script by script once the group has finished.
+    with ThreadPoolExecutor(max_workers=min(max_concurrent_scripts, len(group))) as executor:
+        futures = [executor.submit(_run_initializer, session, script,
+                                   os.path.join(initializers_path_in_chroot, script), env, False)
+                   for script in group]
+        for future in as_completed(futures):
+            # as_completed also yields the futures cancelled below
+            if future.cancelled():
+                continue
+            if future.result().exception:
+                # scripts which have not been started yet are skipped
+                for pending_future in futures:
+                    pending_future.cancel()
+    failure = None
+    for future in futures:
+        if future.cancelled():
+            continue
+        result = future.result()
+        results[result.script] = result
+        if verbose and result.output:
+            print(_('initializer-output').format(result.script))
+            print(result.output)
+        if result.exception and failure is None:
+            failure = result.exception
+    return failure
+
+
+def _run_initializer(session, script, script_path, env, verbose):
+    start = time.monotonic()
+    output = None
+    try:
+        result = session.execute(quote(script_path), True, 'initializers-phase', env, verbose)
+        exit_status = 0
+        exception = None
+    except ProcessFailedException as e:
+        result = e.result
+        exit_status = e.result.returncode
+        exception = e
+    if verbose is False:
+        output = (result.stdout + result.stderr).decode('UTF-8', errors='replace').rstrip()
+    return InitializerResult(script, time.monotonic() - start, exit_status, exception, output)
+
+
+def _print_initializer_summary(initializer_scripts, results):
+    print()
+    print(_('initializers-summary'))
+    name_width = max(len(script) for script in initializer_scripts)
+    for script in initializer_scripts:
+        result = results.get(script)
+        if result is None:
+            status = _('initializer-skipped')
+            duration = '-'
+        else:
+            if result.exit_status:
+                status = _('initializer-failed').format(result.exit_status)
+            else:
+                status = _('initializer-succeeded')
+            duration = '{:.1f}s'.format(result.duration)
+        print('  {}  {:>8}  {}'.format(script.ljust(name_width), duration, status))
+    print()
+
+
+def _user_home_commands(user_name, user_group):
+    user_home = user_home_in_chroot(user_name)
+    return [schroot.SchrootCommand('mkdir -p {}'.format(user_home), True),
+            schroot.SchrootCommand('chown {}:{} {}'.format(user_name, user_group, user_home), True)]
+
+
+def _x11_socket_dir_commands():
+    return [schroot.SchrootCommand('mkdir -p /tmp/.X11-unix', True),
+            schroot.SchrootCommand('chmod 1777 /tmp/.X11-unix', True)]
 
 
 def _create_env(user_name, user_group):
@@ -0,0 +1,192 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import json
+import os
+import tempfile
+from bisect import bisect_right
+from collections import namedtuple, OrderedDict
+
+import system.privileged as privileged
+from universe.workflow.tools.paths import disk_usage_cache_path
+
+# The disk usage of a universe. 'total' and 'shared' are sizes in bytes, 'directories' is an OrderedDict
+# with the sizes of the top-level directories (e.g. '/usr') and the detailed directories below them
+# (see _detailed_directories), largest first.
+DiskUsage = namedtuple('DiskUsage', ['path', 'total', 'shared', 'directories'])
+
+# Directories which are listed in addition to the top-level directories, since they tend to grow.
+_detailed_directories = ['/var/cache/apt', '/var/lib/apt/lists', '/var/log', '/usr/share/doc']
+
+# The number of directories read at the same time.
+_walker_threads = 16
+
+
+class CountedSpace:
+    def __init__(self):
+        """
+        Adds up the disk space of several universes. Files with several hard links and extents shared
+        by several files are counted once, even if they are shared between universes (e.g. a universe
+        copied from another one with --reflink).
+        """
+        self.total = 0
+        self._links = {}
+        self._extents = {}
+
+    def add(self, device, records):
+        """
+        Adds the disk space of a directory tree.
+        :param device: The device number of the file system containing the directory tree.
+        :param records: The records of the directories (see privileged.disk_usage).
+        """
+        # inode numbers and physical offsets are only unique within a file system
+        seen_links = self._links.setdefault(device, set())
+        seen_extents = self._extents.setdefault(device, _ExtentSet())
+        for relative_path in sorted(records):
+            self.total += _record_size(records[relative_path], seen_links, seen_extents)[0]
+
+
+def measure(universe_name, installation_configuration, use_cache=True, counted_space=None):
+    """
+    Measures the disk space allocated by a universe. Files with several hard links and extents shared by
+    several files (e.g. copies made with --reflink) are counted once. Only the upper layer of an overlay
+    universe is taken into account, since the base layer is shared.
+
+    The records of the directories are cached in the local multiverse. Directories which have not changed
+    since the last measurement (same mtime) are not read again, so their files are not checked for changes
+    made in place.
+    :param universe_name: The universe name.
+    :param installation_configuration: The installation configuration as a dictionary.
+    :param use_cache: False, if every directory should be read again.
+    :param counted_space: A CountedSpace the disk space of the universe is added to or None.
+    :return: The disk usage (DiskUsage) or None if the chroot does not exist.
+    """
+    chroot_path = installation_configuration.get('upper') or installation_configuration['location']
+    if not os.path.isdir(chroot_path):
+        return None
+    cache_path = disk_usage_cache_path(universe_name)
+    cache = _read_cache(cache_path, chroot_path) if use_cache else None
+    records = privileged.disk_usage(chroot_path, cache, 'disk-usage-phase', _walker_threads)
+    _write_cache(cache_path, chroot_path, records)
+    if counted_space is not None:
+        counted_space.add(os.lstat(chroot_path).st_dev, records)
+    return _summarize(chroot_path, records)
+
+
+def _summarize(chroot_path, records):
+    seen_links = set()
+    seen_extents = _ExtentSet()
+    total = shared = 0
+    top_level_sizes = {}
+    detailed_sizes = {}
+    # the parents come first, so the order in which hard links and shared extents are counted is stable
+    for relative_path in sorted(records):
+        size, shared_size = _record_size(records[relative_path], seen_links, seen_extents)
+        total += size
+        shared += shared_size
+
+        if relative_path == '.':
+            continue
+        directory = '/' + relative_path
+        top_level_directory = '/' + relative_path.split('/')[0]
+        top_level_sizes[top_level_directory] = top_level_sizes.get(top_level_directory, 0) + size
+        for detailed_directory in _detailed_directories:
+            if directory == detailed_directory or directory.startswith(detailed_directory + '/'):
+                detailed_sizes[detailed_directory] = detailed_sizes.get(detailed_directory, 0) + size
+
+    directories = OrderedDict()
+    for top_level_directory in sorted(top_level_sizes, key=lambda name: top_level_sizes[name], reverse=True):
+        directories[top_level_directory] = top_level_sizes[top_level_directory]
+        nested_directories = [name for name in detailed_sizes if name.startswith(top_level_directory + '/')]
+        for detailed_directory in sorted(nested_directories, key=lambda name: detailed_sizes[name], reverse=True):
+            directories[detailed_directory] = detailed_sizes[detailed_directory]
+    return DiskUsage(chroot_path, total, shared, directories)
+
+
+def _record_size(record, seen_links, seen_extents):
+    # the size of a directory record without the hard links and shared extents which have been counted before
+    size = record['size']
+    for inode, link_size in record['links']:
+        if inode not in seen_links:
+            seen_links.add(inode)
+            size += link_size
+    shared = 0
+    for physical, length in record['extents']:
+        shared += seen_extents.add(physical, length)
+    return size + shared, shared
+
+
+class _ExtentSet:
+    def __init__(self):
+        """
+        The physical ranges of the shared extents counted so far. Clones of a file may share
+        only parts of an extent, so overlapping ranges are merged.
+        """
+        self._starts = []
+        self._ends = []
+
+    def add(self, start, length):
+        """
+        Adds a range.
+        :param start: The physical offset.
+        :param length: The length in bytes.
+        :return: The number of bytes of the range which have not been added before.
+        """
+        end = start + length
+        first = bisect_right(self._starts, start) - 1
+        if first < 0 or self._ends[first] < start:
+            first += 1
+        last = first
+        added = 0
+        covered_end = start
+        merged_start, merged_end = start, end
+        # merges the ranges which overlap or touch the new one
+        while last < len(self._starts) and self._starts[last] <= end:
+            if self._starts[last] > covered_end:
+                added += self._starts[last] - covered_end
+            covered_end = max(covered_end, self._ends[last])
+            merged_start = min(merged_start, self._starts[last])
+            merged_end = max(merged_end, self._ends[last])
+            last += 1
+        if covered_end < end:
+            added += end - covered_end
+        self._starts[first:last] = [merged_start]
+        self._ends[first:last] = [merged_end]
+        return added
+
+
+def _read_cache(cache_path, chroot_path):
+    try:
+        with open(cache_path) as cache_file:
+            cache = json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+    # the records are only valid for the directory tree they have been collected from
+    if not isinstance(cache, dict) or cache.get('path') != chroot_path:
+        return None
+    return cache.get('records')
+
+
+def _write_cache(cache_path, chroot_path, records):
+    if not os.path.isdir(os.path.dirname(cache_path)):
+        return
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(cache_path), prefix='.disk-usage.', suffix='.tmp',
+                                     delete=False) as cache_file:
+        json.dump({'path': chroot_path, 'records': records}, cache_file)
+    os.replace(cache_file.name, cache_path)
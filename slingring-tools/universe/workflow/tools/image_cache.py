@@ -0,0 +1,168 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import hashlib
+import os
+import time
+
+import yaml
+
+import system.privileged as privileged
+from common import configuration
+from system.command import run_command, get_command_output
+from universe.workflow.tools.paths import image_cache_base, image_cache_entry_path, image_cache_rootfs_path, \
+    image_cache_metadata_path
+
+_size_units = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+
+def image_key(seed_dictionary, debootstrap_version):
+    """
+    Calculates the cache key of the base image described by the given seed.
+    Two seeds share a base image if they use the same architecture, suite,
+    variant and mirror and are bootstrapped by the same debootstrap version.
+    :param seed_dictionary: The seed universe file contents (as a dictionary).
+    :param debootstrap_version: The version string of the installed debootstrap.
+    :return: The cache key as a hex string.
+    """
+    key_source = '\n'.join([seed_dictionary['arch'], seed_dictionary['suite'],
+                            str(seed_dictionary.get('variant')), seed_dictionary['mirror'],
+                            debootstrap_version])
+    return hashlib.sha256(key_source.encode('utf-8')).hexdigest()[:16]
+
+
+def contains_image(key):
+    """
+    Checks if the cache contains a complete base image for the given key.
+    :param key: The cache key.
+    :return: True, if the image is available.
+    """
+    return os.path.isdir(image_cache_rootfs_path(key)) and os.path.exists(image_cache_metadata_path(key))
+
+
+def restore_image(key, chroot_path, phase, verbose):
+    """
+    Copies the cached base image with the given key to the chroot path. The copy
+    preserves hard links and uses reflinks if the file system supports them.
+    Restoring an image marks it as recently used.
+    :param key: The cache key.
+    :param chroot_path: The (empty or non-existing) chroot path.
+    :param phase: a message key which describes the current phase. This is used if something fails.
+    :param verbose: True, if a more verbose output is desired.
+    """
+    privileged.copy(image_cache_rootfs_path(key), chroot_path, phase, verbose, archive=True, reflink=True)
+    run_command(['sudo', 'touch', image_cache_entry_path(key)], phase, verbose)
+
+
+def store_image(key, chroot_path, seed_dictionary, debootstrap_version, phase, verbose):
+    """
+    Stores a freshly bootstrapped chroot as base image in the cache. The image
+    is copied to a temporary location first and only published under its key
+    once it is complete, so an interrupted copy never results in a cache hit.
+    :param key: The cache key.
+    :param chroot_path: The path of the bootstrapped chroot.
+    :param seed_dictionary: The seed universe file contents (as a dictionary).
+    :param debootstrap_version: The version string of the installed debootstrap.
+    :param phase: a message key which describes the current phase. This is used if something fails.
+    :param verbose: True, if a more verbose output is desired.
+    """
+    entry_path = image_cache_entry_path(key)
+    partial_rootfs_path = image_cache_rootfs_path(key) + '.partial'
+    privileged.mkdir(entry_path, phase, verbose)
+    privileged.remove(partial_rootfs_path, phase, verbose, recursive=True)
+    privileged.copy(chroot_path, partial_rootfs_path, phase, verbose, archive=True, reflink=True)
+    size = int(get_command_output(['sudo', 'du', '-sb', partial_rootfs_path], phase).split()[0])
+    metadata = {'arch': seed_dictionary['arch'],
+                'suite': seed_dictionary['suite'],
+                'variant': seed_dictionary.get('variant'),
+                'mirror': seed_dictionary['mirror'],
+                'debootstrap': debootstrap_version,
+                'created': time.strftime('%Y/%m/%d %H:%M:%S'),
+                'size': size}
+    _write_metadata_as_root(metadata, image_cache_metadata_path(key), phase, verbose)
+    privileged.move(partial_rootfs_path, image_cache_rootfs_path(key), phase, verbose)
+
+
+def list_images():
+    """
+    Lists all complete images in the cache, most recently used first.
+    :return: A list of dictionaries containing the image metadata, the
+             cache key ('key') and the last usage time stamp ('last-used').
+    """
+    images = []
+    cache_base = image_cache_base()
+    if not os.path.isdir(cache_base):
+        return images
+    for key in os.listdir(cache_base):
+        if not contains_image(key):
+            continue
+        image = configuration.read_configuration(image_cache_metadata_path(key))
+        image['key'] = key
+        image['last-used'] = os.path.getmtime(image_cache_entry_path(key))
+        images.append(image)
+    return sorted(images, key=lambda entry: entry['last-used'], reverse=True)
+
+
+def prune_images(size_limit, phase, verbose):
+    """
+    Removes the least recently used images until the total cache size
+    does not exceed the given limit.
+    :param size_limit: The maximum total size in bytes.
+    :param phase: a message key which describes the current phase. This is used if something fails.
+    :param verbose: True, if a more verbose output is desired.
+    :return: A list of the removed images (see list_images).
+    """
+    images = list_images()
+    total_size = sum(image['size'] for image in images)
+    removed_images = []
+    while images and total_size > size_limit:
+        image = images.pop()
+        privileged.remove(image_cache_entry_path(image['key']), phase, verbose, recursive=True)
+        total_size -= image['size']
+        removed_images.append(image)
+    return removed_images
+
+
+def parse_size(size):
+    """
+    Parses a human readable size like '10G' or '512M' (powers of 1024).
+    :param size: The size as string or number.
+    :return: The size in bytes.
+    """
+    size_string = str(size).strip().upper().rstrip('B')
+    unit = size_string[-1:] if size_string[-1:] in _size_units else ''
+    number = size_string[:len(size_string) - len(unit)]
+    return int(float(number) * _size_units[unit])
+
+
+def format_size(size):
+    """
+    Formats a size in bytes in a human readable way (e.g. 1.2G).
+    :param size: The size in bytes.
+    :return: The formatted size.
+    """
+    for unit in ['', 'K', 'M', 'G']:
+        if size < 1024:
+            return '{:.1f}{}'.format(size, unit) if unit else '{}B'.format(size)
+        size /= 1024
+    return '{:.1f}T'.format(size)
+
+
+def _write_metadata_as_root(metadata, path, phase, verbose):
+    privileged.write_file(path, yaml.safe_dump(metadata, default_flow_style=False), phase, verbose)
@@ -0,0 +1,231 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import json
+import os
+import tempfile
+import time
+
+import universe.workflow.tools.disk_usage as disk_usage
+from common import configuration
+from system.lock import Lock
+from universe.workflow.tools.paths import multiverse_index_path, multiverse_index_lock_path, installation_file_path, \
+    universe_file_path, ansible_timing_path, installed_universe_names, local_multiverse_dir
+
+# The version of the index file format. Indexes of other versions are rebuilt.
+_index_version = 1
+
+# The parts of the installation configuration which are kept in the index.
+_storage_keys = ['location', 'storage', 'directory', 'lower', 'upper', 'work']
+
+# The index entry values which cannot be read from disk and are kept when the index is rebuilt.
+_recorded_keys = ['installed', 'updated', 'last-session', 'size']
+
+
+def read_index():
+    """
+    Reads the metadata index of the local multiverse. The index is rebuilt (without the
+    disk usage of the universes), if it does not exist yet or cannot be read. Universes which have been
+    added or removed without updating the index (e.g. by an older Slingring version or an aborted
+    installation) are added to or removed from the index.
+    :return: A dictionary with the universe names as keys and the index entries as values. An entry
+             contains the storage layout of the universe (see the installation configuration), the seed
+             version, suite and architecture, the time stamps (seconds since the epoch) of the installation
+             ('installed'), the last playbook run ('updated') and the last portal ('last-session') as well
+             as the disk usage in bytes ('size'). Unknown values are None.
+    """
+    universes = _read_index_file()
+    if universes is None:
+        if not os.path.isdir(local_multiverse_dir()):
+            return {}
+        universes = rebuild_index(False)
+    elif set(universes) != set(installed_universe_names()):
+        universes = _modify_index(_reconcile)
+    return universes
+
+
+def record_universe(universe_name, seed_dictionary, installation_configuration, **values):
+    """
+    Adds or updates the index entry of a universe.
+    :param universe_name: The universe name.
+    :param seed_dictionary: The seed universe file contents (as a dictionary).
+    :param installation_configuration: The installation configuration as a dictionary.
+    :param values: Additional entry values (e.g. installed=int(time.time())). Underscores are replaced by dashes.
+    """
+    def record(universes):
+        entry = universes.get(universe_name) or {key: None for key in _recorded_keys}
+        entry.update(_universe_values(seed_dictionary, installation_configuration))
+        entry.update(_entry_values(values))
+        universes[universe_name] = entry
+
+    _modify_index(record)
+
+
+def update_entry(universe_name, **values):
+    """
+    Updates values of the index entry of a universe. Universes which are not in the index are ignored.
+    :param universe_name: The universe name.
+    :param values: The entry values (e.g. last_session=int(time.time())). Underscores are replaced by dashes.
+    """
+    def update(universes):
+        if universe_name in universes:
+            universes[universe_name].update(_entry_values(values))
+
+    _modify_index(update)
+
+
+def rename_entry(old_universe_name, new_universe_name):
+    """
+    Moves the index entry of a universe to a new name.
+    :param old_universe_name: The current universe name.
+    :param new_universe_name: The new universe name.
+    """
+    def rename(universes):
+        if old_universe_name in universes:
+            universes[new_universe_name] = universes.pop(old_universe_name)
+
+    _modify_index(rename)
+
+
+def remove_entry(universe_name):
+    """
+    Removes the index entry of a universe.
+    :param universe_name: The universe name.
+    """
+    _modify_index(lambda universes: universes.pop(universe_name, None))
+
+
+def rebuild_index(measure_size):
+    """
+    Rebuilds the metadata index from the universes in the local multiverse. The values which
+    cannot be read from disk are kept from the previous index. The time stamps of the installation
+    and the last update are estimated from the Ansible timing records, if they are unknown.
+    :param measure_size: True, if the disk usage of the universes should be measured (requires sudo).
+    :return: The rebuilt index (see read_index).
+    """
+    return _modify_index(lambda universes: _rebuild(universes, measure_size), rebuild_missing=False)
+
+
+def universe_size(universe_name, installation_configuration):
+    """
+    Measures the disk space used by a universe (see disk_usage.measure).
+    :param universe_name: The universe name.
+    :param installation_configuration: The installation configuration as a dictionary.
+    :return: The disk usage in bytes or None if the chroot does not exist.
+    """
+    usage = disk_usage.measure(universe_name, installation_configuration)
+    return usage.total if usage else None
+
+
+def _rebuild(universes, measure_size):
+    previous_universes = dict(universes)
+    universes.clear()
+    for universe_name in installed_universe_names():
+        universes[universe_name] = _index_entry(universe_name, previous_universes.get(universe_name), measure_size)
+
+
+def _reconcile(universes):
+    installed_universes = installed_universe_names()
+    for universe_name in [universe_name for universe_name in universes if universe_name not in installed_universes]:
+        del universes[universe_name]
+    for universe_name in installed_universes:
+        if universe_name not in universes:
+            universes[universe_name] = _index_entry(universe_name, None, False)
+
+
+def _index_entry(universe_name, previous_entry, measure_size):
+    installation_configuration = configuration.read_configuration(installation_file_path(universe_name))
+    try:
+        seed_dictionary = configuration.read_seed_file(universe_file_path(universe_name))
+    except FileNotFoundError:
+        # e.g. an installation which failed before the seed has been copied
+        seed_dictionary = {}
+    entry = {key: None for key in _recorded_keys}
+    entry.update(previous_entry or {})
+    entry.update(_universe_values(seed_dictionary, installation_configuration))
+    run_times = _playbook_run_times(universe_name)
+    if run_times:
+        entry['installed'] = entry['installed'] or run_times[0]
+        entry['updated'] = entry['updated'] or run_times[-1]
+    if measure_size:
+        entry['size'] = universe_size(universe_name, installation_configuration)
+    return entry
+
+
+def _entry_values(values):
+    return {key.replace('_', '-'): value for key, value in values.items()}
+
+
+def _universe_values(seed_dictionary, installation_configuration):
+    values = {key: value for key, value in installation_configuration.items() if key in _storage_keys}
+    values.update({'version': seed_dictionary.get('version'),
+                   'suite': seed_dictionary.get('suite'),
+                   'arch': seed_dictionary.get('arch')})
+    return values
+
+
+def _playbook_run_times(universe_name):
+    # the timing records are named after the start of the playbook run (e.g. 20170401T120000-1234.json)
+    timing_directory = ansible_timing_path(universe_name)
+    if not os.path.isdir(timing_directory):
+        return []
+    run_times = []
+    for file_name in sorted(os.listdir(timing_directory)):
+        try:
+            run_times.append(int(time.mktime(time.strptime(file_name.split('-')[0], '%Y%m%dT%H%M%S'))))
+        except ValueError:
+            continue
+    return run_times
+
+
+def _modify_index(modification, rebuild_missing=True):
+    # The index is rewritten as a whole and replaces the previous one atomically, so it can
+    # always be read without a lock. Concurrent modifications are serialized by the lock.
+    index_path = multiverse_index_path()
+    with Lock(multiverse_index_lock_path()):
+        universes = _read_index_file()
+        if universes is None:
+            universes = {}
+            if rebuild_missing:
+                _rebuild(universes, False)
+        modification(universes)
+        index_file = tempfile.NamedTemporaryFile('w', dir=os.path.dirname(index_path), prefix='.index.',
+                                                 suffix='.tmp', delete=False)
+        try:
+            with index_file:
+                json.dump({'version': _index_version, 'universes': universes}, index_file, indent=2,
+                          sort_keys=True)
+                index_file.flush()
+                os.fsync(index_file.fileno())
+            os.replace(index_file.name, index_path)
+        except BaseException:
+            os.remove(index_file.name)
+            raise
+    return universes
+
+
+def _read_index_file():
+    try:
+        with open(multiverse_index_path()) as index_file:
+            index = json.load(index_file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(index, dict) or index.get('version') != _index_version:
+        return None
+    return index.get('universes') or {}
@@ -20,25 +20,56 @@
 import getpass
 
 
-def retrieve_variables_from_user(variable_dict):
+def retrieve_variables_from_user(variable_dict, answers=None):
     """
     Takes a variables dictionary from a universe description and
     asks all variables from the user. Variables which' secret flag
     has been set to True are gathered without echo and returned separately.
+    If stored answers are given, the variables which have already been answered
+    are not asked again and the answers are updated with the new ones.
     :param variable_dict: The variables dict as specified in the universe description.
+    :param answers: The stored answers (see answers.AnswerStore.answers) or None.
     :return: the retrieved user vars, the retrieved user secrets as dictionaries
     """
     retrieved_user_vars = dict()
     retrieved_user_secrets = dict()
     for variable in variable_dict:
-        if "secret" in variable and variable['secret'] is True:
-            retrieved_user_secrets[variable['name']] = getpass.getpass(
-                prompt=variable['description'] + ' (will not be echoed): ')
+        secret = _is_secret(variable)
+        if _is_answered(variable, answers):
+            value = answers[variable['name']]['value']
+        elif secret:
+            value = getpass.getpass(prompt=variable['description'] + ' (will not be echoed): ')
         else:
-            retrieved_user_vars[variable['name']] = input(variable['description'] + ': ')
+            value = input(variable['description'] + ': ')
+        if secret:
+            retrieved_user_secrets[variable['name']] = value
+        else:
+            retrieved_user_vars[variable['name']] = value
+        if answers is not None:
+            answers[variable['name']] = {'description': variable['description'], 'secret': secret, 'value': value}
     return retrieved_user_vars, retrieved_user_secrets
 
 
+def unanswered_variables(variable_dict, answers):
+    """
+    :param variable_dict: The variables dict as specified in the universe description.
+    :param answers: The stored answers (see answers.AnswerStore.answers).
+    :return: The variables which have not been answered yet, or whose description or secret flag
+             has changed since they have been answered.
+    """
+    return [variable for variable in variable_dict if not _is_answered(variable, answers)]
+
+
+def _is_secret(variable):
+    return "secret" in variable and variable['secret'] is True
+
+
+def _is_answered(variable, answers):
+    answer = (answers or {}).get(variable['name'])
+    return answer is not None and answer.get('description') == variable['description'] and \
+        answer.get('secret') == _is_secret(variable)
+
+
 def yes_no_prompt(question, default="yes"):
     """
 
@@ -0,0 +1,63 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+from contextlib import contextmanager, ExitStack
+
+from common.configuration import ConfigurationHandler
+from resources.messages import get as _
+from system.lock import Lock, LockTimeoutError, LockPermissionError, format_holders
+from universe.workflow.tools.paths import universe_lock_path, global_lock_path
+
+
+@contextmanager
+def locked(universe_names, exclusive=True, global_exclusive=False):
+    """
+    Locks the given universes and the universe directory for the duration of the with-block,
+    so concurrent workflows (of any user) do not modify the same universe at the same time.
+    Waits for the locks at most for the configured time ('lock-timeout') and exits with an error
+    if they cannot be acquired. The locks are acquired in a fixed order to avoid deadlocks.
+    :param universe_names: The names of the universes which should be locked.
+    :param exclusive: True, if the universes are modified, False if they are only read.
+    :param global_exclusive: True, if the workflow modifies state shared by all universes
+                             (e.g. the base layers or the image cache).
+    """
+    timeout = ConfigurationHandler().get_config_value('lock-timeout')
+    locks = [Lock(global_lock_path(), global_exclusive, timeout, _print_waiting(_('lock-universe-directory')))]
+    locks.extend(Lock(universe_lock_path(universe_name), exclusive, timeout,
+                      _print_waiting(_('lock-universe').format(universe_name)))
+                 for universe_name in sorted(set(universe_names)))
+
+    with ExitStack() as stack:
+        for lock in locks:
+            try:
+                stack.enter_context(lock)
+            except LockTimeoutError as error:
+                print(_('lock-timeout').format(timeout, format_holders(error.holders) or _('lock-holder-unknown')))
+                exit(1)
+            except LockPermissionError as error:
+                print(_('lock-permission-denied').format(error.path))
+                exit(1)
+        yield
+
+
+def _print_waiting(description):
+    def on_wait(holders):
+        print(_('lock-waiting').format(description, format_holders(holders) or _('lock-holder-unknown')))
+
+    return on_wait
@@ -19,11 +19,32 @@
 
 import os
 import shutil
+import tempfile
 
 from common.configuration import ConfigurationHandler
 from common.paths import local_home
 
 
+def answer_store_path():
+    return os.path.join(local_home(), '.slingring', 'answers.vault')
+
+
+def answer_store_lock_path():
+    return os.path.join(local_home(), '.slingring', 'answers.lock')
+
+
+def log_directory_path():
+    return os.path.join(local_home(), '.slingring', 'logs')
+
+
+def install_log_path(universe_name):
+    return os.path.join(log_directory_path(), 'install-{}.log'.format(universe_name))
+
+
+def bootstrap_log_path(universe_name):
+    return os.path.join(log_directory_path(), 'bootstrap-{}.log'.format(universe_name))
+
+
 def local_multiverse_dir():
     return os.path.join(local_home(), '.slingring', 'multiverse')
 
@@ -32,10 +53,63 @@ def local_universe_dir(universe_name):
     return os.path.join(local_multiverse_dir(), universe_name)
 
 
+def multiverse_index_path():
+    return os.path.join(local_multiverse_dir(), '.index.json')
+
+
+def multiverse_index_lock_path():
+    return os.path.join(local_multiverse_dir(), '.index.lock')
+
+
+def universe_lock_path(universe_name):
+    # The lock files are not kept in the local universe directories, since these are removed and renamed
+    # while they are locked.
+    return os.path.join(local_multiverse_dir(), '.locks', '{}.lock'.format(universe_name))
+
+
+def global_lock_path():
+    # The universe directory is shared by all users, so is its lock.
+    lock_directory = '/run/lock'
+    if not os.access(lock_directory, os.W_OK):
+        lock_directory = tempfile.gettempdir()
+    return os.path.join(lock_directory, 'slingring-universes.lock')
+
+
+def installed_universe_names():
+    """
+    :return: The sorted names of the universes in the local multiverse.
+    """
+    multiverse_directory = local_multiverse_dir()
+    if not os.path.isdir(multiverse_directory):
+        return []
+    return sorted(name for name in os.listdir(multiverse_directory)
+                  if os.path.exists(installation_file_path(name)))
+
+
+def update_log_path(universe_name):
+    return os.path.join(local_universe_dir(universe_name), 'update.log')
+
+
+def disk_usage_cache_path(universe_name):
+    return os.path.join(local_universe_dir(universe_name), 'disk-usage.json')
+
+
 def installation_file_path(universe_name):
     return os.path.join(local_universe_dir(universe_name), 'installation.yml')
 
 
+def ansible_config_file_path(universe_name):
+    return os.path.join(local_universe_dir(universe_name), 'ansible.cfg')
+
+
+def ansible_fact_cache_path(universe_name):
+    return os.path.join(local_universe_dir(universe_name), 'facts')
+
+
+def ansible_timing_path(universe_name):
+    return os.path.join(local_universe_dir(universe_name), 'timings')
+
+
 def universe_file_path(universe_name):
     return os.path.join(local_universe_dir(universe_name), 'universe.yml')
 
@@ -60,6 +134,23 @@ def playbook_hosts_file_path(universe_name):
     return os.path.join(playbook_directory_path(universe_name), "hosts")
 
 
+def playbook_main_file_path(universe_name):
+    return os.path.join(playbook_directory_path(universe_name), "main.yml")
+
+
+def playbook_partial_file_path(universe_name):
+    return os.path.join(playbook_directory_path(universe_name), "slingring_partial.yml")
+
+
+def playbook_generated_file_paths(universe_name):
+    """
+    :return: The paths of the files slingring generates in the playbook directory.
+    """
+    return [playbook_hosts_file_path(universe_name), playbook_slingring_vars_path(universe_name),
+            playbook_user_vars_path(universe_name), playbook_user_secrets_path(universe_name),
+            playbook_partial_file_path(universe_name)]
+
+
 def initializer_target_path(chroot_directory):
     return os.path.join(chroot_directory, 'root/initializers')
 
@@ -72,8 +163,12 @@ def user_home_in_chroot(user_name):
     return os.path.join("/home", user_name)
 
 
+def schroot_config_directory_path():
+    return '/etc/schroot/chroot.d/'
+
+
 def schroot_config_file_path(universe_name):
-    return '/etc/schroot/chroot.d/' + universe_name + ".conf"
+    return schroot_config_directory_path() + universe_name + ".conf"
 
 
 def initializer_directory_path(universe_name):
@@ -84,10 +179,52 @@ def designated_universe_path(universe_name):
     return os.path.join(designated_universe_base(), universe_name)
 
 
+def designated_overlay_root_path(universe_name):
+    return os.path.join(designated_universe_path(universe_name), 'root')
+
+
+def designated_overlay_upper_path(universe_name):
+    return os.path.join(designated_universe_path(universe_name), 'upper')
+
+
+def designated_overlay_work_path(universe_name):
+    return os.path.join(designated_universe_path(universe_name), 'work')
+
+
+def base_layer_path(seed_dictionary):
+    layer_name = '{}-{}-{}'.format(seed_dictionary['suite'], seed_dictionary['arch'],
+                                   seed_dictionary.get('variant') or 'default')
+    return os.path.join(designated_universe_base(), '.layers', layer_name)
+
+
 def designated_universe_base():
     return ConfigurationHandler().get_config_value('universe-directory')
 
 
+def image_cache_base():
+    return ConfigurationHandler().get_config_value('image-cache-directory')
+
+
+def image_cache_entry_path(image_key):
+    return os.path.join(image_cache_base(), image_key)
+
+
+def image_cache_rootfs_path(image_key):
+    return os.path.join(image_cache_entry_path(image_key), 'rootfs')
+
+
+def image_cache_metadata_path(image_key):
+    return os.path.join(image_cache_entry_path(image_key), 'image.yml')
+
+
+def package_cache_base():
+    return ConfigurationHandler().get_config_value('package-cache-directory')
+
+
+def apt_proxy_config_path(chroot_directory):
+    return os.path.join(chroot_directory, 'etc/apt/apt.conf.d/01slingring-proxy')
+
+
 def copy_seed_to_local_home(source_dir, name):
     local_cache_directory = local_universe_dir(name)
     shutil.copytree(source_dir, local_cache_directory)
@@ -98,9 +235,21 @@ def source_universe_file_path(source_directory):
     return os.path.join(source_directory, 'universe.yml')
 
 
+def session_name(universe_name):
+    return '{}-seu-session'.format(universe_name)
+
+
 def session_mount_point(universe_name):
-    session_dir = '{}-seu-session'.format(universe_name)
-    return os.path.join('/run/schroot/mount/', session_dir)
+    return session_mount_path(session_name(universe_name))
+
+
+def session_mount_path(session):
+    return os.path.join('/run/schroot/mount/', session)
+
+
+def universe_process_roots(universe_name, installation_configuration):
+    # processes in a portal are chrooted to the session mount point, others (e.g. Ansible) to the chroot itself
+    return [installation_configuration['location'], session_mount_point(universe_name)]
 
 
 def colliding_paths_exist(universe_name):
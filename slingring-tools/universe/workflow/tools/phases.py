@@ -0,0 +1,240 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import io
+import signal
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class PhaseGraph:
+    def __init__(self, max_workers):
+        """
+        A small executor for workflow phases which depend on each other. Every phase
+        declares the values it needs (inputs) and the values it produces (outputs), as
+        well as phases which simply have to be completed before it may start (after).
+        Phases whose dependencies are met run concurrently.
+
+        If a phase fails, no further phases are started. The phases which are already
+        running are awaited and the exception of the first failed phase is raised again,
+        so a failing graph behaves like a failing sequence of function calls.
+
+        Phases which interact with the user are marked as interactive. They run on the main thread,
+        so the user can interrupt them (e.g. a prompt) with Ctrl-C. While an interactive phase runs,
+        everything the other phases print is held back until it has finished. If another phase fails
+        meanwhile, the interactive phase is interrupted, so the failure is reported right away.
+        :param max_workers: The maximum number of phases running at the same time. With a single
+                            worker, the phases run one by one in the order they have been added.
+        """
+        self.max_workers = max_workers
+        self._phases = OrderedDict()
+
+    def add(self, name, function, inputs=(), outputs=(), after=(), interactive=False):
+        """
+        Adds a phase to the graph. Phases have to be added after the phases they depend on.
+        :param name: The phase name.
+        :param function: The function to run. It is called with the inputs as keyword arguments and
+                         must return a dictionary containing the outputs (or None if there are none).
+        :param inputs: The names of the values the phase needs.
+        :param outputs: The names of the values the phase produces.
+        :param after: The names of the phases which must be completed before the phase starts.
+        :param interactive: True, if the phase interacts with the user.
+        """
+        if name in self._phases:
+            raise ValueError('duplicate phase: ' + name)
+        self._phases[name] = _Phase(name, function, tuple(inputs), tuple(outputs), tuple(after), interactive)
+
+    def run(self, values=None):
+        """
+        Runs all phases.
+        :param values: A dictionary containing the initially available values.
+        :return: A dictionary containing the initial values and all phase outputs.
+        """
+        values = dict(values or {})
+        dependencies = self._resolve_dependencies(values)
+        output = _PhaseOutput(sys.stdout)
+        interruption = _Interruption()
+        completed = set()
+        pending = list(self._phases)
+        running = {}
+        failure = None
+
+        sys.stdout = output
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                while pending or running:
+                    if failure is None:
+                        interactive_phase = None
+                        for name in [name for name in pending if dependencies[name] <= completed]:
+                            if len(running) + (interactive_phase is not None) >= self.max_workers:
+                                break
+                            phase = self._phases[name]
+                            if phase.interactive and interactive_phase is not None:
+                                continue
+                            pending.remove(name)
+                            arguments = {input_name: values[input_name] for input_name in phase.inputs}
+                            if phase.interactive:
+                                interactive_phase = phase, arguments
+                                continue
+                            future = executor.submit(self._run_phase, phase, arguments, output)
+                            future.add_done_callback(interruption.phase_done)
+                            running[future] = name
+                        if interactive_phase is not None:
+                            phase, arguments = interactive_phase
+                            try:
+                                with interruption:
+                                    values.update(self._run_phase(phase, arguments, output))
+                                completed.add(phase.name)
+                            except KeyboardInterrupt:
+                                # interrupted because another phase failed, its exception is raised below
+                                if not interruption.interrupted:
+                                    raise
+                            except Exception as exception:
+                                failure = exception
+                            continue
+                    if not running:
+                        break
+                    finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        name = running.pop(future)
+                        try:
+                            values.update(future.result())
+                            completed.add(name)
+                        except BaseException as exception:
+                            failure = failure or exception
+        finally:
+            sys.stdout = output.stream
+
+        if failure is not None:
+            raise failure
+        return values
+
+    @staticmethod
+    def _run_phase(phase, arguments, output):
+        if phase.interactive:
+            output.begin_interactive()
+        try:
+            result = phase.function(**arguments) or {}
+        finally:
+            if phase.interactive:
+                output.end_interactive()
+        missing_outputs = [name for name in phase.outputs if name not in result]
+        if missing_outputs:
+            raise ValueError('phase {} did not produce {}'.format(phase.name, ', '.join(missing_outputs)))
+        return {name: result[name] for name in phase.outputs}
+
+    def _resolve_dependencies(self, values):
+        producers = {}
+        dependencies = {}
+        for phase in self._phases.values():
+            phase_dependencies = set()
+            for input_name in phase.inputs:
+                if input_name in producers:
+                    phase_dependencies.add(producers[input_name])
+                elif input_name not in values:
+                    raise ValueError('no phase before {} produces {}'.format(phase.name, input_name))
+            for name in phase.after:
+                if name not in dependencies:
+                    raise ValueError('phase {} must be added before {}'.format(name, phase.name))
+                phase_dependencies.add(name)
+            for output_name in phase.outputs:
+                producers[output_name] = phase.name
+            dependencies[phase.name] = phase_dependencies
+        return dependencies
+
+
+class _Interruption:
+    def __init__(self):
+        """
+        Interrupts the interactive phase running on the main thread (e.g. waiting for input)
+        with a KeyboardInterrupt, if another phase fails in the meantime.
+        """
+        self.interrupted = False
+        self._lock = threading.Lock()
+        self._interruptible = False
+
+    def __enter__(self):
+        with self._lock:
+            self._interruptible = True
+
+    def __exit__(self, exception_type, exception, traceback):
+        with self._lock:
+            self._interruptible = False
+
+    def phase_done(self, future):
+        if future.cancelled() or future.exception() is None:
+            return
+        with self._lock:
+            if self._interruptible and not self.interrupted:
+                self.interrupted = True
+                signal.pthread_kill(threading.main_thread().ident, signal.SIGINT)
+
+
+class _Phase:
+    def __init__(self, name, function, inputs, outputs, after, interactive):
+        self.name = name
+        self.function = function
+        self.inputs = inputs
+        self.outputs = outputs
+        self.after = after
+        self.interactive = interactive
+
+
+class _PhaseOutput(io.TextIOBase):
+    def __init__(self, stream):
+        """
+        Replaces sys.stdout while the phases run. While an interactive phase runs, the
+        output of all other threads is buffered and written once the interactive phase is done.
+        :param stream: The original stdout.
+        """
+        self.stream = stream
+        self._lock = threading.RLock()
+        self._interactive_thread = None
+        self._buffer = []
+
+    def begin_interactive(self):
+        with self._lock:
+            self._interactive_thread = threading.current_thread()
+
+    def end_interactive(self):
+        with self._lock:
+            self._interactive_thread = None
+            self.stream.write(''.join(self._buffer))
+            self.stream.flush()
+            self._buffer = []
+
+    def write(self, text):
+        with self._lock:
+            if self._interactive_thread not in (None, threading.current_thread()):
+                self._buffer.append(text)
+            else:
+                self.stream.write(text)
+        return len(text)
+
+    def flush(self):
+        with self._lock:
+            self.stream.flush()
+
+    def isatty(self):
+        return self.stream.isatty()
+
+    def fileno(self):
+        return self.stream.fileno()
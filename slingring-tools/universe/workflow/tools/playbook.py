@@ -0,0 +1,179 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import os
+
+import yaml
+
+from common import configuration
+from common.fingerprint import fingerprint_tree, fingerprint_values
+from universe.workflow.tools.paths import playbook_directory_path, playbook_generated_file_paths, \
+    playbook_main_file_path, playbook_partial_file_path, installation_file_path
+
+# The key of the playbook fingerprints in the installation file.
+_fingerprints_key = 'ansible-fingerprints'
+
+# Ansible play keywords which are left out of partial playbooks. The tasks are part of the shared playbook
+# inputs and run after the roles. The pre_tasks and post_tasks are kept, since the roles might rely on them.
+_omitted_task_keywords = ['tasks']
+
+
+def playbook_fingerprints(universe_name, user_vars, user_secrets, slingring_vars):
+    """
+    Calculates the fingerprints of the inputs of the universe playbook. Every role referenced by
+    a play of the main playbook gets a fingerprint of its directory (including the roles it depends on).
+    Everything else (the main playbook, other files in the playbook directory and the variables)
+    is covered by the 'shared' fingerprint.
+
+    The values of the user secrets are not part of the fingerprints, since the fingerprints are stored
+    unencrypted. Only a change of the secret names is detected.
+    :param universe_name: The name of the universe.
+    :param user_vars: A dictionary containing the user vars.
+    :param user_secrets: A dictionary containing the user secrets.
+    :param slingring_vars: A dictionary containing the slingring vars.
+    :return: A dictionary containing the 'shared' fingerprint and the 'roles' fingerprints
+             (a dictionary with the role names as keys). A role fingerprint is None if
+             the role directory cannot be found.
+    """
+    playbook_directory = playbook_directory_path(universe_name)
+    role_paths = {role: _role_path(playbook_directory, role) for role in _referenced_roles(universe_name)}
+
+    excluded_paths = [os.path.relpath(generated_file_path, playbook_directory)
+                      for generated_file_path in playbook_generated_file_paths(universe_name)]
+    excluded_paths += [os.path.relpath(role_path, playbook_directory) for role_path in role_paths.values()
+                       if role_path]
+    # the current date changes every day, but it is no reason to run the playbook again
+    stable_slingring_vars = {name: value for name, value in (slingring_vars or {}).items() if name != 'current_date'}
+    shared = fingerprint_values(fingerprint_tree(playbook_directory, excluded_paths), user_vars,
+                                sorted(user_secrets or {}), stable_slingring_vars)
+
+    roles = {}
+    for role, role_path in role_paths.items():
+        if role_path is None:
+            roles[role] = None
+            continue
+        dependency_fingerprints = [fingerprint_tree(path) for path in _role_dependency_paths(playbook_directory,
+                                                                                             role_path)]
+        roles[role] = fingerprint_values(fingerprint_tree(role_path), dependency_fingerprints)
+    return {'shared': shared, 'roles': roles}
+
+
+def changed_roles(previous_fingerprints, current_fingerprints):
+    """
+    Determines the roles which have to run again.
+    :param previous_fingerprints: The fingerprints of the last successful run or None.
+    :param current_fingerprints: The current fingerprints (see playbook_fingerprints).
+    :return: None if the whole playbook has to run again (e.g. if the shared inputs have changed),
+             otherwise a list of the changed roles (which is empty if nothing has changed).
+    """
+    if not previous_fingerprints or previous_fingerprints.get('shared') != current_fingerprints['shared']:
+        return None
+    previous_roles = previous_fingerprints.get('roles', {})
+    return [role for role, fingerprint in sorted(current_fingerprints['roles'].items())
+            if fingerprint is None or previous_roles.get(role) != fingerprint]
+
+
+def write_partial_playbook(universe_name, roles):
+    """
+    Writes a playbook which only contains the given roles of the main playbook. The plays keep
+    their order, their hosts, variables, handlers, pre_tasks and post_tasks, since the roles might rely on them.
+    Plays without any of the roles are omitted. The tasks defined directly in the plays run after the roles
+    and are omitted as well, since they are shared inputs which have not changed.
+    :param universe_name: The name of the universe.
+    :param roles: The names of the roles which should run.
+    :return: The file name of the partial playbook (relative to the playbook directory).
+    """
+    partial_plays = []
+    for play in _read_plays(universe_name):
+        play_roles = [entry for entry in play.get('roles', []) if _role_name(entry) in roles]
+        if not play_roles:
+            continue
+        partial_play = {key: value for key, value in play.items() if key not in _omitted_task_keywords}
+        partial_play['roles'] = play_roles
+        partial_plays.append(partial_play)
+    partial_playbook_path = playbook_partial_file_path(universe_name)
+    with open(partial_playbook_path, 'w') as partial_playbook_file:
+        yaml.safe_dump(partial_plays, partial_playbook_file, default_flow_style=False)
+    return os.path.basename(partial_playbook_path)
+
+
+def read_fingerprints(universe_name):
+    """
+    :param universe_name: The name of the universe.
+    :return: The playbook fingerprints of the last successful run or None.
+    """
+    return configuration.read_configuration(installation_file_path(universe_name)).get(_fingerprints_key)
+
+
+def store_fingerprints(universe_name, fingerprints):
+    """
+    Stores the playbook fingerprints of a successful run in the installation file.
+    :param universe_name: The name of the universe.
+    :param fingerprints: The fingerprints (see playbook_fingerprints).
+    """
+    path = installation_file_path(universe_name)
+    installation_configuration = configuration.read_configuration(path)
+    installation_configuration[_fingerprints_key] = fingerprints
+    configuration.write_configuration(path, installation_configuration)
+
+
+def _read_plays(universe_name):
+    with open(playbook_main_file_path(universe_name)) as main_file:
+        plays = yaml.safe_load(main_file) or []
+    return [play for play in plays if isinstance(play, dict)]
+
+
+def _referenced_roles(universe_name):
+    roles = []
+    for play in _read_plays(universe_name):
+        for entry in play.get('roles', []):
+            role = _role_name(entry)
+            if role and role not in roles:
+                roles.append(role)
+    return roles
+
+
+def _role_name(entry):
+    if isinstance(entry, dict):
+        return entry.get('role') or entry.get('name')
+    return entry
+
+
+def _role_path(playbook_directory, role):
+    for role_path in [os.path.join(playbook_directory, role), os.path.join(playbook_directory, 'roles', role)]:
+        if os.path.isdir(role_path):
+            return os.path.normpath(role_path)
+    return None
+
+
+def _role_dependency_paths(playbook_directory, role_path, visited=None):
+    visited = visited if visited is not None else {role_path}
+    meta_path = os.path.join(role_path, 'meta', 'main.yml')
+    if not os.path.isfile(meta_path):
+        return []
+    with open(meta_path) as meta_file:
+        meta = yaml.safe_load(meta_file) or {}
+    dependency_paths = []
+    for dependency in (meta.get('dependencies') or []) if isinstance(meta, dict) else []:
+        dependency_path = _role_path(playbook_directory, _role_name(dependency) or '')
+        if dependency_path and dependency_path not in visited:
+            visited.add(dependency_path)
+            dependency_paths.append(dependency_path)
+            dependency_paths += _role_dependency_paths(playbook_directory, dependency_path, visited)
+    return dependency_paths
@@ -0,0 +1,226 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import os
+
+import applications.schroot as schroot
+import system.mount as mnt
+import system.privileged as privileged
+import universe.workflow.tools.chroot as chroot
+import universe.workflow.tools.paths as paths
+from common.configuration import ConfigurationHandler
+from resources.messages import get as _
+
+# Universes are either plain directories containing the complete chroot ('directory') or
+# overlay file systems on top of a read-only base layer shared by all universes with the
+# same suite, architecture and variant ('overlay').
+DIRECTORY = 'directory'
+OVERLAY = 'overlay'
+
+
+def create_storage_configuration(universe_name, seed_dictionary):
+    """
+    Creates the installation configuration for a new universe based on the
+    configured storage mode ('storage-mode').
+    :param universe_name: The universe name.
+    :param seed_dictionary: The seed universe file contents (as a dictionary).
+    :return: The installation configuration as a dictionary.
+    """
+    if ConfigurationHandler().get_config_value('storage-mode') != OVERLAY:
+        return {'location': paths.designated_universe_path(universe_name)}
+
+    return {'location': paths.designated_overlay_root_path(universe_name),
+            'storage': OVERLAY,
+            'directory': paths.designated_universe_path(universe_name),
+            'lower': paths.base_layer_path(seed_dictionary),
+            'upper': paths.designated_overlay_upper_path(universe_name),
+            'work': paths.designated_overlay_work_path(universe_name)}
+
+
+def storage_fingerprint_values(installation_configuration):
+    """
+    :param installation_configuration: The installation configuration as a dictionary.
+    :return: The part of the installation configuration which describes the storage layout.
+    """
+    return {key: value for key, value in installation_configuration.items()
+            if key in ['location', 'storage', 'directory', 'lower', 'upper', 'work']}
+
+
+def is_overlay(installation_configuration):
+    """
+    :param installation_configuration: The installation configuration as a dictionary.
+    :return: True, if the universe is an overlay on a shared base layer.
+    """
+    return installation_configuration.get('storage') == OVERLAY
+
+
+def bootstrap(installation_configuration, seed_dictionary, verbose, temp_dir=None, use_cache=True, proxy=None,
+              source_path=None):
+    """
+    Creates the chroot of a new universe. Directory universes are bootstrapped
+    directly into their location (or copied from a freshly bootstrapped chroot).
+    For overlay universes, the base layer is only bootstrapped if no other universe created it before.
+    :param installation_configuration: The installation configuration as a dictionary.
+    :param seed_dictionary: The seed universe file contents (as a dictionary).
+    :param verbose: True, if a more verbose output is desired.
+    :param temp_dir: An alternative temp directory for debootstrapping (must not contain spaces).
+    :param use_cache: True, if the base image cache should be used.
+    :param proxy: An HTTP proxy URL which debootstrap should download the packages through.
+    :param source_path: The path of a freshly bootstrapped chroot with the same bootstrap parameters, which
+                        a directory universe is copied from instead of bootstrapping it, or None.
+    """
+    if not is_overlay(installation_configuration) and source_path:
+        location = installation_configuration['location']
+        privileged.mkdir(os.path.dirname(location), 'create-base-directory-phase', verbose)
+        privileged.copy(source_path, location, 'clone-chroot-phase', verbose, recursive=True, archive=True,
+                        reflink=True)
+        return
+    if not is_overlay(installation_configuration):
+        chroot.bootstrap(installation_configuration['location'], seed_dictionary, verbose, temp_dir, use_cache, proxy)
+        return
+
+    lower_path = installation_configuration['lower']
+    if os.path.exists(lower_path):
+        print(_('base-layer-exists').format(os.path.basename(lower_path)))
+    else:
+        # the base layer is only published once it is complete, since other universes rely on its existence
+        partial_lower_path = lower_path + '.partial'
+        privileged.remove(partial_lower_path, 'create-base-directory-phase', verbose, recursive=True)
+        chroot.bootstrap(partial_lower_path, seed_dictionary, verbose, temp_dir, use_cache, proxy)
+        privileged.move(partial_lower_path, lower_path, 'create-base-directory-phase', verbose)
+
+    for directory in (installation_configuration['location'], installation_configuration['upper'],
+                      installation_configuration['work']):
+        privileged.mkdir(directory, 'create-overlay-directories-phase', verbose)
+    mount(installation_configuration, verbose)
+
+
+def reset(installation_configuration, verbose):
+    """
+    Removes the (possibly incomplete) chroot of a universe, so it can be bootstrapped again.
+    The base layer of an overlay universe is kept. The virtual file systems left behind by an interrupted
+    installation are unmounted first. The installation aborts if anything else is still mounted in the universe.
+    :param installation_configuration: The installation configuration as a dictionary.
+    :param verbose: True, if a more verbose output is desired.
+    """
+    location = installation_configuration['location']
+    chroot.umount(location, verbose)
+    umount(installation_configuration, verbose)
+    if mnt.contains_active_mount_point(location):
+        print(_('still-mounted-error'))
+        exit(1)
+
+    if is_overlay(installation_configuration):
+        for directory in (installation_configuration['location'], installation_configuration['upper'],
+                          installation_configuration['work']):
+            privileged.remove(directory, 'deletion-phase', verbose, recursive=True)
+    else:
+        privileged.remove(location, 'deletion-phase', verbose, recursive=True)
+
+
+def mount(installation_configuration, verbose):
+    """
+    Mounts the overlay file system of an overlay universe, unless it is already mounted.
+    Does nothing for directory universes.
+    :param installation_configuration: The installation configuration as a dictionary.
+    :param verbose: True, if a more verbose output is desired.
+    """
+    if not is_overlay(installation_configuration) or mnt.is_mount_point(installation_configuration['location']):
+        return
+    options = ['lowerdir=' + installation_configuration['lower'],
+               'upperdir=' + installation_configuration['upper'],
+               'workdir=' + installation_configuration['work']]
+    mnt.mount('overlay', installation_configuration['location'], 'overlay-mount-phase', verbose, fstype='overlay',
+              options=options)
+
+
+def umount(installation_configuration, verbose):
+    """
+    Unmounts the overlay file system of an overlay universe, if it is mounted.
+    Does nothing for directory universes.
+    :param installation_configuration: The installation configuration as a dictionary.
+    :param verbose: True, if a more verbose output is desired.
+    """
+    if is_overlay(installation_configuration) and mnt.is_mount_point(installation_configuration['location']):
+        mnt.umount(installation_configuration['location'], 'overlay-umount-phase', verbose)
+
+
+def schroot_options(installation_configuration):
+    """
+    Creates the additional schroot options for the given universe. Overlay universes
+    pass their layers to the slingring setup script which mounts the overlay when a
+    session starts (e.g. after a reboot).
+    :param installation_configuration: The installation configuration as a dictionary.
+    :return: A dictionary of schroot options.
+    """
+    if not is_overlay(installation_configuration):
+        return {}
+    return {'slingring.overlay-lower': installation_configuration['lower'],
+            'slingring.overlay-upper': installation_configuration['upper'],
+            'slingring.overlay-work': installation_configuration['work']}
+
+
+def has_active_mounts(installation_configuration):
+    """
+    Checks if there are active mounts in the universe (e.g. /proc of an open portal).
+    The overlay mount of an overlay universe itself does not count.
+    :param installation_configuration: The installation configuration as a dictionary.
+    :return: True, if something is mounted inside the universe.
+    """
+    return mnt.contains_active_mount_point(installation_configuration['location'],
+                                           include_self=not is_overlay(installation_configuration))
+
+
+def remove(installation_configuration, verbose):
+    """
+    Removes the chroot of a universe. The base layer of an overlay universe
+    is removed as well, if no other universe uses it.
+    :param installation_configuration: The installation configuration as a dictionary.
+    :param verbose: True, if a more verbose output is desired.
+    :return: True, if there was something to remove.
+    """
+    if not is_overlay(installation_configuration):
+        if not os.path.exists(installation_configuration['location']):
+            return False
+        privileged.remove(installation_configuration['location'], 'deletion-phase', verbose, recursive=True)
+        return True
+
+    if not os.path.exists(installation_configuration['directory']):
+        return False
+    umount(installation_configuration, verbose)
+    privileged.remove(installation_configuration['directory'], 'deletion-phase', verbose, recursive=True)
+
+    lower_path = installation_configuration['lower']
+    if os.path.exists(lower_path) and not layer_users(lower_path, installation_configuration['location']):
+        privileged.remove(lower_path, 'deletion-phase', verbose, recursive=True)
+        print(_('base-layer-removed').format(os.path.basename(lower_path)))
+    return True
+
+
+def layer_users(lower_path, excluded_location=None):
+    """
+    Finds the universes on this host which use the given base layer. Since the universes of
+    other users are not listed in the local multiverse, the schroot configs are searched.
+    :param lower_path: The path of the base layer.
+    :param excluded_location: The location of a universe which should not be taken into account.
+    :return: A list of the names of all universes using the base layer.
+    """
+    schroot_configs = schroot.read_schroot_configs(paths.schroot_config_directory_path())
+    return [name for name, options in schroot_configs.items()
+            if options.get('slingring.overlay-lower') == lower_path and options.get('directory') != excluded_location]
@@ -18,64 +18,94 @@
 ########################################################
 
 import os
+import time
 
-import system.user as user
 import universe.workflow.tools.chroot as chroot
+import universe.workflow.tools.index as index
+import universe.workflow.tools.playbook as playbook
+import universe.workflow.tools.storage as storage
 from common import configuration
 from resources.messages import get as _
-from universe.workflow.common import create_slingring_vars_dict, gather_variables_from_user, print_spaced
-from universe.workflow.tools.paths import installation_file_path, universe_file_path, user_home_in_chroot, \
-    local_universe_dir
+from universe.workflow.common import create_slingring_vars_dict, print_spaced, package_proxy, \
+    gather_variables_phase, gather_variables_from_user, resolve_user_phase, refresh_sudo_credentials, \
+    max_concurrent_phases
+from universe.workflow.tools.batch import BatchTask, run_batch, print_summary
+from universe.workflow.tools.locks import locked
+from universe.workflow.tools.paths import installation_file_path, universe_file_path, local_universe_dir, \
+    installed_universe_names, update_log_path
+from universe.workflow.tools.phases import PhaseGraph
 
 
 def update_universe_by_args(args):
     """"
     Re-runs the Ansible playbook saved in the local Slingring home
-    for the given universe on its chroot.
+    for the given universes on their chroots.
     :param args: The command line arguments as parsed by argparse.
                  This is expected to contain the following information:
-                    - universe: The name of the universe
+                    - universe: The names of the universes
+                    - all: True, if all universes should be updated.
+                    - jobs: The maximum number of universes updated at the same time.
                     - verbose: True, for more verbose output.
+                    - force: True, if the playbook should run even if nothing has changed.
+                    - reprompt: True, if the variables should be asked again instead of using the stored answers.
     """
-    update_universe(args.universe, args.verbose)
+    if args.all:
+        universe_names = installed_universe_names()
+        if not universe_names:
+            print(_('no-universes-found'))
+            return
+    elif args.universe:
+        universe_names = args.universe
+    else:
+        print(_('update-no-universe'))
+        exit(1)
+
+    if len(universe_names) == 1 and not args.all:
+        update_universe(universe_names[0], args.verbose, args.force, args.reprompt)
+    else:
+        update_universes(universe_names, args.jobs, args.verbose, args.force, args.reprompt)
 
 
-def update_universe(universe_name, verbose):
+def update_universe(universe_name, verbose, force=False, reprompt=False):
     """"
     Re-runs the Ansible playbook saved in the local Slingring home
-    for the given universe on its chroot.
+    for the given universe on its chroot. Only the roles whose inputs have changed since
+    the last successful run are executed, unless force is True.
     :param universe_name: The name of the universe
     :param verbose: True, for more verbose output.
+    :param force: True, if the whole playbook should run even if nothing has changed.
+    :param reprompt: True, if the variables should be asked again instead of using the stored answers.
     """
-    local_installation_path = local_universe_dir(universe_name)
+    with locked([universe_name]):
+        local_installation_path = local_universe_dir(universe_name)
 
-    if not os.path.exists(local_installation_path):
-        print(_('universe-does-not-exist'))
-        exit(1)
-
-    installation_configuration_path = installation_file_path(universe_name)
-    universe_path = configuration.read_configuration(installation_configuration_path)['location']
+        if not os.path.exists(local_installation_path):
+            print(_('universe-does-not-exist'))
+            exit(1)
 
-    seed_universe_file_path = universe_file_path(universe_name)
-    seed_dictionary = configuration.read_seed_file(seed_universe_file_path)
+        installation_configuration_path = installation_file_path(universe_name)
+        installation_configuration = configuration.read_configuration(installation_configuration_path)
 
-    print(_('update-start').format(universe_name))
+        seed_universe_file_path = universe_file_path(universe_name)
+        seed_dictionary = configuration.read_seed_file(seed_universe_file_path)
 
-    # retrieve ansible variable files from the user
-    user_vars, user_secrets = gather_variables_from_user(seed_dictionary)
+        print(_('update-start').format(universe_name))
 
-    print_spaced(_('coffee-time'))
+        refresh_sudo_credentials(verbose)
+        graph = PhaseGraph(max_concurrent_phases(verbose))
+        # retrieve ansible variable files from the user
+        graph.add('variables', gather_variables_phase, inputs=['seed_dictionary', 'universe_name', 'reprompt'],
+                  outputs=['user_vars', 'user_secrets'], interactive=True)
+        _add_update_phases(graph)
 
-    user_name = user.get_user()
-    user_group = user.get_user_group()
-    user_home = user_home_in_chroot(user_name)
-
-    slingring_vars = create_slingring_vars_dict(user_name, user_group, user_home, seed_dictionary['mirror'],
-                                                universe_name,
-                                                seed_dictionary['version'])
-
-    chroot.run_ansible(universe_name, universe_path, user_vars, user_secrets,
-                       slingring_vars, verbose)
+        with package_proxy(verbose) as proxy:
+            graph.run({'seed_dictionary': seed_dictionary,
+                       'universe_name': universe_name,
+                       'installation_configuration': installation_configuration,
+                       'force': force,
+                       'reprompt': reprompt,
+                       'proxy': proxy,
+                       'verbose': verbose})
 
     if ' ' in universe_name:
         quote = '"'
@@ -83,3 +113,109 @@ def update_universe(universe_name, verbose):
         quote = ''
 
     print_spaced(_('update-done').format(quote, universe_name, quote))
+
+
+def update_universes(universe_names, jobs, verbose, force=False, reprompt=False):
+    """
+    Updates several universes (see update_universe) at the same time. The variables of all
+    universes are gathered first, then the playbooks run in separate processes. The output of
+    every update goes to a log file in the local Slingring home of the universe.
+    Exits with an error if any update fails.
+    :param universe_names: The names of the universes.
+    :param jobs: The maximum number of universes updated at the same time.
+    :param verbose: True, for more verbose output (in the log files).
+    :param force: True, if the whole playbooks should run even if nothing has changed.
+    :param reprompt: True, if the variables should be asked again instead of using the stored answers.
+    """
+    # the child processes of the batch run under the locks of this process
+    with locked(universe_names):
+        missing_universes = [universe_name for universe_name in universe_names
+                             if not os.path.exists(installation_file_path(universe_name))]
+        if missing_universes:
+            print(_('universes-do-not-exist').format(', '.join(missing_universes)))
+            exit(1)
+
+        # nothing may interact with the user once the updates are running
+        variables = []
+        for universe_name in universe_names:
+            seed_dictionary = configuration.read_seed_file(universe_file_path(universe_name))
+            variables.append(gather_variables_from_user(seed_dictionary, universe_name, reprompt,
+                                                        announce_universe=True))
+        refresh_sudo_credentials(True)
+
+        print_spaced(_('update-batch-start').format(len(universe_names), min(jobs, len(universe_names))))
+        with package_proxy(verbose) as proxy:
+            tasks = [BatchTask(universe_name, _update_task,
+                               {'universe_name': universe_name, 'user_vars': user_vars, 'user_secrets': user_secrets,
+                                'force': force, 'proxy': proxy, 'verbose': verbose},
+                               update_log_path(universe_name))
+                     for universe_name, (user_vars, user_secrets) in zip(universe_names, variables)]
+            results = run_batch(tasks, jobs)
+
+    print_summary(results)
+    if not all(result.success for result in results):
+        exit(1)
+
+
+def _update_task(universe_name, user_vars, user_secrets, force, proxy, verbose):
+    # Runs in a separate process (see update_universes). The mounts of the universe and the files
+    # in its playbook directory are not shared with the updates of the other universes.
+    installation_configuration = configuration.read_configuration(installation_file_path(universe_name))
+    seed_dictionary = configuration.read_seed_file(universe_file_path(universe_name))
+    print(_('update-start').format(universe_name))
+    graph = PhaseGraph(max_concurrent_phases(verbose))
+    _add_update_phases(graph)
+    values = graph.run({'seed_dictionary': seed_dictionary,
+                        'universe_name': universe_name,
+                        'installation_configuration': installation_configuration,
+                        'user_vars': user_vars,
+                        'user_secrets': user_secrets,
+                        'force': force,
+                        'proxy': proxy,
+                        'verbose': verbose})
+    return values['playbook_result']
+
+
+def _add_update_phases(graph):
+    graph.add('user', resolve_user_phase, outputs=['user_name', 'user_group', 'user_home'])
+    # overlay universes are not mounted after a reboot until a portal is opened
+    graph.add('mount', storage.mount, inputs=['installation_configuration', 'verbose'])
+    graph.add('ansible', _ansible_phase,
+              inputs=['seed_dictionary', 'universe_name', 'installation_configuration', 'user_name', 'user_group',
+                      'user_home', 'user_vars', 'user_secrets', 'force', 'proxy', 'verbose'],
+              outputs=['playbook_result'],
+              after=['mount'])
+
+
+def _ansible_phase(seed_dictionary, universe_name, installation_configuration, user_name, user_group, user_home,
+                   user_vars, user_secrets, force, proxy, verbose):
+    slingring_vars = create_slingring_vars_dict(user_name, user_group, user_home, seed_dictionary['mirror'],
+                                                universe_name,
+                                                seed_dictionary['version'])
+    fingerprints = playbook.playbook_fingerprints(universe_name, user_vars, user_secrets, slingring_vars)
+    if force:
+        roles = None
+    else:
+        roles = playbook.changed_roles(playbook.read_fingerprints(universe_name), fingerprints)
+
+    if roles is None:
+        playbook_file = 'main.yml'
+        playbook_result = _('update-result-playbook')
+    elif roles:
+        print(_('update-partial').format(', '.join(roles)))
+        playbook_file = playbook.write_partial_playbook(universe_name, roles)
+        playbook_result = _('update-result-roles').format(', '.join(roles))
+    else:
+        print(_('update-up-to-date'))
+        return {'playbook_result': _('update-result-up-to-date')}
+    chroot.run_ansible(universe_name, installation_configuration['location'], user_vars, user_secrets,
+                       slingring_vars, verbose, proxy, playbook_file)
+    if roles:
+        # only the fingerprints of the roles which actually ran are up to date
+        previous_fingerprints = playbook.read_fingerprints(universe_name)
+        previous_fingerprints['roles'].update({role: fingerprints['roles'][role] for role in roles})
+        fingerprints = previous_fingerprints
+    playbook.store_fingerprints(universe_name, fingerprints)
+    index.record_universe(universe_name, seed_dictionary, installation_configuration, updated=int(time.time()),
+                          size=index.universe_size(universe_name, installation_configuration))
+    return {'playbook_result': playbook_result}
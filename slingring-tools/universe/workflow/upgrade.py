@@ -18,15 +18,21 @@
 ########################################################
 
 import os
+import tempfile
 
+import universe.workflow.tools.answers as answers
+import universe.workflow.tools.index as index
 from applications.schroot import change_schroot_name
 from common import configuration
 from resources.messages import get as _
 from system.command import run_command
-from universe.workflow.common import get_seed_directory_from_argument
+from universe.workflow.common import get_seed_directory_from_argument, max_concurrent_phases
 from universe.workflow.tools.interaction import yes_no_prompt
+from universe.workflow.tools.locks import locked
 from universe.workflow.tools.paths import installation_file_path, universe_file_path, local_universe_dir, \
-    source_universe_file_path, copy_seed_to_local_home, schroot_config_file_path, colliding_local_or_schroot_paths_exist
+    source_universe_file_path, copy_seed_to_local_home, schroot_config_file_path, colliding_local_or_schroot_paths_exist, \
+    ansible_timing_path, local_multiverse_dir, answer_store_path
+from universe.workflow.tools.phases import PhaseGraph
 from universe.workflow.update import update_universe
 
 
@@ -38,21 +44,37 @@ def upgrade_universe_by_args(args):
                  This is expected to contain the following information:
                     - seed: The path to the universe seed directory as string.
                     - universe: The name of the universe
+                    - reprompt: True, if the variables should be asked again instead of using the stored answers.
                     - verbose: True, for more verbose output.
     """
-    upgrade_universe(args.seed, args.universe, args.verbose)
+    upgrade_universe(args.seed, args.universe, args.verbose, args.reprompt)
 
 
-def upgrade_universe(seed_path, universe_name, verbose):
+def upgrade_universe(seed_path, universe_name, verbose, reprompt=False):
     """
     Replaces the local seed of an existing universe with a newer
     version and runs the Ansible playbook on the given universe's chroot.
     :param seed_path: The path to the universe seed directory as string.
     :param universe_name: The name of the universe
     :param verbose: True, for more verbose output.
+    :param reprompt: True, if the variables should be asked again instead of using the stored answers.
     """
     old_universe_name = universe_name
 
+    # read new information
+    source_seed_directory = get_seed_directory_from_argument(seed_path)
+    source_seed_universe_path = source_universe_file_path(source_seed_directory)
+    new_seed_dictionary = configuration.read_seed_file(source_seed_universe_path)
+    new_universe_name = new_seed_dictionary['name']
+
+    # the update below runs under the same locks
+    with locked([old_universe_name, new_universe_name]):
+        _upgrade_universe(source_seed_directory, new_seed_dictionary, old_universe_name, new_universe_name, verbose,
+                          reprompt)
+
+
+def _upgrade_universe(source_seed_directory, new_seed_dictionary, old_universe_name, new_universe_name, verbose,
+                      reprompt):
     local_installation_path = local_universe_dir(old_universe_name)
 
     if not os.path.exists(local_installation_path):
@@ -61,17 +83,11 @@ def upgrade_universe(seed_path, universe_name, verbose):
 
     # read current information
     old_installation_configuration_path = installation_file_path(old_universe_name)
-    universe_path = configuration.read_configuration(old_installation_configuration_path)['location']
+    installation_configuration = configuration.read_configuration(old_installation_configuration_path)
 
     seed_universe_file_path = universe_file_path(old_universe_name)
     old_seed_dictionary = configuration.read_seed_file(seed_universe_file_path)
 
-    # read new information
-    source_seed_directory = get_seed_directory_from_argument(seed_path)
-    source_seed_universe_path = source_universe_file_path(source_seed_directory)
-    new_seed_dictionary = configuration.read_seed_file(source_seed_universe_path)
-    new_universe_name = new_seed_dictionary['name']
-
     if not yes_no_prompt(_('upgrade-warning').format(new_seed_dictionary['version'], old_seed_dictionary['version'])):
         exit(1)
     else:
@@ -82,22 +98,57 @@ def upgrade_universe(seed_path, universe_name, verbose):
     if old_universe_name != new_universe_name:
         _validate_paths_for_collision(new_universe_name)
 
-    # replace old seed with new seed
-    run_command(['rm', '-rf', local_installation_path], 'remove-local-seed-phase', verbose)
+    # replacing the local seed and renaming the schroot config are independent of each other
+    graph = PhaseGraph(max_concurrent_phases(verbose))
+    graph.add('replace-seed', _replace_seed_phase,
+              inputs=['source_seed_directory', 'old_universe_name', 'new_universe_name',
+                      'installation_configuration', 'verbose'])
+    # take care of the schroot config in case of a universe rename
+    if old_universe_name != new_universe_name:
+        graph.add('rename-schroot', _rename_schroot_phase, inputs=['old_universe_name', 'new_universe_name', 'verbose'])
+    graph.run({'source_seed_directory': source_seed_directory,
+               'old_universe_name': old_universe_name,
+               'new_universe_name': new_universe_name,
+               'installation_configuration': installation_configuration,
+               'verbose': verbose})
+
+    # the stored answers belong to the new universe name
+    if old_universe_name != new_universe_name and answers.is_enabled() and os.path.exists(answer_store_path()):
+        answers.unlock().rename(old_universe_name, new_universe_name)
+
+    if old_universe_name != new_universe_name:
+        index.rename_entry(old_universe_name, new_universe_name)
+    index.record_universe(new_universe_name, new_seed_dictionary, installation_configuration)
+
+    # run the new Ansible playbook on the universe as if we just updated.
+    # Only the variables which are new or have changed in the new seed are asked.
+    update_universe(new_universe_name, verbose, reprompt=reprompt)
+
+
+def _replace_seed_phase(source_seed_directory, old_universe_name, new_universe_name, installation_configuration,
+                        verbose):
+    # the timing records of the previous playbook runs survive the upgrade (see 'universe profile')
+    timing_path = ansible_timing_path(old_universe_name)
+    preserved_directory = None
+    if os.path.isdir(timing_path):
+        preserved_directory = tempfile.mkdtemp(prefix='.', dir=local_multiverse_dir())
+        os.rename(timing_path, os.path.join(preserved_directory, 'timings'))
+    run_command(['rm', '-rf', local_universe_dir(old_universe_name)], 'remove-local-seed-phase', verbose)
     copy_seed_to_local_home(source_seed_directory, new_universe_name)
+    if preserved_directory:
+        os.rename(os.path.join(preserved_directory, 'timings'), ansible_timing_path(new_universe_name))
+        os.rmdir(preserved_directory)
     new_installation_configuration_path = installation_file_path(new_universe_name)
-    configuration.write_installation_configuration(new_installation_configuration_path, universe_path)
+    configuration.write_configuration(new_installation_configuration_path, installation_configuration)
 
-    # take care of the schroot config in case of a universe rename
-    if old_universe_name != new_universe_name:
-        change_schroot_name(old_universe_name, new_universe_name, schroot_config_file_path(old_universe_name),
-                            schroot_config_file_path(new_universe_name), 'rename-schroot-phase', verbose)
 
-    # run the new Ansible playbook on the universe as if we just updated
-    update_universe(new_universe_name, verbose)
+def _rename_schroot_phase(old_universe_name, new_universe_name, verbose):
+    change_schroot_name(old_universe_name, new_universe_name, schroot_config_file_path(old_universe_name),
+                        schroot_config_file_path(new_universe_name), 'rename-schroot-phase', verbose)
 
 
 def _validate_seed_dictionaries(old_seed_dict, new_seed_dict):
+    # Besides the chroot itself, the base layer of overlay universes depends on arch, suite and variant.
     if old_seed_dict['arch'] != new_seed_dict['arch']:
         print(_('different_arch_error'))
         exit(1)
@@ -0,0 +1,85 @@
+# (c) 2017, Florian Engel <florian.engel@turbocache3000.de>
+#
+# This file is part of Slingring
+#
+# Slingring is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Slingring is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Slingring.  If not, see <http://www.gnu.org/licenses/>.
+
+########################################################
+
+import os
+
+import universe.workflow.tools.disk_usage as disk_usage
+import universe.workflow.tools.index as index
+from common import configuration
+from resources.messages import get as _
+from universe.workflow.tools.image_cache import format_size
+from universe.workflow.tools.locks import locked
+from universe.workflow.tools.paths import installation_file_path, installed_universe_names
+
+
+def disk_usage_by_args(args):
+    """
+    Shows the disk usage of universes.
+    :param args: The command line arguments as parsed by argparse.
+                 This is expected to contain the following information:
+                    - universe: The names of the universes (all universes, if empty).
+                    - no_cache: True, if every directory should be read again.
+                    - verbose: True, for more verbose output.
+    """
+    universe_names = args.universe or installed_universe_names()
+    if not universe_names:
+        print(_('no-universes-found'))
+        return
+    show_disk_usage(universe_names, not args.no_cache, args.verbose)
+
+
+def show_disk_usage(universe_names, use_cache, verbose):
+    """
+    Shows the disk space allocated by the given universes, broken down by their top-level directories.
+    The disk usage is stored in the metadata index of the local multiverse.
+    :param universe_names: The names of the universes.
+    :param use_cache: False, if every directory should be read again instead of only the changed ones.
+    :param verbose: True, to show the location of the measured directory tree.
+    """
+    missing_universes = [universe_name for universe_name in universe_names
+                         if not os.path.exists(installation_file_path(universe_name))]
+    if missing_universes:
+        print(_('universes-do-not-exist').format(', '.join(missing_universes)))
+        exit(1)
+
+    # the space shared by several universes is only counted once in the total
+    counted_space = disk_usage.CountedSpace()
+    for universe_name in universe_names:
+        with locked([universe_name], exclusive=False):
+            installation_configuration = configuration.read_configuration(installation_file_path(universe_name))
+            usage = disk_usage.measure(universe_name, installation_configuration, use_cache, counted_space)
+            index.update_entry(universe_name, size=usage.total if usage else None)
+
+        if usage is None:
+            print(_('du-no-chroot').format(universe_name))
+            continue
+        print(_('du-universe').format(universe_name))
+        if verbose:
+            print('   {}'.format(usage.path))
+        print('   {:>9}  {}'.format(format_size(usage.total), _('du-total')))
+        if usage.shared:
+            print('   {:>9}  {}'.format(format_size(usage.shared), _('du-shared')))
+        for directory, size in usage.directories.items():
+            # the detailed directories are indented below their top-level directory
+            indentation = '  ' if directory.count('/') > 1 else ''
+            print('   {:>9}  {}{}'.format(format_size(size), indentation, directory))
+        print()
+
+    if len(universe_names) > 1:
+        print(_('du-all-universes').format(format_size(counted_space.total)))